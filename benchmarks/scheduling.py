@@ -0,0 +1,79 @@
+"""Compares wall-clock time of ProcessBasedExecutor on a skewed dataset,
+with tasks in dataset order versus largest first with large images split
+
+Usage:
+    python -m benchmarks.scheduling --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from raster_analysis_service.image.analysis import MeanValueAnalysis
+from raster_analysis_service.service.analysis_executor import ProcessBasedExecutor
+from raster_analysis_service.service.worker_pool import WorkerPool
+
+from .synthetic import write_raster
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--small-images", type=int, default=15, help="Number of small images")
+    parser.add_argument("--small-size", type=int, default=1024, help="Width of small images")
+    parser.add_argument("--large-size", type=int, default=6144, help="Width of the large image")
+    parser.add_argument("--split-mb", type=int, default=8, help="File size above which images are split")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per schedule")
+    return parser.parse_args()
+
+
+def create_skewed_dataset(directory: str, small_images: int, small_size: int, large_size: int):
+    """Creates small images followed by a single large one, the worst case for in-order scheduling"""
+    paths = []
+    for index in range(small_images):
+        paths.append(os.path.join(directory, f"small_{index}.tif"))
+        write_raster(paths[-1], small_size, seed=index)
+    paths.append(os.path.join(directory, "large.tif"))
+    write_raster(paths[-1], large_size, seed=small_images)
+    return paths
+
+
+def run(paths, pool: WorkerPool, split_bytes: int, repeat: int):
+    """Returns best wall-clock seconds and the result of the analysis"""
+    timings = []
+    for _ in range(repeat):
+        analysis = MeanValueAnalysis()
+        start = time.perf_counter()
+        ProcessBasedExecutor(analysis, paths, pool=pool, split_bytes=split_bytes).execute()
+        timings.append(time.perf_counter() - start)
+    return min(timings), analysis.result()
+
+
+def main():
+    args = parse_arguments()
+    # Repeated runs would reduce tile statistics written by the first one, instead of reading pixels.
+    # Workers are spawned, so they read the setting from the environment
+    os.environ["TILE_STATISTICS_ENABLED"] = "0"
+    with tempfile.TemporaryDirectory() as directory:
+        paths = create_skewed_dataset(directory, args.small_images, args.small_size, args.large_size)
+        pool = WorkerPool(args.workers, max_tasks=10 ** 9, gdal_options={})
+        pool.start()
+        try:
+            in_order_seconds, in_order_result = run(paths, pool, 0, args.repeat)
+            planned_seconds, planned_result = run(paths, pool, args.split_mb * 1024 * 1024, args.repeat)
+        finally:
+            pool.shutdown()
+
+    print(json.dumps({
+        "workers": args.workers,
+        "images": len(paths),
+        "in_order_seconds": round(in_order_seconds, 3),
+        "largest_first_split_seconds": round(planned_seconds, 3),
+        "speedup": round(in_order_seconds / planned_seconds, 2),
+        "results_match": abs(in_order_result - planned_result) <= 1e-9 * abs(in_order_result),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
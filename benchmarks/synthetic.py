@@ -0,0 +1,73 @@
+"""Generates synthetic GeoTIFFs to benchmark analyses without network access
+"""
+import os
+
+from typing import List, Optional
+
+import numpy as np
+import rasterio
+
+from rasterio.transform import from_origin
+
+
+NODATA = 0
+
+
+def write_raster(path: str, size: int, bands: int = 1, dtype: str = "uint16", block_size: int = 512,
+                 compress: Optional[str] = "deflate", seed: int = 0, tiled: bool = True,
+                 nodata_fraction: float = 0.0) -> None:
+    """Writes a raster of random values
+
+    Args:
+        path (str): output file path
+        size (int): width and height of the raster in pixels
+        bands (int, optional): Number of bands. Defaults to 1.
+        dtype (str, optional): Data type of pixels. Defaults to "uint16".
+        block_size (int, optional): Width and height of internal tiles. Defaults to 512.
+        compress (Optional[str], optional): GDAL compression codec, None or "none" for uncompressed.
+            Defaults to "deflate".
+        seed (int, optional): Seed of random values. Defaults to 0.
+        tiled (bool, optional): If False, the raster is laid out in strips sized by GDAL. Defaults to True.
+        nodata_fraction (float, optional): Fraction of pixels set to nodata. Defaults to 0, no nodata value.
+    """
+    random = np.random.default_rng(seed)
+    profile = {
+        "driver": "GTiff", "width": size, "height": size, "count": bands, "dtype": dtype,
+        "crs": "EPSG:32632", "transform": from_origin(300000, 5000000, 10, 10),
+    }
+    if tiled:
+        profile.update(tiled=True, blockxsize=block_size, blockysize=block_size)
+    if compress and compress.lower() != "none":
+        profile["compress"] = compress
+    if nodata_fraction:
+        profile["nodata"] = NODATA
+    integer = np.issubdtype(dtype, np.integer)
+    upper = min(np.iinfo(dtype).max, 10000) if integer else 1.0
+    # Valid values are never equal to nodata
+    lower = 1 if nodata_fraction and integer else 0
+    with rasterio.open(path, "w", **profile) as dataset:
+        for _, window in dataset.block_windows(1):
+            shape = (bands, window.height, window.width)
+            values = (lower + random.random(shape) * (upper - lower)).astype(dtype)
+            if nodata_fraction:
+                values[random.random(shape) < nodata_fraction] = NODATA
+            dataset.write(values, window=window)
+
+
+def create_dataset(directory: str, images: int, size: int, **options) -> List[str]:
+    """Writes images named like Sentinel-2 assets downloaded by scripts/download_data.py
+
+    Args:
+        directory (str): output directory
+        images (int): number of images
+        size (int): width and height of each image in pixels
+        **options: options of write_raster()
+
+    Returns:
+        List[str]: paths of written images
+    """
+    paths = []
+    for index in range(images):
+        paths.append(os.path.join(directory, f"S2A_32TQM_2023{index // 28 + 1:02d}{index % 28 + 1:02d}_0_L2A_B04.tif"))
+        write_raster(paths[-1], size, seed=index, **options)
+    return paths
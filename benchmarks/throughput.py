@@ -0,0 +1,272 @@
+"""Measures throughput of executors over a synthetic dataset, at several worker counts
+
+Every executor and worker count is run in a forked process of its own, so that peak memory
+of each configuration is measured separately. Results are written as JSON, and can be
+compared with those of a previous run to catch regressions:
+
+Usage:
+    python -m benchmarks.throughput --workers 1,2,4 --output benchmark.json
+    python -m benchmarks.throughput --baseline benchmark.json --tolerance 0.15
+
+An executor is benchmarked once it has a factory in EXECUTOR_FACTORIES.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import secrets
+import sys
+import tempfile
+import time
+
+from typing import Any, Callable, ContextManager, Dict, Iterator, List
+
+import numpy as np
+import rasterio
+
+from raster_analysis_service.image.analysis import Analysis, create_analysis
+from raster_analysis_service.image.tile_statistics import sidecar_path
+from raster_analysis_service.service import analysis_executor
+from raster_analysis_service.service.analysis_executor import (
+    DistributedExecutor,
+    ExecutorBase,
+    ImageResult,
+    ProcessBasedExecutor,
+    SequentialExecutor,
+    ThreadBasedExecutor,
+)
+from raster_analysis_service.service.analysis_node import AnalysisNode
+from raster_analysis_service.service.worker_pool import GDAL_OPTIONS, WorkerPool
+
+from .synthetic import create_dataset
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=8, help="Number of images")
+    parser.add_argument("--size", type=int, default=2048, help="Width and height of images")
+    parser.add_argument("--bands", type=int, default=1, help="Number of bands of images")
+    parser.add_argument("--dtype", default="uint16", help="Data type of pixels")
+    parser.add_argument("--block-size", type=int, default=512, help="Width and height of internal tiles")
+    parser.add_argument("--untiled", action="store_true", help="Lay images out in strips instead of tiles")
+    parser.add_argument("--compress", default="deflate", help="GDAL compression codec, or none")
+    parser.add_argument("--nodata-fraction", type=float, default=0.0, help="Fraction of nodata pixels")
+    parser.add_argument("--analysis", default="MEAN_VALUE",
+                        help="Analysis type, or comma separated types computed in a single pass")
+    parser.add_argument("--executors", default="SEQUENTIAL,THREAD,PROCESS",
+                        help=f"Comma separated executors, of {', '.join(EXECUTOR_FACTORIES)}")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts")
+    parser.add_argument("--split-mb", type=int, default=64, help="File size above which images are split")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per configuration, best is kept")
+    parser.add_argument("--tile-statistics", action="store_true",
+                        help="Let analyses use tile statistics, which are written by the first run")
+    parser.add_argument("--output", help="File to write results to, printed if not given")
+    parser.add_argument("--baseline", help="Results of a previous run to compare throughput with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative loss of throughput against baseline which fails the benchmark")
+    return parser.parse_args()
+
+
+@contextlib.contextmanager
+def _sequential(analysis: Analysis, paths: List[str], progress, workers: int, split_bytes: int) -> Iterator:
+    yield SequentialExecutor(analysis, paths, progress)
+
+
+@contextlib.contextmanager
+def _thread(analysis: Analysis, paths: List[str], progress, workers: int, split_bytes: int) -> Iterator:
+    yield ThreadBasedExecutor(analysis, paths, progress, num_workers=workers, split_bytes=split_bytes)
+
+
+@contextlib.contextmanager
+def _process(analysis: Analysis, paths: List[str], progress, workers: int, split_bytes: int) -> Iterator:
+    pool = WorkerPool(workers, max_tasks=10 ** 9, gdal_options=GDAL_OPTIONS)
+    pool.start()
+    try:
+        yield ProcessBasedExecutor(analysis, paths, progress, pool=pool, split_bytes=split_bytes)
+    finally:
+        pool.shutdown()
+
+
+def _run_node(addresses, authkey: str) -> None:
+    node = AnalysisNode(("127.0.0.1", 0), authkey)
+    addresses.put(node.address)
+    node.serve_forever()
+
+
+@contextlib.contextmanager
+def _distributed(analysis: Analysis, paths: List[str], progress, workers: int, split_bytes: int) -> Iterator:
+    # Local nodes of a single slot stand in for remote hosts
+    authkey = secrets.token_hex(16)
+    addresses = multiprocessing.Queue()
+    nodes = [multiprocessing.Process(target=_run_node, args=(addresses, authkey), daemon=True)
+             for _ in range(workers)]
+    for node in nodes:
+        node.start()
+    try:
+        yield DistributedExecutor(analysis, paths, progress, nodes=[addresses.get(timeout=30) for _ in nodes],
+                                  authkey=authkey, slots=1, split_bytes=split_bytes)
+    finally:
+        for node in nodes:
+            node.terminate()
+            node.join()
+
+
+EXECUTOR_FACTORIES: Dict[str, Callable[..., ContextManager[ExecutorBase]]] = {
+    "SEQUENTIAL": _sequential,
+    "THREAD": _thread,
+    "PROCESS": _process,
+    "DISTRIBUTED": _distributed,
+}
+
+
+def _peak_rss_mb(who: int) -> float:
+    # Linux reports kilobytes, macOS bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss * scale / 2 ** 20, 1)
+
+
+def run_configuration(args, paths: List[str], executor_name: str, workers: int) -> Dict[str, Any]:
+    """Runs an executor repeatedly over a dataset, and measures its best run"""
+    analysis_types = args.analysis.split(",")
+    analysis_types = analysis_types if len(analysis_types) > 1 else analysis_types[0]
+    timings = []
+    bytes_read = 0
+    result = None
+    for _ in range(args.repeat):
+        analysis = create_analysis(analysis_types)
+        image_results: List[ImageResult] = []
+        with EXECUTOR_FACTORIES[executor_name](analysis, paths, image_results.append, workers,
+                                               args.split_mb * 1024 * 1024) as executor:
+            start = time.perf_counter()
+            executor.execute()
+            timings.append(time.perf_counter() - start)
+        bytes_read = sum(image_result.bytes_read for image_result in image_results)
+        result = analysis.result()
+
+    seconds = min(timings)
+    pixels = len(paths) * args.size * args.size * args.bands
+    return {
+        "executor": executor_name,
+        "workers": workers,
+        "seconds": round(seconds, 4),
+        "mean_seconds": round(float(np.mean(timings)), 4),
+        "bytes_read": bytes_read,
+        "mb_per_second": round(bytes_read / seconds / 10 ** 6, 2),
+        "pixels_per_second": round(pixels / seconds),
+        # Peaks of this configuration only, its process is forked for it
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_worker_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "result": result,
+    }
+
+
+def _run_isolated(queue, args, paths: List[str], executor_name: str, workers: int) -> None:
+    try:
+        queue.put(run_configuration(args, paths, executor_name, workers))
+    except Exception as exception:
+        queue.put({"executor": executor_name, "workers": workers, "error": repr(exception)})
+
+
+def run_isolated(args, paths: List[str], executor_name: str, workers: int) -> Dict[str, Any]:
+    """Runs a configuration in a forked process, so that its peak memory is its own.
+    Tile statistics of a previous configuration are removed, each configuration writes its own
+    """
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(sidecar_path(path))
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_run_isolated, args=(queue, args, paths, executor_name, workers))
+    process.start()
+    measurement = queue.get()
+    process.join()
+    return measurement
+
+
+def add_scaling(measurements: List[Dict[str, Any]]) -> None:
+    """Adds speedup over the sequential executor, or else over the fewest workers of an executor,
+    and scaling efficiency, the speedup per worker"""
+    valid = [measurement for measurement in measurements if "error" not in measurement]
+    sequential = [measurement for measurement in valid if measurement["executor"] == "SEQUENTIAL"]
+    for measurement in valid:
+        if sequential:
+            reference_seconds = sequential[0]["seconds"]
+        else:
+            fewest = min((other for other in valid if other["executor"] == measurement["executor"]),
+                         key=lambda other: other["workers"])
+            reference_seconds = fewest["seconds"] * fewest["workers"]
+        speedup = reference_seconds / measurement["seconds"]
+        measurement["speedup"] = round(speedup, 3)
+        measurement["scaling_efficiency"] = round(speedup / measurement["workers"], 3)
+
+
+def compare_with_baseline(measurements: List[Dict[str, Any]], baseline_path: str,
+                          tolerance: float) -> List[Dict[str, Any]]:
+    """Returns configurations whose throughput fell by more than tolerance against a previous run"""
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = {(measurement["executor"], measurement["workers"]): measurement
+                    for measurement in json.load(baseline_file)["measurements"] if "error" not in measurement}
+    regressions = []
+    for measurement in measurements:
+        previous = baseline.get((measurement["executor"], measurement["workers"]))
+        if previous is None or "error" in measurement:
+            continue
+        change = measurement["pixels_per_second"] / previous["pixels_per_second"] - 1
+        if change < -tolerance:
+            regressions.append({"executor": measurement["executor"], "workers": measurement["workers"],
+                                "pixels_per_second": measurement["pixels_per_second"],
+                                "baseline_pixels_per_second": previous["pixels_per_second"],
+                                "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    args = parse_arguments()
+    executors = [name.strip().upper() for name in args.executors.split(",") if name.strip()]
+    unknown = [name for name in executors if name not in EXECUTOR_FACTORIES]
+    if unknown:
+        raise SystemExit(f"Unknown executors: {', '.join(unknown)}")
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+    # Every run reads pixels unless asked otherwise. Workers of pools and nodes are spawned, and read the setting
+    # from the environment, while forked configurations inherit it
+    os.environ["TILE_STATISTICS_ENABLED"] = "1" if args.tile_statistics else "0"
+    analysis_executor.TILE_STATISTICS_ENABLED = args.tile_statistics
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = create_dataset(directory, args.images, args.size, bands=args.bands, dtype=args.dtype,
+                               block_size=args.block_size, compress=args.compress, tiled=not args.untiled,
+                               nodata_fraction=args.nodata_fraction)
+        dataset_bytes = sum(os.path.getsize(path) for path in paths)
+        measurements = []
+        for executor_name in executors:
+            # A sequential executor has a single worker whatever the count
+            for workers in [1] if executor_name == "SEQUENTIAL" else worker_counts:
+                measurements.append(run_isolated(args, paths, executor_name, workers))
+    add_scaling(measurements)
+
+    report = {
+        "parameters": {name: value for name, value in vars(args).items()
+                       if name not in ("output", "baseline", "tolerance")},
+        "dataset": {"images": len(paths), "file_bytes": dataset_bytes},
+        "environment": {"cpu_count": os.cpu_count(), "python": platform.python_version(),
+                        "numpy": np.__version__, "rasterio": rasterio.__version__,
+                        "gdal": rasterio.__gdal_version__, "gdal_options": GDAL_OPTIONS},
+        "measurements": measurements,
+    }
+    if args.baseline:
+        report["regressions"] = compare_with_baseline(measurements, args.baseline, args.tolerance)
+
+    output = json.dumps(report, indent=4, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+    if any("error" in measurement for measurement in measurements) or report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import asyncio
 import functools
+import json
 import logging
 import os
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from .service.analysis_executor import ProcessBasedExecutor, get_executor_type
 from .service.analyze_service import AnalyzeService
+from .service.jobs import Job, JobManager
+from .service.metrics import analysis_metrics
+from .service.scheduler import AnalysisScheduler, SchedulerSaturatedError
 from .service.types import AnalysisRequest
+from .service.worker_pool import PoolHealth, worker_pool
+from .utils.constants import ANALYSIS_CONCURRENCY, ANALYSIS_QUEUE_SIZE, JOB_EVENTS_INTERVAL, JOB_HISTORY_SIZE
 
 
 def configure_logging(log_level: str) -> None:
@@ -21,6 +30,8 @@ def configure_logging(log_level: str) -> None:
 configure_logging(os.environ.get("LOG_LEVEL", "DEBUG"))
 LOGGER = logging.getLogger("Service")
 app = FastAPI()
+scheduler = AnalysisScheduler(ANALYSIS_CONCURRENCY, ANALYSIS_QUEUE_SIZE)
+jobs = JobManager(scheduler, JOB_HISTORY_SIZE)
 
 
 def with_general_exception_handling(func):
@@ -29,23 +40,108 @@ def with_general_exception_handling(func):
     async def wrapped(*args, **kwargs):
         try:
             return await func(*args, **kwargs)
+        except HTTPException:
+            raise
+        except SchedulerSaturatedError as exception:
+            LOGGER.warning("Rejecting request: %s", str(exception))
+            raise HTTPException(status_code=503, detail="Service is busy, please retry later.",
+                                headers={"Retry-After": "30"})
         except Exception as exception:
             LOGGER.exception(exception)
             raise HTTPException(status_code=500, detail="An unknown error has occured.")
     return wrapped
 
 
+@app.on_event("startup")
+def start_workers():
+    scheduler.start()
+    if get_executor_type() is ProcessBasedExecutor:
+        worker_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    scheduler.shutdown()
+    worker_pool.shutdown()
+
+
 @app.post("/analyze")
 @with_general_exception_handling
 async def dataset_mean_value(request: AnalysisRequest):
     """Calculate mean value for images"""
     LOGGER.info("Received Request: %s", request)
     service = AnalyzeService()
-    result = service.analyze(request.name)
-    LOGGER.info("Response: {%.2f}", result)
+    result = await scheduler.run(request.json(), service.analyze_request, request)
+    LOGGER.info("Response: %s", result)
     return result
 
 
+@app.post("/jobs", status_code=202)
+@with_general_exception_handling
+async def submit_job(request: AnalysisRequest):
+    """Start an analysis in background and return its job"""
+    LOGGER.info("Received Job Request: %s", request)
+    job = jobs.submit(request)
+    return job.to_dict()
+
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} does not exist.")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+@with_general_exception_handling
+async def job_status(job_id: str):
+    """Report status, progress and current result of a job"""
+    return _get_job(job_id).to_dict()
+
+
+async def _job_events(job: Job):
+    """Yields a server-sent event whenever the job changes, until it finishes"""
+    version = None
+    while True:
+        if job.version != version:
+            version = job.version
+            snapshot = job.to_dict()
+            finished = snapshot["status"] not in ("PENDING", "RUNNING")
+            event = snapshot["status"].lower() if finished else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+            if finished:
+                return
+        await asyncio.sleep(JOB_EVENTS_INTERVAL)
+
+
+@app.get("/jobs/{job_id}/events")
+@with_general_exception_handling
+async def job_events(job_id: str):
+    """Stream progress and running result of a job as server-sent events"""
+    return StreamingResponse(_job_events(_get_job(job_id)), media_type="text/event-stream")
+
+
+@app.get("/health")
+@with_general_exception_handling
+async def health():
+    """Check that analysis workers respond"""
+    health = PoolHealth.HEALTHY
+    if get_executor_type() is ProcessBasedExecutor:
+        health = await asyncio.get_running_loop().run_in_executor(None, worker_pool.check_health)
+    if health is PoolHealth.BROKEN:
+        raise HTTPException(status_code=503, detail="Analysis workers have died, they are being replaced.")
+    # Busy workers are alive, their analyses are not interrupted
+    return {"status": "OK", "workers": health.value}
+
+
+@app.get("/metrics")
+@with_general_exception_handling
+async def metrics():
+    """Report totals of analyses, and load of the service, in Prometheus text format"""
+    gauges = {"running_jobs": scheduler.running, "queued_jobs": scheduler.queued}
+    return PlainTextResponse(analysis_metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/operations")
 @with_general_exception_handling
 async def supported_operations():
@@ -1,29 +1,89 @@
-import ctypes
+import contextlib
 import enum
+import hashlib
+import inspect
 import logging
 
 from abc import ABC, abstractmethod
-from multiprocessing import Manager
-from typing import Any, Dict, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
+
+from raster_analysis_service.utils.file_io import item_date, item_tile, split_asset_name
+from .composite import (
+    CompositeMethod,
+    composite_chunks,
+    get_composite_method,
+    group_stacks,
+    scene_classification_path,
+)
+from .partials import (
+    GroupedPartial,
+    HistogramPartial,
+    MeanPartial,
+    MinMaxPartial,
+    MomentsPartial,
+    Partial,
+    QuantileSketch,
+    _valid_values,
+)
+from .spectral_index import get_spectral_index, index_chunks, scene_band_path, scene_item_path, select_scenes
+from .tile_statistics import HISTOGRAM_BINS, HISTOGRAM_RANGE, TileStatistics
 from .types import RasterImage
 
 
 LOGGER = logging.getLogger("Analysis")
-manager = Manager()
 
 
 class Analysis(ABC):
     """Base class to use for analysis on raster data
+
+    Analyses keep a local partial state. Each worker adds images to its own
+    copy of an analysis and returns its partial, which is merged by parent.
     """
     @abstractmethod
-    def add(self, raster_image: RasterImage) -> None:
+    def add(self, raster_image: RasterImage, tile_statistics: Optional[TileStatistics] = None) -> None:
         """Adds a new raster image to current set
         Later, analysis will be calculated over these set
 
         Args:
             raster_image (RasterImage): image to analyze
+            tile_statistics (Optional[TileStatistics], optional): precomputed statistics of the image,
+                which may be reduced instead of its pixels. Defaults to None.
+        """
+
+    def uses_tile_statistics(self) -> bool:
+        """Returns True if analysis can be computed from precomputed tile statistics of images
+        """
+        return False
+
+    def builds_tile_statistics(self, raster_image: RasterImage) -> bool:
+        """Returns True if tile statistics of an image which has none are worth computing while adding it,
+        as the analysis reads every pixel of the image anyway and would reduce its statistics
+        """
+        return False
+
+    def select_images(self, image_paths: List[str]) -> List[str]:
+        """Returns images of a dataset to add to the analysis. By default, every image
+        """
+        return image_paths
+
+    def input_paths(self, image_path: str) -> List[str]:
+        """Returns files which the partial state of a selected image is computed from. By default, the image
+        """
+        return [image_path]
+
+    @abstractmethod
+    def partial(self) -> Partial:
+        """Returns current partial state of an analysis
+        """
+
+    @abstractmethod
+    def merge(self, partial: Partial) -> None:
+        """Merges a partial state, computed by another worker, into current state
+
+        Args:
+            partial (Partial): partial state of an analysis of same type
         """
 
     @abstractmethod
@@ -31,40 +91,542 @@ class Analysis(ABC):
         """Returns result of an analysis
         """
 
+    def options(self) -> Dict[str, Any]:
+        """Returns configuration of an analysis, as its keyword arguments
+        """
+        return {}
+
+    def spawn(self) -> "Analysis":
+        """Creates an empty analysis with the same configuration.
+        Workers use spawned analyses to accumulate their local state
+        """
+        return type(self)(**self.options())
+
+    def cache_key(self) -> str:
+        """Returns a key which identifies partial states of this analysis and its configuration
+        """
+        options = "".join(f":{name}={value}" for name, value in sorted(self.options().items()))
+        return type(self).__name__ + options
+
 
-class MeanValueAnalysis(Analysis):
-    """A class to calculate mean of all pixel values within an image
+class GroupBy(enum.Enum):
+    """Keys to group statistics of an analysis by"""
+    ASSET = "ASSET"
+    BAND = "BAND"
+    # MGRS tile and acquisition date of the item of an image, taken from its file name
+    TILE = "TILE"
+    DATE = "DATE"
+
+
+# Group of images whose item id has no tile or date
+UNKNOWN_GROUP = "UNKNOWN"
+
+
+class TileStatisticsReducer(ABC):
+    """Base class of chunk analyses which can reduce precomputed tile statistics of images instead of their pixels
     """
-    pixel_count: manager.Value
-    average_mean: manager.Value
+    @abstractmethod
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> Partial:
+        """Reduces statistics of selected tiles of a band into a partial state"""
+
+
+class ChunkAnalysis(Analysis):
+    """Base class of analyses which reduce streamed image chunks into partial states.
+    Partial states are optionally kept per asset, tile and date of an item and per band of an image,
+    so that grouped statistics, such as time series, are computed in a single read of each image.
+    With a composite, images of a tile are stacked over dates and reduced per pixel first
+    """
+    _overview_level: int
+    _masked: bool
+    _group_by: Tuple[GroupBy, ...]
+    _aoi: Optional[Dict[str, Any]]
+    _index: Optional[str]
+    _composite: Optional[CompositeMethod]
+    _cloud_mask: bool
+    _stacks: Dict[str, List[str]]
+    _partial: Partial
+
+    def __init__(self, overview_level: int = 0, masked: bool = True, group_by: Sequence[GroupBy] = (),
+                 aoi: Optional[Dict[str, Any]] = None, index: Optional[str] = None, composite: Optional[str] = None,
+                 cloud_mask: bool = True) -> None:
+        """Creates an empty analysis
+
+        Args:
+            overview_level (int, optional): Level of decimation, 0 reads full resolution. Defaults to 0.
+            masked (bool, optional): If True, nodata and masked pixels are skipped. Defaults to True.
+            group_by (Sequence[GroupBy], optional): Keys to group results by, in nesting order.
+                Defaults to no grouping.
+            aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. If given, only pixels
+                within it are analyzed. Defaults to None.
+            index (Optional[str], optional): A spectral index, such as NDVI. If given, values of the index
+                over scenes are analyzed instead of pixel values of images. Defaults to None.
+            composite (Optional[str], optional): A composite method, MEDIAN or MEAN. If given, images of each
+                tile and asset are stacked over dates, and values of their per-pixel composite are analyzed.
+                Defaults to None.
+            cloud_mask (bool, optional): If True, composites leave out cloudy pixels, according to the SCL
+                asset of each scene. Defaults to True.
+
+        Raises:
+            ValueError: If an invalid spectral index or composite method is given, or if a composite
+                is grouped by date
+        """
+        self._overview_level = overview_level
+        self._masked = masked
+        self._group_by = tuple(GroupBy(key) for key in group_by)
+        self._aoi = aoi
+        self._index = get_spectral_index(index).name if index else None
+        self._composite = get_composite_method(composite) if composite else None
+        self._cloud_mask = cloud_mask
+        if self._composite and GroupBy.DATE in self._group_by:
+            message = "Composites merge dates, they can not be grouped by date"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._stacks = {}
+        self._partial = GroupedPartial() if self._group_by else self._empty_partial()
 
-    def __init__(self) -> None:
-        self.pixel_count = manager.Value(ctypes.c_double, 0.0)
-        self.average_mean = manager.Value(ctypes.c_double, 0.0)
+    @abstractmethod
+    def _empty_partial(self) -> Partial:
+        """Returns partial state of an analysis without any pixel"""
+
+    @abstractmethod
+    def _chunk_partial(self, chunk: np.ndarray) -> Partial:
+        """Reduces pixel values of a chunk, or of a band of a chunk, into a partial state"""
+
+    @abstractmethod
+    def _partial_result(self, partial: Partial) -> Any:
+        """Returns result of an analysis over given partial state"""
+
+    def _accepts_tile_statistics(self, tile_statistics: TileStatistics) -> bool:
+        """Checks if statistics were computed over the same pixels and bins as this analysis would reduce"""
+        return self._accepts_statistics(tile_statistics.has_mask, tile_statistics.histogram_bins,
+                                        tile_statistics.histogram_range)
+
+    def _accepts_statistics(self, has_mask: bool, histogram_bins: int, histogram_range: Tuple[float, float]) -> bool:
+        """Checks if statistics of an image, with or without a mask, and with given histogram bins would be reduced"""
+        return self.uses_tile_statistics() and (self._masked or not has_mask)
+
+    def uses_tile_statistics(self) -> bool:
+        return (isinstance(self, TileStatisticsReducer) and self._overview_level == 0 and not self._index
+                and not self._composite)
+
+    def builds_tile_statistics(self, raster_image: RasterImage) -> bool:
+        # Within an area of interest, only intersecting windows of the image are read
+        return not self._aoi and self._accepts_statistics(raster_image.has_mask(), HISTOGRAM_BINS, HISTOGRAM_RANGE)
+
+    def select_images(self, image_paths: List[str]) -> List[str]:
+        """Keeps a reference image per stack for a composite, a reference band image per scene for an index,
+        every image otherwise"""
+        if self._composite:
+            self._stacks = group_stacks(image_paths, get_spectral_index(self._index) if self._index else None)
+            return list(self._stacks)
+        if self._index:
+            return select_scenes(image_paths, get_spectral_index(self._index))
+        return image_paths
+
+    def input_paths(self, image_path: str) -> List[str]:
+        """Returns every date of the stack of a reference image for a composite, with scene classifications
+        of dates if clouds are masked, and the other band and STAC item of each scene for an index"""
+        spectral_index = get_spectral_index(self._index) if self._index else None
+        paths = []
+        for path in self._stacks.get(image_path, [image_path]) if self._composite else [image_path]:
+            paths.append(path)
+            if spectral_index:
+                # A scene without the band fails to be analyzed, and is not cached
+                with contextlib.suppress(FileNotFoundError):
+                    paths.append(scene_band_path(path, spectral_index.negative))
+                paths.append(scene_item_path(path))
+            if self._composite and self._cloud_mask and (scl_path := scene_classification_path(path)):
+                paths.append(scl_path)
+        return paths
+
+    def options(self) -> Dict[str, Any]:
+        options = {"overview_level": self._overview_level, "masked": self._masked}
+        if self._group_by:
+            options["group_by"] = tuple(key.value for key in self._group_by)
+        if self._aoi:
+            options["aoi"] = self._aoi
+        if self._index:
+            options["index"] = self._index
+        if self._composite:
+            options["composite"] = self._composite.value
+            options["cloud_mask"] = self._cloud_mask
+        return options
+
+    def spawn(self) -> "ChunkAnalysis":
+        analysis = super().spawn()
+        analysis._stacks = self._stacks
+        return analysis
+
+    def cache_key(self) -> str:
+        if not self._composite:
+            return super().cache_key()
+        # A composite of a reference image depends on the other images of its stack
+        stacks = "\n".join(",".join(stack) for stack in self._stacks.values())
+        return f"{super().cache_key()}:stacks={hashlib.sha1(stacks.encode()).hexdigest()}"
+
+    def add(self, raster_image: RasterImage, tile_statistics: Optional[TileStatistics] = None) -> None:
+        keys = self._image_keys(raster_image) if self._group_by else {}
+        if tile_statistics is not None and self._accepts_tile_statistics(tile_statistics):
+            self._add_tiles(raster_image, keys, tile_statistics)
+            return
+        chunk_options = {"decimation": 2 ** self._overview_level, "masked": self._masked}
+        if self._aoi:
+            chunk_options["aoi"] = self._aoi
+        spectral_index = get_spectral_index(self._index) if self._index else None
+        if self._composite:
+            stack_paths = self._stacks.get(raster_image.raster_image_path, [raster_image.raster_image_path])
+            chunks = composite_chunks(raster_image, stack_paths, self._composite, self._cloud_mask, spectral_index,
+                                      **chunk_options)
+        elif spectral_index:
+            chunks = index_chunks(raster_image, spectral_index, **chunk_options)
+        else:
+            chunks = raster_image.chunks(**chunk_options)
+        for chunk in chunks:
+            self._add_chunk(raster_image, keys, chunk)
+
+    def _image_keys(self, raster_image: RasterImage) -> Dict[GroupBy, str]:
+        """Returns group keys of an image, but its bands"""
+        item_id, asset_key = split_asset_name(raster_image.raster_image_path)
+        date = item_date(item_id)
+        return {
+            # Images are reference bands of scenes, results are grouped by index instead of asset
+            GroupBy.ASSET: self._index or asset_key,
+            GroupBy.TILE: item_tile(item_id) or UNKNOWN_GROUP,
+            GroupBy.DATE: date.isoformat() if date else UNKNOWN_GROUP,
+        }
+
+    def _add_chunk(self, raster_image: RasterImage, keys: Dict[GroupBy, str], chunk: np.ndarray) -> None:
+        if GroupBy.BAND in self._group_by:
+            for band_index, band_chunk in zip(raster_image.raster_data.indexes, chunk):
+                self._add_partial(keys, band_index, self._chunk_partial(band_chunk))
+        else:
+            self._add_partial(keys, None, self._chunk_partial(chunk))
+
+    def _add_partial(self, keys: Dict[GroupBy, str], band_index: Optional[int], partial: Partial) -> None:
+        if not self._group_by:
+            self._partial = self._partial.merge(partial)
+        elif GroupBy.BAND in self._group_by:
+            self._partial.add(self._group_key({**keys, GroupBy.BAND: str(band_index)}), partial)
+        else:
+            self._partial.add(self._group_key(keys), partial)
+
+    def _add_tiles(self, raster_image: RasterImage, keys: Dict[GroupBy, str],
+                   tile_statistics: TileStatistics) -> None:
+        """Reduces statistics of tiles within the area of interest, and pixels of tiles on its boundary.
+        Covered tiles are reduced by the first part of an image, tiles on the boundary are shared by all parts
+        """
+        covered, boundary = raster_image.tile_coverage(tile_statistics, self._aoi)
+        if raster_image.part == 0:
+            for band, band_index in enumerate(raster_image.raster_data.indexes):
+                self._add_partial(keys, band_index, self._tiles_partial(tile_statistics, band, covered))
+        start = len(boundary) * raster_image.part // raster_image.parts
+        stop = len(boundary) * (raster_image.part + 1) // raster_image.parts
+        for window, outside in boundary[start:stop]:
+            block = raster_image.read_block(window, self._masked)
+            invalid = np.broadcast_to(outside, block.shape) | np.ma.getmaskarray(block)
+            if not invalid.all():
+                self._add_chunk(raster_image, keys, np.ma.MaskedArray(np.ma.getdata(block), mask=invalid))
 
-    def add(self, raster_image: RasterImage) -> None:
-        image_array = raster_image.array()
+    def _group_key(self, keys: Dict[GroupBy, str]) -> Tuple[str, ...]:
+        return tuple(keys[key] for key in self._group_by)
 
-        image_pixel_count = np.prod(image_array.shape)
-        image_sum = image_array.sum()
+    def partial(self) -> Partial:
+        return self._partial
 
-        self.average_mean.value = (self.average_mean.value * self.pixel_count.value + image_sum) / (self.pixel_count.value + image_pixel_count)
-        self.pixel_count.value += image_pixel_count
+    def merge(self, partial: Partial) -> None:
+        self._partial = self._partial.merge(partial)
 
     def result(self):
-        return self.average_mean.value
+        return self._grouped(self._partial_result)
+
+    def _grouped(self, partial_result: Callable[[Partial], Any]):
+        """Applies a function to the partial state, or to the partial state of every group,
+        nested by grouping key
+        """
+        if not self._group_by:
+            return partial_result(self._partial)
+        results: Dict[str, Any] = {}
+        for key in sorted(self._partial.groups):
+            group = results
+            for name in key[:-1]:
+                group = group.setdefault(name, {})
+            group[key[-1]] = partial_result(self._partial.groups[key])
+        return results
+
+
+class MeanValueAnalysis(ChunkAnalysis, TileStatisticsReducer):
+    """A class to calculate mean of all pixel values within an image.
+    With an overview level, the mean is approximated from images decimated
+    by 2^level on both axes, and reported along with its standard error
+    """
+    @property
+    def pixel_count(self) -> Union[int, Dict[str, Any]]:
+        """Number of pixels the mean covers, per group for a grouped analysis"""
+        return self._grouped(lambda partial: partial.count)
+
+    def _empty_partial(self) -> Union[MeanPartial, MomentsPartial]:
+        return MomentsPartial() if self._overview_level else MeanPartial()
+
+    def _chunk_partial(self, chunk: np.ndarray) -> Union[MeanPartial, MomentsPartial]:
+        if self._overview_level:
+            return MomentsPartial.from_array(chunk)
+        return MeanPartial.from_array(chunk)
+
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> MeanPartial:
+        return tile_statistics.mean_partial(band, tiles)
+
+    def _partial_result(self, partial: Union[MeanPartial, MomentsPartial]):
+        if not self._overview_level:
+            return partial.mean()
+        return {
+            "value": partial.mean,
+            "error": partial.standard_error(),
+            "overview_level": self._overview_level,
+            "sampled_pixels": partial.count,
+        }
+
+
+class MinValueAnalysis(ChunkAnalysis, TileStatisticsReducer):
+    """A class to calculate minimum of all pixel values, None if there is no pixel"""
+    def _empty_partial(self) -> MinMaxPartial:
+        return MinMaxPartial()
+
+    def _chunk_partial(self, chunk: np.ndarray) -> MinMaxPartial:
+        return MinMaxPartial.from_array(chunk)
+
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> MinMaxPartial:
+        return tile_statistics.min_max_partial(band, tiles)
+
+    def _partial_result(self, partial: MinMaxPartial):
+        return partial.minimum
+
+
+class MaxValueAnalysis(MinValueAnalysis):
+    """A class to calculate maximum of all pixel values, None if there is no pixel"""
+    def _partial_result(self, partial: MinMaxPartial):
+        return partial.maximum
+
+
+class VarianceAnalysis(ChunkAnalysis, TileStatisticsReducer):
+    """A class to calculate sample variance of all pixel values.
+    Partial states are merged with the parallel algorithm of Chan et al.
+    """
+    def _empty_partial(self) -> MomentsPartial:
+        return MomentsPartial()
+
+    def _chunk_partial(self, chunk: np.ndarray) -> MomentsPartial:
+        return MomentsPartial.from_array(chunk)
+
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> MomentsPartial:
+        return tile_statistics.moments_partial(band, tiles)
+
+    def _partial_result(self, partial: MomentsPartial):
+        return partial.variance()
+
+
+class StandardDeviationAnalysis(VarianceAnalysis):
+    """A class to calculate sample standard deviation of all pixel values"""
+    def _partial_result(self, partial: MomentsPartial):
+        return float(np.sqrt(partial.variance()))
+
+
+class HistogramAnalysis(ChunkAnalysis, TileStatisticsReducer):
+    """A class to count pixel values in equally sized bins over a fixed range"""
+    _histogram_bins: int
+    _histogram_range: Tuple[float, float]
+
+    def __init__(self, histogram_bins: int = 64, histogram_range: Sequence[float] = (0, 10000), **options) -> None:
+        """Creates an empty analysis
+
+        Args:
+            histogram_bins (int, optional): Number of bins. Defaults to 64.
+            histogram_range (Sequence[float], optional): Lower and upper edges of the bins.
+                Defaults to (0, 10000), reflectances of Sentinel-2 L2A products.
+            **options: options of ChunkAnalysis
+
+        Raises:
+            ValueError: If lower edge of the range is not below its upper edge
+        """
+        if not histogram_range[0] < histogram_range[1]:
+            message = f"Invalid histogram range: {tuple(histogram_range)}, lower edge should be below upper one"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._histogram_bins = histogram_bins
+        self._histogram_range = tuple(histogram_range)
+        super().__init__(**options)
+
+    def options(self) -> Dict[str, Any]:
+        return {**super().options(), "histogram_bins": self._histogram_bins, "histogram_range": self._histogram_range}
+
+    def _empty_partial(self) -> HistogramPartial:
+        return HistogramPartial(self._histogram_bins, self._histogram_range)
+
+    def _chunk_partial(self, chunk: np.ndarray) -> HistogramPartial:
+        return HistogramPartial.from_array(chunk, self._histogram_bins, self._histogram_range)
+
+    def _accepts_statistics(self, has_mask: bool, histogram_bins: int, histogram_range: Tuple[float, float]) -> bool:
+        return (super()._accepts_statistics(has_mask, histogram_bins, histogram_range)
+                and histogram_bins == self._histogram_bins and tuple(histogram_range) == self._histogram_range)
+
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> HistogramPartial:
+        return tile_statistics.histogram_partial(band, tiles)
+
+    def _partial_result(self, partial: HistogramPartial):
+        return {
+            "edges": partial.edges(),
+            "counts": partial.counts[1:-1].tolist(),
+            "underflow": int(partial.counts[0]),
+            "overflow": int(partial.counts[-1]),
+        }
+
+
+class PercentilesAnalysis(ChunkAnalysis):
+    """A class to approximate percentiles of pixel values with a mergeable quantile sketch.
+    Reported values are within given relative accuracy of a pixel value at that rank
+    """
+    _percentiles: Tuple[float, ...]
+    _relative_accuracy: float
+
+    def __init__(self, percentiles: Sequence[float] = (5, 25, 50, 75, 95), relative_accuracy: float = 0.01,
+                 **options) -> None:
+        """Creates an empty analysis
+
+        Args:
+            percentiles (Sequence[float], optional): Percentiles to report, between 0 and 100.
+                Defaults to (5, 25, 50, 75, 95).
+            relative_accuracy (float, optional): Relative error bound of the sketch. Defaults to 0.01.
+            **options: options of ChunkAnalysis
+
+        Raises:
+            ValueError: If a percentile is not between 0 and 100
+        """
+        if any(not 0 <= percentile <= 100 for percentile in percentiles):
+            message = f"Invalid percentiles: {tuple(percentiles)}, they should be between 0 and 100"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._percentiles = tuple(percentiles)
+        self._relative_accuracy = relative_accuracy
+        super().__init__(**options)
+
+    def options(self) -> Dict[str, Any]:
+        return {**super().options(), "percentiles": self._percentiles, "relative_accuracy": self._relative_accuracy}
+
+    def _empty_partial(self) -> QuantileSketch:
+        return QuantileSketch(self._relative_accuracy)
+
+    def _chunk_partial(self, chunk: np.ndarray) -> QuantileSketch:
+        return QuantileSketch.from_array(chunk, self._relative_accuracy)
+
+    def _partial_result(self, partial: QuantileSketch):
+        return {f"{percentile:g}": partial.quantile(percentile / 100) for percentile in self._percentiles}
+
+
+class StatisticsAnalysis(ChunkAnalysis, TileStatisticsReducer):
+    """A class to calculate several statistics over a single read of each image.
+    Valid pixels of every chunk are extracted once, then reduced by each statistic,
+    and partial states are kept per statistic
+    """
+    _operations: Tuple["AnalysisType", ...]
+    _statistics: Dict[str, ChunkAnalysis]
+
+    def __init__(self, operations: Sequence[Union[str, "AnalysisType"]], **options) -> None:
+        """Creates an empty analysis
+
+        Args:
+            operations (Sequence[Union[str, AnalysisType]]): Statistics to calculate
+            **options: options of ChunkAnalysis, and of the statistics
+
+        Raises:
+            ValueError: If no or an invalid statistic is given
+        """
+        if not operations:
+            message = "At least one analysis type is required"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._operations = tuple(dict.fromkeys(_analysis_type(operation) for operation in operations))
+        self._statistics = {}
+        for operation in self._operations:
+            analysis_class = _ANALYSIS_TYPE_TO_CLASS[operation]
+            # Statistics only reduce chunks, grouping is done once by this analysis
+            statistic_options = {**_accepted_options(analysis_class, options), "group_by": ()}
+            self._statistics[operation.value] = analysis_class(**statistic_options)
+        chunk_options = {name: options[name] for name in ("overview_level", "masked", "group_by", "aoi", "index",
+                                                          "composite", "cloud_mask")
+                         if name in options}
+        super().__init__(**chunk_options)
+
+    def options(self) -> Dict[str, Any]:
+        options = {"operations": tuple(operation.value for operation in self._operations)}
+        for statistic in self._statistics.values():
+            options.update(statistic.options())
+        options.update(super().options())
+        return options
+
+    def _empty_partial(self) -> GroupedPartial:
+        return GroupedPartial({name: statistic._empty_partial() for name, statistic in self._statistics.items()})
+
+    def _chunk_partial(self, chunk: np.ndarray) -> GroupedPartial:
+        # Statistics do not depend on the layout of pixels, so masked and NaN pixels are dropped once for all of them
+        values = _valid_values(chunk)
+        return GroupedPartial({name: statistic._chunk_partial(values) for name, statistic in self._statistics.items()})
+
+    def uses_tile_statistics(self) -> bool:
+        return all(statistic.uses_tile_statistics() for statistic in self._statistics.values())
+
+    def _accepts_statistics(self, has_mask: bool, histogram_bins: int, histogram_range: Tuple[float, float]) -> bool:
+        return all(statistic._accepts_statistics(has_mask, histogram_bins, histogram_range)
+                   for statistic in self._statistics.values())
+
+    def _tiles_partial(self, tile_statistics: TileStatistics, band: int, tiles: np.ndarray) -> GroupedPartial:
+        return GroupedPartial({name: statistic._tiles_partial(tile_statistics, band, tiles)
+                               for name, statistic in self._statistics.items()})
+
+    def _partial_result(self, partial: GroupedPartial):
+        return {name: statistic._partial_result(partial.groups[name]) for name, statistic in self._statistics.items()}
 
 
 class AnalysisType(enum.Enum):
     """A list of available analysis types"""
     MEAN_VALUE = "MEAN_VALUE"
+    MIN_VALUE = "MIN_VALUE"
+    MAX_VALUE = "MAX_VALUE"
+    VARIANCE = "VARIANCE"
+    STANDARD_DEVIATION = "STANDARD_DEVIATION"
+    HISTOGRAM = "HISTOGRAM"
+    PERCENTILES = "PERCENTILES"
 
 
 _ANALYSIS_TYPE_TO_CLASS: Dict[AnalysisType, Any] = {
-    AnalysisType.MEAN_VALUE: MeanValueAnalysis
+    AnalysisType.MEAN_VALUE: MeanValueAnalysis,
+    AnalysisType.MIN_VALUE: MinValueAnalysis,
+    AnalysisType.MAX_VALUE: MaxValueAnalysis,
+    AnalysisType.VARIANCE: VarianceAnalysis,
+    AnalysisType.STANDARD_DEVIATION: StandardDeviationAnalysis,
+    AnalysisType.HISTOGRAM: HistogramAnalysis,
+    AnalysisType.PERCENTILES: PercentilesAnalysis,
 }
 
 
+def _analysis_type(analysis_type: Union[str, AnalysisType]) -> AnalysisType:
+    if isinstance(analysis_type, str):
+        try:
+            return AnalysisType[analysis_type]
+        except KeyError as error:
+            message = f"Invalid analysis type: {error}"
+            LOGGER.error(message)
+            raise ValueError(message) from error
+    return analysis_type
+
+
+def _accepted_options(analysis_class, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns options which are keyword arguments of an analysis class, or of its bases"""
+    accepted = set()
+    for cls in analysis_class.__mro__:
+        if "__init__" in vars(cls):
+            accepted.update(inspect.signature(cls.__init__).parameters)
+    return {name: value for name, value in options.items() if name in accepted}
+
+
 def get_analysis(analysis_type: Union[str, AnalysisType]):
     """Retrieves analysis class based on given type
 
@@ -77,11 +639,24 @@ def get_analysis(analysis_type: Union[str, AnalysisType]):
     Returns:
         class: An Analysis class
     """
-    if isinstance(analysis_type, str):
-        try:
-            analysis_type = AnalysisType[analysis_type]
-        except KeyError as error:
-            message = f"Invalid analysis type: {error}"
-            LOGGER.error(message)
-            raise ValueError(message) from error
-    return _ANALYSIS_TYPE_TO_CLASS[analysis_type]
+    return _ANALYSIS_TYPE_TO_CLASS[_analysis_type(analysis_type)]
+
+
+def create_analysis(analysis_types: Union[str, AnalysisType, List[Union[str, AnalysisType]]], **options) -> Analysis:
+    """Creates an empty analysis of given type. A list of types creates a StatisticsAnalysis,
+    which calculates all of them in a single pass and reports results by type name
+
+    Args:
+        analysis_types (Union[str, AnalysisType, List[Union[str, AnalysisType]]]): Name, enum or a list of them
+        **options: configuration of the analysis. Options not used by the analysis are ignored
+
+    Raises:
+        ValueError: If an invalid type is passed, value error is raised
+
+    Returns:
+        Analysis: an empty analysis
+    """
+    if isinstance(analysis_types, (list, tuple)):
+        return StatisticsAnalysis(analysis_types, **options)
+    analysis_class = get_analysis(analysis_types)
+    return analysis_class(**_accepted_options(analysis_class, options))
@@ -0,0 +1,180 @@
+"""Per-pixel composites of a stack of images of the same tile, acquired at different dates
+
+Images of a stack are read window by window on the grid of its reference image, so that
+memory is bounded by the size of a window times the number of dates, never by the scene size.
+"""
+import contextlib
+import enum
+import logging
+import os
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rasterio.enums import Resampling
+
+from raster_analysis_service.utils.constants import ANALYSIS_CHUNK_BYTES
+from raster_analysis_service.utils.file_io import item_date, item_tile, split_asset_name
+from .spectral_index import SpectralIndex, band_scaling, scene_band_path, select_scenes
+from .types import RasterImage
+
+
+LOGGER = logging.getLogger("Analysis")
+
+# Asset of the scene classification of Sentinel-2 L2A products
+SCL_ASSET = "SCL"
+# Scene classes which are not clear observations of the ground:
+# no data, saturated or defective, cloud shadows, cloud medium and high probability, thin cirrus
+CLOUD_CLASSES = (0, 1, 3, 8, 9, 10)
+
+
+class CompositeMethod(enum.Enum):
+    """Reductions of values of a pixel over dates"""
+    MEDIAN = "MEDIAN"
+    MEAN = "MEAN"
+
+
+def get_composite_method(name: str) -> CompositeMethod:
+    """Retrieves a composite method by its name
+
+    Raises:
+        ValueError: If method is not supported
+    """
+    try:
+        return CompositeMethod[name.upper()]
+    except KeyError as error:
+        message = f"Invalid composite method: {error}"
+        LOGGER.error(message)
+        raise ValueError(message) from error
+
+
+def _acquisition_order(image_path: str) -> Tuple[str, str]:
+    item_id = split_asset_name(image_path)[0]
+    date = item_date(item_id)
+    return (date.isoformat() if date else "", image_path)
+
+
+def group_stacks(image_paths: Sequence[str], spectral_index: Optional[SpectralIndex] = None) -> Dict[str, List[str]]:
+    """Groups images by collection, MGRS tile and asset, as laid out by the downloader,
+    into stacks of dates. With an index, scenes which have every band of it are grouped by tile
+
+    Args:
+        image_paths (Sequence[str]): asset files, {collection}/{date}/{item id}_{asset key}.{extension}
+        spectral_index (Optional[SpectralIndex], optional): index to composite. Defaults to None.
+
+    Returns:
+        Dict[str, List[str]]: images of each stack in order of acquisition, by its earliest image,
+            the reference image whose grid the composite is computed on
+    """
+    if spectral_index is not None:
+        image_paths = select_scenes(image_paths, spectral_index)
+    stacks: Dict[Tuple[str, str, str], List[str]] = {}
+    for image_path in image_paths:
+        item_id, asset_key = split_asset_name(image_path)
+        if asset_key == SCL_ASSET:
+            continue
+        collection = os.path.dirname(os.path.dirname(image_path))
+        tile = item_tile(item_id) or item_id
+        stacks.setdefault((collection, tile, asset_key), []).append(image_path)
+    ordered = [sorted(stack, key=_acquisition_order) for stack in stacks.values()]
+    LOGGER.debug("%d images have been grouped into %d stacks", sum(map(len, ordered)), len(ordered))
+    return {stack[0]: stack for stack in ordered}
+
+
+def scene_classification_path(image_path: str) -> Optional[str]:
+    """Returns scene classification file of the scene of an image, None if it has not been downloaded"""
+    item_id, _ = split_asset_name(image_path)
+    directory, extension = os.path.dirname(image_path), os.path.splitext(image_path)[1]
+    scl_path = os.path.join(directory, f"{item_id}_{SCL_ASSET}{extension}")
+    return scl_path if os.path.exists(scl_path) else None
+
+
+class _Date:
+    """Opened images of a date of a stack, which are read window by window"""
+    image: RasterImage
+    negative: Optional[RasterImage]
+    scalings: Optional[Tuple[Tuple[float, float], Tuple[float, float]]]
+    classification: Optional[RasterImage]
+
+    def __init__(self, image: RasterImage, negative: Optional[RasterImage] = None,
+                 classification: Optional[RasterImage] = None) -> None:
+        self.image = image
+        self.negative = negative
+        self.scalings = (band_scaling(image), band_scaling(negative)) if negative is not None else None
+        self.classification = classification
+
+    def images(self) -> List[RasterImage]:
+        return [image for image in (self.image, self.negative, self.classification) if image is not None]
+
+    def read(self, bounds: Tuple[float, float, float, float], shape: Tuple[int, int], resampling: Resampling,
+             masked: bool, spectral_index: Optional[SpectralIndex]) -> np.ma.MaskedArray:
+        """Reads values of a window, or of an index, masking clouds if classification is available"""
+        values = np.ma.asarray(self.image.read_resampled(bounds, shape, resampling, masked))
+        if spectral_index is not None:
+            negative = self.negative.read_resampled(bounds, shape, resampling, masked)
+            values = spectral_index.compute(values[0], negative[0], *self.scalings)[np.newaxis]
+        if self.classification is not None:
+            classes = self.classification.read_resampled(bounds, shape, Resampling.nearest, masked=False)[0]
+            cloudy = np.isin(classes, CLOUD_CLASSES)
+            values = np.ma.MaskedArray(np.ma.getdata(values), mask=np.ma.getmaskarray(values) | cloudy)
+        return values
+
+
+def composite_chunks(raster_image: RasterImage, stack_paths: Sequence[str],
+                     method: CompositeMethod = CompositeMethod.MEDIAN, cloud_mask: bool = True,
+                     spectral_index: Optional[SpectralIndex] = None, resampling: Resampling = Resampling.nearest,
+                     max_chunk_bytes: int = ANALYSIS_CHUNK_BYTES, decimation: int = 1, masked: bool = False,
+                     aoi: Optional[Dict[str, Any]] = None) -> Iterator[np.ndarray]:
+    """Streams a per-pixel composite of a stack of images, window by window.
+    Windows are those of the reference image, and every date of the stack is read resampled onto them.
+    Pixels which are masked, or cloudy according to the scene classification, are left out of the composite
+
+    Args:
+        raster_image (RasterImage): reference image of the stack, or a part of it
+        stack_paths (Sequence[str]): images of every date of the stack, see group_stacks()
+        method (CompositeMethod, optional): Reduction of each pixel over dates. Defaults to CompositeMethod.MEDIAN.
+        cloud_mask (bool, optional): If True, cloudy pixels of dates with a SCL asset are masked out.
+            Defaults to True.
+        spectral_index (Optional[SpectralIndex], optional): If given, images are reference bands of scenes,
+            and the index is composited instead of their values. Defaults to None.
+        resampling (Resampling, optional): Resampling of dates onto the reference grid.
+            Defaults to Resampling.nearest.
+        max_chunk_bytes (int, optional): Upper limit of bytes read per window over all dates.
+            Defaults to ANALYSIS_CHUNK_BYTES.
+        decimation (int, optional): Factor to reduce resolution of both axes by. Defaults to 1.
+        masked (bool, optional): If True, nodata and masked pixels are masked out. Defaults to False.
+        aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. Defaults to None.
+
+    Yields:
+        np.ndarray: composite values of a window, a masked array shaped as (bands, rows, columns)
+    """
+    with contextlib.ExitStack() as opened:
+        dates = []
+        for image_path in stack_paths:
+            image = raster_image if image_path == raster_image.raster_image_path \
+                else opened.enter_context(RasterImage(image_path))
+            negative = opened.enter_context(RasterImage(scene_band_path(image_path, spectral_index.negative))) \
+                if spectral_index is not None else None
+            scl_path = scene_classification_path(image_path) if cloud_mask else None
+            classification = opened.enter_context(RasterImage(scl_path)) if scl_path else None
+            dates.append(_Date(image, negative, classification))
+
+        reads = sum(len(date.images()) for date in dates)
+        try:
+            for window, shape, outside in raster_image.aoi_windows(max(max_chunk_bytes // reads, 1), decimation, aoi):
+                bounds = raster_image.raster_data.window_bounds(window)
+                stack = np.ma.stack([date.read(bounds, shape, resampling, masked, spectral_index) for date in dates])
+                if method is CompositeMethod.MEDIAN:
+                    composite = np.ma.median(stack, axis=0)
+                else:
+                    composite = stack.mean(axis=0)
+                composite = np.ma.MaskedArray(np.ma.getdata(composite), mask=np.ma.getmaskarray(composite))
+                if outside is not None:
+                    composite.mask |= outside
+                if composite.mask.all():
+                    raster_image.skipped_windows += 1
+                    continue
+                yield composite
+        finally:
+            raster_image.bytes_read += sum(image.bytes_read for date in dates for image in date.images()
+                                           if image is not raster_image)
@@ -0,0 +1,118 @@
+"""Ingest step of downloaded rasters
+
+Rasters are rewritten as Cloud-Optimized GeoTIFFs with a fast codec, tiles sized for
+windowed reads and overviews for approximate analyses, then their tile statistics are computed.
+"""
+import contextlib
+import functools
+import logging
+import os
+import tempfile
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.errors import RasterioError, RasterioIOError
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+
+from raster_analysis_service.utils.constants import INGEST_BLOCK_SIZE, INGEST_COMPRESSION
+from raster_analysis_service.utils.file_io import split_asset_name
+from .tile_statistics import TileStatistics, read_tile_statistics, write_tile_statistics
+
+
+LOGGER = logging.getLogger("Analysis")
+
+# Assets holding class labels, whose overviews must not average neighbouring pixels
+CATEGORICAL_ASSETS = {"SCL"}
+# Codec of rasters which GDAL can not compress with the requested one
+FALLBACK_COMPRESSION = "LZW"
+
+
+@functools.lru_cache(maxsize=None)
+def _supports_compression(compression: str) -> bool:
+    """Checks if GDAL has a codec, by writing a single pixel in memory"""
+    try:
+        with MemoryFile() as memory_file, memory_file.open(driver="GTiff", width=1, height=1, count=1, dtype="uint8",
+                                                           transform=from_origin(0, 1, 1, 1),
+                                                           compress=compression) as dataset:
+            dataset.write(np.zeros((1, 1, 1), dtype=np.uint8))
+    except (RasterioError, RasterioIOError):
+        return False
+    return True
+
+
+def _applied_compression(compression: str) -> str:
+    """Returns the requested codec, or the fallback codec if GDAL does not have it"""
+    return compression.upper() if _supports_compression(compression.upper()) else FALLBACK_COMPRESSION
+
+
+def _needs_conversion(dataset, compression: str, block_size: int) -> bool:
+    structure = dataset.tags(ns="IMAGE_STRUCTURE")
+    return not (structure.get("LAYOUT") == "COG" and structure.get("COMPRESSION", "").upper() == compression
+                and dataset.block_shapes[0] == (block_size, block_size))
+
+
+def convert_to_cog(image_path: str, compression: str = INGEST_COMPRESSION, block_size: int = INGEST_BLOCK_SIZE) -> bool:
+    """Rewrites a raster in place as a tiled, compressed Cloud-Optimized GeoTIFF with overviews.
+    Rasters which already have the requested layout are kept as they are
+
+    Args:
+        image_path (str): path of the raster
+        compression (str, optional): Codec, such as ZSTD, LZW or DEFLATE. Falls back to LZW
+            if GDAL does not support it, and rasters compressed with LZW are then kept. Defaults to
+            INGEST_COMPRESSION.
+        block_size (int, optional): Width and height of tiles. Defaults to INGEST_BLOCK_SIZE.
+
+    Returns:
+        bool: True if raster has been rewritten
+    """
+    applied_compression = _applied_compression(compression)
+    with rasterio.open(image_path) as dataset:
+        if not _needs_conversion(dataset, applied_compression, block_size):
+            return False
+        # Horizontal differencing for integers, floating point predictor otherwise
+        predictor = "3" if dataset.dtypes[0].startswith("float") else "2"
+
+    categorical = split_asset_name(image_path)[1] in CATEGORICAL_ASSETS
+    options = {
+        "driver": "COG",
+        "PREDICTOR": predictor,
+        "BLOCKSIZE": str(block_size),
+        "OVERVIEWS": "AUTO",
+        "RESAMPLING": "NEAREST" if categorical else "AVERAGE",
+        "NUM_THREADS": "ALL_CPUS",
+    }
+    # Concurrent conversions of an image each write a temporary file of their own
+    descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(image_path))
+    os.close(descriptor)
+    try:
+        if applied_compression != compression.upper():
+            LOGGER.warning("Unable to compress %s with %s, using %s", image_path, compression, applied_compression)
+        rasterio.shutil.copy(image_path, temporary_path, COMPRESS=applied_compression, **options)
+        os.replace(temporary_path, image_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temporary_path)
+        raise
+    return True
+
+
+def ingest_image(image_path: str, **options) -> TileStatistics:
+    """Converts a raster to analysis layout and writes its tile statistics
+
+    Args:
+        image_path (str): path of the raster
+        **options: compression and block_size of convert_to_cog()
+
+    Returns:
+        TileStatistics: statistics of the converted raster
+    """
+    converted = convert_to_cog(image_path, **options)
+    LOGGER.info("%s has been ingested%s", image_path, "" if converted else ", layout was kept")
+    return write_tile_statistics(image_path)
+
+
+def is_ingested(image_path: str) -> bool:
+    """Checks if a raster exists and has up-to-date tile statistics"""
+    return os.path.exists(image_path) and read_tile_statistics(image_path) is not None
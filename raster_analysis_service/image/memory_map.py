@@ -0,0 +1,162 @@
+"""Reads of uncompressed GeoTIFFs straight from a memory map of the file
+
+Offsets of strips and tiles are taken from GDAL, so that pixels are served from
+the page cache without decoding, and without copying when the layout of the file
+allows a window to be a view of the map.
+"""
+import logging
+import os
+
+from typing import Any, Optional
+
+import numpy as np
+from rasterio.enums import Interleaving
+from rasterio.windows import Window
+
+
+LOGGER = logging.getLogger("Analysis")
+
+# Byte order marks of TIFF headers
+_BYTE_ORDERS = {b"II": "<", b"MM": ">"}
+
+
+class MemoryMappedRaster:
+    """Pixels of an uncompressed GeoTIFF, read from a memory map of the file.
+    Blocks are views of the map. If blocks of every band are laid out as a regular grid,
+    the whole image is a single strided view, and so is any window of it
+    """
+    _buffer: np.memmap
+    _dtype: np.dtype
+    _shape: tuple
+    _block_shape: tuple
+    _offsets: np.ndarray
+    _pixel_interleaved: bool
+    _view: Optional[np.ndarray]
+
+    def __init__(self, file_path: str, dtype: np.dtype, shape: tuple, block_shape: tuple, offsets: np.ndarray,
+                 pixel_interleaved: bool) -> None:
+        """Maps a file
+
+        Args:
+            file_path (str): path of the file
+            dtype (np.dtype): type of pixels
+            shape (tuple): number of bands, rows and columns
+            block_shape (tuple): rows and columns of a strip or tile
+            offsets (np.ndarray): file offsets of blocks, shaped as (bands, block rows, block columns).
+                A single band of offsets if pixel interleaved
+            pixel_interleaved (bool): True if a block holds all bands of its pixels
+        """
+        self._buffer = np.memmap(file_path, dtype=np.uint8, mode="r")
+        self._dtype = np.dtype(dtype)
+        self._shape = tuple(shape)
+        self._block_shape = tuple(block_shape)
+        self._offsets = offsets
+        self._pixel_interleaved = pixel_interleaved
+        self._view = self._grid_view()
+
+    @property
+    def shape(self) -> tuple:
+        return self._shape
+
+    def read(self, window: Window) -> np.ndarray:
+        """Returns pixel values of all bands within a window, a read-only view of the map if possible
+
+        Args:
+            window (Window): window to read, within the image
+
+        Returns:
+            np.ndarray: raster values shaped as (bands, rows, columns)
+        """
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        height, width = int(window.height), int(window.width)
+        if self._view is not None:
+            return self._view[:, row_off:row_off + height, col_off:col_off + width]
+
+        chunk = np.empty((self._shape[0], height, width), dtype=self._dtype)
+        block_height, block_width = self._block_shape
+        for block_row in range(row_off // block_height, (row_off + height - 1) // block_height + 1):
+            for block_column in range(col_off // block_width, (col_off + width - 1) // block_width + 1):
+                top, left = block_row * block_height, block_column * block_width
+                rows = slice(max(row_off, top), min(row_off + height, top + block_height))
+                columns = slice(max(col_off, left), min(col_off + width, left + block_width))
+                block = self._block(block_row, block_column)
+                chunk[:, rows.start - row_off:rows.stop - row_off, columns.start - col_off:columns.stop - col_off] = \
+                    block[:, rows.start - top:rows.stop - top, columns.start - left:columns.stop - left]
+        return chunk
+
+    def _block(self, block_row: int, block_column: int) -> np.ndarray:
+        """Returns a view of a block of all bands, shaped as (bands, block rows, block columns)"""
+        block_height, block_width = self._block_shape
+        # The last strip only holds remaining rows, tiles are always complete
+        if block_width == self._shape[2]:
+            block_height = min(block_height, self._shape[1] - block_row * block_height)
+        if self._pixel_interleaved:
+            return self._array(self._offsets[0, block_row, block_column],
+                               (block_height, block_width, self._shape[0])).transpose(2, 0, 1)
+        return np.stack([self._array(offset, (block_height, block_width))
+                         for offset in self._offsets[:, block_row, block_column]])
+
+    def _array(self, offset: int, shape: tuple) -> np.ndarray:
+        size = int(np.prod(shape)) * self._dtype.itemsize
+        return self._buffer[offset:offset + size].view(self._dtype).reshape(shape)
+
+    def _grid_view(self) -> Optional[np.ndarray]:
+        """Returns a view of the whole image if blocks are evenly spaced strips, None otherwise"""
+        bands, height, width = self._shape
+        block_height, block_width = self._block_shape
+        if block_width != width:
+            return None
+        pixel_bytes = self._dtype.itemsize * (bands if self._pixel_interleaved else 1)
+        strip_bytes = block_height * width * pixel_bytes
+        if np.any(np.diff(self._offsets[:, :, 0], axis=1) != strip_bytes):
+            return None
+        if self._pixel_interleaved:
+            strides = (self._dtype.itemsize, width * pixel_bytes, pixel_bytes)
+        else:
+            band_strides = np.diff(self._offsets[:, 0, 0])
+            if band_strides.size and np.any(band_strides != band_strides[0]):
+                return None
+            band_stride = int(band_strides[0]) if band_strides.size else 0
+            strides = (band_stride, width * pixel_bytes, pixel_bytes)
+        return np.ndarray(self._shape, dtype=self._dtype, buffer=self._buffer, offset=int(self._offsets[0, 0, 0]),
+                          strides=strides)
+
+
+def open_memory_map(raster_data: Any) -> Optional[MemoryMappedRaster]:
+    """Maps a dataset if it is a local, uncompressed GeoTIFF in native byte order
+
+    Args:
+        raster_data (Any): an opened rasterio dataset
+
+    Returns:
+        Optional[MemoryMappedRaster]: mapped raster, None if dataset has to be read through GDAL
+    """
+    if raster_data.driver != "GTiff" or raster_data.compression is not None:
+        return None
+    if len(set(raster_data.dtypes)) != 1 or "NBITS" in raster_data.tags(ns="IMAGE_STRUCTURE"):
+        return None
+    file_path = raster_data.name
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as raster_file:
+        byte_order = _BYTE_ORDERS.get(raster_file.read(2))
+    dtype = np.dtype(raster_data.dtypes[0])
+    if byte_order is None or dtype.newbyteorder(byte_order) != dtype:
+        return None
+
+    shape = (raster_data.count, raster_data.height, raster_data.width)
+    block_shape = tuple(raster_data.block_shapes[0])
+    pixel_interleaved = raster_data.interleaving is Interleaving.pixel and raster_data.count > 1
+    grid = (-(-shape[1] // block_shape[0]), -(-shape[2] // block_shape[1]))
+    bands = 1 if pixel_interleaved else shape[0]
+    offsets = np.zeros((bands,) + grid, dtype=np.int64)
+    for band in range(bands):
+        for block_row in range(grid[0]):
+            for block_column in range(grid[1]):
+                offset = raster_data.get_tag_item(f"BLOCK_OFFSET_{block_column}_{block_row}", "TIFF", bidx=band + 1)
+                # Sparse files omit blocks of nodata
+                if not offset:
+                    return None
+                offsets[band, block_row, block_column] = int(offset)
+    LOGGER.debug("Reading %s from a memory map", file_path)
+    return MemoryMappedRaster(file_path, dtype, shape, block_shape, offsets, pixel_interleaved)
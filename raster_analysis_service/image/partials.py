@@ -0,0 +1,325 @@
+"""Mergeable partial states of analyses
+
+Workers accumulate a partial state locally and return it to the parent process,
+where partials are combined with a tree reduction.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Partial(ABC):
+    """Base class for worker-local, mergeable analysis states
+    """
+    @abstractmethod
+    def merge(self, other: "Partial") -> "Partial":
+        """Combines two partial states into a new one.
+        Neither of the operands is modified
+
+        Args:
+            other (Partial): partial state to combine with
+
+        Returns:
+            Partial: combined partial state
+        """
+
+
+def _valid_pixels(array: np.ndarray):
+    """Splits an optionally masked array into its data and a boolean array of
+    valid pixels. Valid pixels are None when every pixel is valid
+    """
+    if np.ma.is_masked(array):
+        return np.ma.getdata(array), ~np.ma.getmaskarray(array)
+    return np.ma.getdata(array), None
+
+
+def _valid_values(array: np.ndarray) -> np.ndarray:
+    """Flattened values of valid pixels. NaN of float rasters, masked or not, are never valid"""
+    data, valid = _valid_pixels(array)
+    values = (data if valid is None else data[valid]).ravel()
+    return values[~np.isnan(values)] if values.dtype.kind == "f" else values
+
+
+def _compensated_add(first: float, second: float):
+    """Adds two floats, returning both the sum and its rounding error (Neumaier)
+    """
+    total = first + second
+    if abs(first) >= abs(second):
+        error = (first - total) + second
+    else:
+        error = (second - total) + first
+    return total, error
+
+
+class MeanPartial(Partial):
+    """Pixel count and compensated pixel sum of a set of images
+    """
+    count: int
+    total: float
+    compensation: float
+
+    def __init__(self, count: int = 0, total: float = 0.0, compensation: float = 0.0) -> None:
+        self.count = count
+        self.total = total
+        self.compensation = compensation
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "MeanPartial":
+        """Creates a partial state from pixel values of an image
+
+        Args:
+            array (np.ndarray): pixel values, masked and NaN pixels are excluded
+
+        Returns:
+            MeanPartial: partial state covering given pixels
+        """
+        values = _valid_values(array)
+        return cls(int(values.size), float(np.sum(values, dtype=np.float64)))
+
+    def merge(self, other: "MeanPartial") -> "MeanPartial":
+        total, error = _compensated_add(self.total, other.total)
+        compensation = self.compensation + other.compensation + error
+        return MeanPartial(self.count + other.count, total, compensation)
+
+    def mean(self) -> float:
+        """Returns mean of covered pixels, 0 if there is none
+        """
+        if self.count == 0:
+            return 0.0
+        return (self.total + self.compensation) / self.count
+
+
+class MomentsPartial(Partial):
+    """Pixel count, mean and sum of squared deviations of a set of images.
+    Partials are combined with the parallel algorithm of Chan et al.
+    """
+    count: int
+    mean: float
+    m2: float
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0) -> None:
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "MomentsPartial":
+        """Creates a partial state from pixel values of an image
+
+        Args:
+            array (np.ndarray): pixel values, masked and NaN pixels are excluded
+
+        Returns:
+            MomentsPartial: partial state covering given pixels
+        """
+        values = _valid_values(array)
+        if values.size == 0:
+            return cls()
+        mean = float(np.mean(values, dtype=np.float64))
+        deviations = values.astype(np.float64) - mean
+        return cls(int(values.size), mean, float(np.dot(deviations, deviations)))
+
+    def merge(self, other: "MomentsPartial") -> "MomentsPartial":
+        count = self.count + other.count
+        if count == 0:
+            return MomentsPartial()
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.count / count
+        m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+        return MomentsPartial(count, mean, m2)
+
+    def variance(self) -> float:
+        """Returns sample variance of covered pixels, 0 if there are less than two
+        """
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def standard_error(self) -> float:
+        """Returns standard error of the mean, treating covered pixels as independent samples
+        """
+        if self.count == 0:
+            return 0.0
+        return float(np.sqrt(self.variance() / self.count))
+
+
+class MinMaxPartial(Partial):
+    """Minimum and maximum of pixel values, None when there is no pixel
+    """
+    minimum: Optional[float]
+    maximum: Optional[float]
+
+    def __init__(self, minimum: Optional[float] = None, maximum: Optional[float] = None) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "MinMaxPartial":
+        """Creates a partial state from pixel values, masked and NaN pixels are excluded"""
+        values = _valid_values(array)
+        if values.size == 0:
+            return cls()
+        return cls(values.min().item(), values.max().item())
+
+    def merge(self, other: "MinMaxPartial") -> "MinMaxPartial":
+        if self.minimum is None:
+            return other
+        if other.minimum is None:
+            return self
+        return MinMaxPartial(min(self.minimum, other.minimum), max(self.maximum, other.maximum))
+
+
+class HistogramPartial(Partial):
+    """Pixel counts of equally sized bins over a fixed value range.
+    Values out of the range are counted as underflow or overflow
+    """
+    bins: int
+    value_range: Tuple[float, float]
+    counts: np.ndarray
+
+    def __init__(self, bins: int, value_range: Tuple[float, float], counts: Optional[np.ndarray] = None) -> None:
+        self.bins = bins
+        self.value_range = tuple(value_range)
+        # First and last counts are underflow and overflow
+        self.counts = np.zeros(bins + 2, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, bins: int, value_range: Tuple[float, float]) -> "HistogramPartial":
+        """Creates a partial state from pixel values, masked and NaN pixels are excluded"""
+        values = _valid_values(array)
+        lower, upper = value_range
+        indexes = np.floor((values - lower) * (bins / (upper - lower)))
+        # Shift by one, so that underflow goes to index 0 and overflow to bins + 1
+        indexes = np.clip(indexes, -1, bins).astype(np.int64) + 1
+        return cls(bins, value_range, np.bincount(indexes, minlength=bins + 2))
+
+    def merge(self, other: "HistogramPartial") -> "HistogramPartial":
+        return HistogramPartial(self.bins, self.value_range, self.counts + other.counts)
+
+    def edges(self) -> List[float]:
+        """Returns edges of the bins, one more than number of bins"""
+        return np.linspace(self.value_range[0], self.value_range[1], self.bins + 1).tolist()
+
+
+class QuantileSketch(Partial):
+    """A mergeable sketch of the distribution of pixel values with a bounded relative error,
+    following DDSketch: values are counted in logarithmically sized buckets
+    """
+    relative_accuracy: float
+    zero_count: int
+    positive: Dict[int, int]
+    negative: Dict[int, int]
+
+    def __init__(self, relative_accuracy: float, zero_count: int = 0,
+                 positive: Optional[Dict[int, int]] = None, negative: Optional[Dict[int, int]] = None) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.zero_count = zero_count
+        self.positive = positive or {}
+        self.negative = negative or {}
+
+    @property
+    def _gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.positive.values()) + sum(self.negative.values())
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, relative_accuracy: float) -> "QuantileSketch":
+        """Creates a partial state from pixel values, masked and NaN pixels are excluded"""
+        sketch = cls(relative_accuracy)
+        values = _valid_values(array)
+        sketch.zero_count = int(np.count_nonzero(values == 0))
+        sketch.positive = sketch._bucket_counts(values[values > 0])
+        sketch.negative = sketch._bucket_counts(-values[values < 0].astype(np.float64))
+        return sketch
+
+    def _bucket_counts(self, values: np.ndarray) -> Dict[int, int]:
+        if values.size == 0:
+            return {}
+        indexes = np.ceil(np.log(values.astype(np.float64)) / np.log(self._gamma)).astype(np.int64)
+        offset = indexes.min()
+        counts = np.bincount(indexes - offset)
+        return {int(index) + int(offset): int(counts[index]) for index in np.flatnonzero(counts)}
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        positive = dict(self.positive)
+        for index, count in other.positive.items():
+            positive[index] = positive.get(index, 0) + count
+        negative = dict(self.negative)
+        for index, count in other.negative.items():
+            negative[index] = negative.get(index, 0) + count
+        return QuantileSketch(self.relative_accuracy, self.zero_count + other.zero_count, positive, negative)
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        """Returns approximate value at given quantile, within relative accuracy
+
+        Args:
+            quantile (float): a number between 0 and 1
+
+        Returns:
+            Optional[float]: approximate value, None if sketch is empty
+        """
+        count = self.count
+        if count == 0:
+            return None
+        rank = quantile * (count - 1)
+        # Buckets ordered by the values they represent, from most negative to most positive
+        buckets = [(-self._bucket_value(index), bucket_count)
+                   for index, bucket_count in sorted(self.negative.items(), reverse=True)]
+        buckets.append((0.0, self.zero_count))
+        buckets.extend((self._bucket_value(index), bucket_count)
+                       for index, bucket_count in sorted(self.positive.items()))
+
+        seen = 0
+        for value, bucket_count in buckets:
+            seen += bucket_count
+            if seen > rank:
+                return value
+        return buckets[-1][0]
+
+    def _bucket_value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+
+class GroupedPartial(Partial):
+    """Partial states of an analysis, kept separately per group
+    """
+    groups: Dict[Hashable, Partial]
+
+    def __init__(self, groups: Optional[Dict[Hashable, Partial]] = None) -> None:
+        self.groups = groups or {}
+
+    def add(self, key: Hashable, partial: Partial) -> None:
+        """Merges a partial state into given group, in place"""
+        current = self.groups.get(key)
+        self.groups[key] = partial if current is None else current.merge(partial)
+
+    def merge(self, other: "GroupedPartial") -> "GroupedPartial":
+        merged = GroupedPartial(dict(self.groups))
+        for key, partial in other.groups.items():
+            merged.add(key, partial)
+        return merged
+
+
+def tree_reduce(partials: Sequence[Partial]) -> Optional[Partial]:
+    """Merges partial states pairwise, level by level.
+    For a given order of partials, result is deterministic
+
+    Args:
+        partials (Sequence[Partial]): partial states to merge
+
+    Returns:
+        Optional[Partial]: merged partial state, None if nothing is given
+    """
+    level = list(partials)
+    if not level:
+        return None
+    while len(level) > 1:
+        merged = [left.merge(right) for left, right in zip(level[0::2], level[1::2])]
+        if len(level) % 2:
+            merged.append(level[-1])
+        level = merged
+    return level[0]
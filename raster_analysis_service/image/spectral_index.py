@@ -0,0 +1,197 @@
+"""Spectral indices of Sentinel-2 scenes, whose bands are downloaded as separate asset files
+
+Bands of a scene are read window by window on the grid of its reference band,
+coarser bands are resampled onto that grid as they are read, and indices are
+computed chunk by chunk, so that no full size intermediate array is kept.
+"""
+import json
+import logging
+import os
+
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rasterio.enums import Resampling
+
+from raster_analysis_service.utils.file_io import split_asset_name
+from .types import RasterImage
+
+
+LOGGER = logging.getLogger("Analysis")
+
+# Asset keys of bands, as named by Earth Search v0 and v1 collections
+BAND_ASSETS: Dict[str, Tuple[str, ...]] = {
+    "B03": ("B03", "green"),
+    "B04": ("B04", "red"),
+    "B08": ("B08", "nir"),
+    "B12": ("B12", "swir22"),
+}
+
+
+class SpectralIndex:
+    """A normalized difference of two bands, (positive - negative) / (positive + negative).
+    The positive band is the reference, whose grid the index is computed on
+    """
+    name: str
+    positive: str
+    negative: str
+
+    def __init__(self, name: str, positive: str, negative: str) -> None:
+        self.name = name
+        self.positive = positive
+        self.negative = negative
+
+    @property
+    def bands(self) -> Tuple[str, str]:
+        return self.positive, self.negative
+
+    def compute(self, positive: np.ndarray, negative: np.ndarray, positive_scaling: Tuple[float, float] = (1.0, 0.0),
+                negative_scaling: Tuple[float, float] = (1.0, 0.0)) -> np.ma.MaskedArray:
+        """Computes index of a chunk of both bands, in two float32 buffers
+
+        Args:
+            positive (np.ndarray): values of the positive band, optionally masked
+            negative (np.ndarray): values of the negative band on the same grid, optionally masked
+            positive_scaling (Tuple[float, float], optional): Scale and offset converting values
+                of the positive band to reflectances. Defaults to (1.0, 0.0).
+            negative_scaling (Tuple[float, float], optional): Scale and offset of the negative band.
+                Defaults to (1.0, 0.0).
+
+        Returns:
+            np.ma.MaskedArray: index values, masked where either band is masked or the index is undefined
+        """
+        invalid = np.ma.getmaskarray(positive) | np.ma.getmaskarray(negative)
+        difference = _reflectance(positive, positive_scaling)
+        total = _reflectance(negative, negative_scaling)
+        difference -= total
+        # positive + negative = (positive - negative) + 2 * negative
+        total *= 2
+        total += difference
+        invalid |= total == 0
+        np.divide(difference, total, out=difference, where=~invalid)
+        return np.ma.MaskedArray(difference, mask=invalid)
+
+
+SPECTRAL_INDICES: Dict[str, SpectralIndex] = {
+    # Vegetation, from near infrared and red
+    "NDVI": SpectralIndex("NDVI", "B08", "B04"),
+    # Open water (McFeeters), from green and near infrared
+    "NDWI": SpectralIndex("NDWI", "B03", "B08"),
+    # Burned areas, from near infrared and short wave infrared
+    "NBR": SpectralIndex("NBR", "B08", "B12"),
+}
+
+
+def get_spectral_index(name: str) -> SpectralIndex:
+    """Retrieves a spectral index by its name
+
+    Raises:
+        ValueError: If index is not supported
+    """
+    try:
+        return SPECTRAL_INDICES[name.upper()]
+    except KeyError as error:
+        message = f"Invalid spectral index: {error}"
+        LOGGER.error(message)
+        raise ValueError(message) from error
+
+
+def _reflectance(values: np.ndarray, scaling: Tuple[float, float]) -> np.ndarray:
+    scale, offset = scaling
+    reflectance = np.multiply(np.ma.getdata(values), scale, dtype=np.float32)
+    if offset:
+        reflectance += offset
+    return reflectance
+
+
+def _asset_band(asset_key: str) -> Optional[str]:
+    for band, asset_keys in BAND_ASSETS.items():
+        if asset_key in asset_keys:
+            return band
+    return None
+
+
+def select_scenes(image_paths: Sequence[str], spectral_index: SpectralIndex) -> List[str]:
+    """Groups asset files by scene and keeps scenes which have every band of an index
+
+    Args:
+        image_paths (Sequence[str]): asset files, {item id}_{asset key}.{extension}
+        spectral_index (SpectralIndex): index to compute
+
+    Returns:
+        List[str]: a file of the reference band per complete scene, in dataset order
+    """
+    scenes: Dict[Tuple[str, str], Dict[str, str]] = {}
+    for image_path in image_paths:
+        item_id, asset_key = split_asset_name(image_path)
+        band = _asset_band(asset_key)
+        if band in spectral_index.bands:
+            scenes.setdefault((os.path.dirname(image_path), item_id), {}).setdefault(band, image_path)
+    selected = [bands[spectral_index.positive] for bands in scenes.values()
+                if all(band in bands for band in spectral_index.bands)]
+    LOGGER.debug("%d of %d scenes have bands of %s", len(selected), len(scenes), spectral_index.name)
+    return selected
+
+
+def scene_band_path(reference_path: str, band: str) -> str:
+    """Returns file of a band of the scene of a reference file
+
+    Raises:
+        FileNotFoundError: If scene has no file of the band
+    """
+    item_id, _ = split_asset_name(reference_path)
+    directory, extension = os.path.dirname(reference_path), os.path.splitext(reference_path)[1]
+    for asset_key in BAND_ASSETS[band]:
+        band_path = os.path.join(directory, f"{item_id}_{asset_key}{extension}")
+        if os.path.exists(band_path):
+            return band_path
+    raise FileNotFoundError(f"Band {band} of {item_id} is missing")
+
+
+def scene_item_path(image_path: str) -> str:
+    """Returns file of the STAC item of the scene of an image, written next to it by the downloader"""
+    item_id, _ = split_asset_name(image_path)
+    return os.path.join(os.path.dirname(image_path), item_id + ".json")
+
+
+def band_scaling(raster_image: RasterImage) -> Tuple[float, float]:
+    """Returns scale and offset converting values of a band to reflectances, taken from raster:bands
+    of its STAC item written by the downloader, or else from the dataset
+    """
+    asset_key = split_asset_name(raster_image.raster_image_path)[1]
+    item_path = scene_item_path(raster_image.raster_image_path)
+    if os.path.exists(item_path):
+        try:
+            with open(item_path, "r", encoding="utf-8") as item_file:
+                bands = json.load(item_file)["assets"][asset_key]["raster:bands"]
+            return float(bands[0].get("scale", 1.0)), float(bands[0].get("offset", 0.0))
+        except (OSError, ValueError, KeyError, IndexError):
+            pass
+    return float(raster_image.raster_data.scales[0]), float(raster_image.raster_data.offsets[0])
+
+
+def index_chunks(raster_image: RasterImage, spectral_index: SpectralIndex, resampling: Resampling = Resampling.nearest,
+                 **chunk_options) -> Iterator[np.ndarray]:
+    """Streams index values of the scene of a reference band image, window by window.
+    Windows of the reference image are read as by RasterImage.window_chunks(), and the same
+    bounds of the other band are read resampled onto each window
+
+    Args:
+        raster_image (RasterImage): image of the reference band of a scene, or a part of it
+        spectral_index (SpectralIndex): index to compute
+        resampling (Resampling, optional): Resampling of the other band. Defaults to Resampling.nearest.
+        **chunk_options: options of RasterImage.window_chunks()
+
+    Yields:
+        np.ndarray: index values of a window, shaped as (1, rows, columns)
+    """
+    masked = chunk_options.get("masked", False)
+    with RasterImage(scene_band_path(raster_image.raster_image_path, spectral_index.negative)) as negative_image:
+        scalings = band_scaling(raster_image), band_scaling(negative_image)
+        try:
+            for window, chunk in raster_image.window_chunks(**chunk_options):
+                bounds = raster_image.raster_data.window_bounds(window)
+                negative = negative_image.read_resampled(bounds, chunk.shape[1:], resampling, masked)
+                yield spectral_index.compute(chunk[0], negative[0], *scalings)[np.newaxis]
+        finally:
+            raster_image.bytes_read += negative_image.bytes_read
@@ -0,0 +1,260 @@
+"""Per-tile statistics of raster files, kept in a sidecar file next to them
+
+Statistics are computed once per internal block of each band over valid pixels,
+so that mergeable analyses can reduce tiles instead of pixels.
+"""
+import logging
+import math
+import os
+import tempfile
+import zipfile
+
+from typing import Optional, Tuple
+
+import numpy as np
+from rasterio.windows import Window
+
+from .partials import HistogramPartial, MeanPartial, MinMaxPartial, MomentsPartial, _valid_values
+from .types import RasterImage
+
+
+LOGGER = logging.getLogger("Analysis")
+
+SIDECAR_SUFFIX = ".tiles.npz"
+_SIDECAR_VERSION = 3
+# Bins of histograms computed by default, over reflectances of Sentinel-2 L2A products
+HISTOGRAM_BINS = 64
+HISTOGRAM_RANGE = (0, 10000)
+
+
+class TileStatistics:
+    """Pixel count, sum, sum of squared deviations, minimum, maximum and histogram
+    of valid pixels, per band and per internal block of a raster file.
+    Arrays are shaped as (bands, block rows, block columns), histograms have an
+    additional axis of bins, with underflow first and overflow last
+    """
+    shape: Tuple[int, int]
+    block_shape: Tuple[int, int]
+    counts: np.ndarray
+    totals: np.ndarray
+    m2: np.ndarray
+    minimums: np.ndarray
+    maximums: np.ndarray
+    histograms: np.ndarray
+    histogram_range: Tuple[float, float]
+    has_mask: bool
+    dtype: str
+    source_mtime_ns: int
+    source_size: int
+
+    def __init__(self, shape: Tuple[int, int], block_shape: Tuple[int, int], counts: np.ndarray, totals: np.ndarray,
+                 m2: np.ndarray, minimums: np.ndarray, maximums: np.ndarray, histograms: np.ndarray,
+                 histogram_range: Tuple[float, float], has_mask: bool, dtype: str, source_mtime_ns: int = 0,
+                 source_size: int = 0) -> None:
+        self.shape = tuple(shape)
+        self.block_shape = tuple(block_shape)
+        self.counts = counts
+        self.totals = totals
+        self.m2 = m2
+        self.minimums = minimums
+        self.maximums = maximums
+        self.histograms = histograms
+        self.histogram_range = tuple(histogram_range)
+        self.has_mask = has_mask
+        # Data type of pixels, minimums and maximums are reported as values of it
+        self.dtype = dtype
+        self.source_mtime_ns = source_mtime_ns
+        self.source_size = source_size
+
+    @property
+    def histogram_bins(self) -> int:
+        return self.histograms.shape[-1] - 2
+
+    @property
+    def grid_shape(self) -> Tuple[int, int]:
+        """Number of block rows and block columns"""
+        return self.counts.shape[1], self.counts.shape[2]
+
+    def tile_window(self, row: int, column: int) -> Window:
+        """Returns window of the block at given block row and column"""
+        block_height, block_width = self.block_shape
+        row_off, col_off = row * block_height, column * block_width
+        return Window(col_off, row_off, min(block_width, self.shape[1] - col_off),
+                      min(block_height, self.shape[0] - row_off))
+
+    def mean_partial(self, band: int, tiles: np.ndarray) -> MeanPartial:
+        """Merges statistics of selected tiles of a band into a partial state of mean
+
+        Args:
+            band (int): zero based index of the band
+            tiles (np.ndarray): boolean array of selected tiles, shaped as grid_shape
+
+        Returns:
+            MeanPartial: partial state covering valid pixels of selected tiles
+        """
+        return MeanPartial(int(self.counts[band][tiles].sum()), math.fsum(self.totals[band][tiles]))
+
+    def moments_partial(self, band: int, tiles: np.ndarray) -> MomentsPartial:
+        """Merges statistics of selected tiles of a band into a partial state of variance"""
+        counts = self.counts[band][tiles]
+        count = int(counts.sum())
+        if count == 0:
+            return MomentsPartial()
+        mean = math.fsum(self.totals[band][tiles]) / count
+        tile_means = self.totals[band][tiles] / np.maximum(counts, 1)
+        m2 = float(self.m2[band][tiles].sum() + np.sum(counts * (tile_means - mean) ** 2))
+        return MomentsPartial(count, mean, m2)
+
+    def min_max_partial(self, band: int, tiles: np.ndarray) -> MinMaxPartial:
+        """Merges statistics of selected tiles of a band into a partial state of minimum and maximum"""
+        if not self.counts[band][tiles].any():
+            return MinMaxPartial()
+        return MinMaxPartial(self._as_pixel_value(np.nanmin(self.minimums[band][tiles])),
+                             self._as_pixel_value(np.nanmax(self.maximums[band][tiles])))
+
+    def _as_pixel_value(self, value: float):
+        """Converts a statistic back to the Python type of pixel values, as minimum and maximum of pixels are"""
+        return np.dtype(self.dtype).type(value).item()
+
+    def histogram_partial(self, band: int, tiles: np.ndarray) -> HistogramPartial:
+        """Merges statistics of selected tiles of a band into a partial state of histogram"""
+        return HistogramPartial(self.histogram_bins, self.histogram_range,
+                                self.histograms[band][tiles].sum(axis=0, dtype=np.int64))
+
+    @classmethod
+    def compute(cls, raster_image: RasterImage, histogram_bins: int = HISTOGRAM_BINS,
+                histogram_range: Tuple[float, float] = HISTOGRAM_RANGE) -> "TileStatistics":
+        """Reads every block of an image once and computes its statistics
+
+        Args:
+            raster_image (RasterImage): image to compute statistics of
+            histogram_bins (int, optional): Number of histogram bins. Defaults to 64.
+            histogram_range (Tuple[float, float], optional): Range of histogram bins. Defaults to (0, 10000).
+
+        Returns:
+            TileStatistics: statistics of the image
+        """
+        raster_data = raster_image.raster_data
+        shape = (raster_data.height, raster_data.width)
+        block_shape = tuple(raster_data.block_shapes[0])
+        grid = (raster_data.count, -(-shape[0] // block_shape[0]), -(-shape[1] // block_shape[1]))
+        statistics = cls(shape, block_shape, np.zeros(grid, dtype=np.int64), np.zeros(grid), np.zeros(grid),
+                         np.full(grid, np.nan), np.full(grid, np.nan),
+                         np.zeros(grid + (histogram_bins + 2,), dtype=np.int64), histogram_range,
+                         raster_image.has_mask(), raster_data.dtypes[0])
+
+        for row in range(grid[1]):
+            for column in range(grid[2]):
+                block = raster_image.read_block(statistics.tile_window(row, column))
+                for band, band_block in enumerate(block):
+                    statistics._add_block(band, row, column, band_block, histogram_bins, histogram_range)
+        return statistics
+
+    def _add_block(self, band: int, row: int, column: int, block: np.ndarray, histogram_bins: int,
+                   histogram_range: Tuple[float, float]) -> None:
+        values = _valid_values(block)
+        if values.size == 0:
+            return
+        total = float(np.sum(values, dtype=np.float64))
+        deviations = values.astype(np.float64) - total / values.size
+        self.counts[band, row, column] = values.size
+        self.totals[band, row, column] = total
+        self.m2[band, row, column] = float(np.dot(deviations, deviations))
+        self.minimums[band, row, column] = values.min()
+        self.maximums[band, row, column] = values.max()
+        self.histograms[band, row, column] = HistogramPartial.from_array(values, histogram_bins,
+                                                                         histogram_range).counts
+
+    def save(self, file_path: str) -> None:
+        """Writes statistics to a file, replacing it atomically.
+        Each writer has a temporary file of its own, so that concurrent writers do not mix their content
+        """
+        descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(file_path))
+        try:
+            with os.fdopen(descriptor, "wb") as sidecar_file:
+                np.savez_compressed(
+                    sidecar_file, version=_SIDECAR_VERSION, shape=self.shape, block_shape=self.block_shape,
+                    counts=self.counts, totals=self.totals, m2=self.m2, minimums=self.minimums,
+                    maximums=self.maximums, histograms=self.histograms, histogram_range=self.histogram_range,
+                    has_mask=self.has_mask, dtype=self.dtype, source=(self.source_mtime_ns, self.source_size))
+            os.replace(temporary_path, file_path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional["TileStatistics"]:
+        """Reads statistics from a file, None if it is missing or unreadable"""
+        try:
+            with np.load(file_path) as sidecar:
+                if int(sidecar["version"]) != _SIDECAR_VERSION:
+                    return None
+                source_mtime_ns, source_size = (int(value) for value in sidecar["source"])
+                return cls(tuple(sidecar["shape"]), tuple(sidecar["block_shape"]), sidecar["counts"],
+                           sidecar["totals"], sidecar["m2"], sidecar["minimums"], sidecar["maximums"],
+                           sidecar["histograms"], tuple(sidecar["histogram_range"]), bool(sidecar["has_mask"]),
+                           str(sidecar["dtype"]), source_mtime_ns, source_size)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as exception:
+            LOGGER.debug("Discarding unreadable tile statistics %s: %s", file_path, str(exception))
+            return None
+
+
+def sidecar_path(image_path: str) -> str:
+    """Returns path of the tile statistics of an image"""
+    return image_path + SIDECAR_SUFFIX
+
+
+def read_tile_statistics(image_path: str) -> Optional[TileStatistics]:
+    """Reads tile statistics of an image, if they have been computed for its current content
+
+    Args:
+        image_path (str): path of the image
+
+    Returns:
+        Optional[TileStatistics]: statistics, None if they are missing or outdated
+    """
+    statistics = TileStatistics.load(sidecar_path(image_path))
+    if statistics is None:
+        return None
+    stat = os.stat(image_path)
+    if (statistics.source_mtime_ns, statistics.source_size) != (stat.st_mtime_ns, stat.st_size):
+        return None
+    return statistics
+
+
+def write_tile_statistics(image_path: str, **options) -> TileStatistics:
+    """Computes tile statistics of an image and writes them next to it
+
+    Args:
+        image_path (str): path of the image
+        **options: histogram options of TileStatistics.compute()
+
+    Returns:
+        TileStatistics: computed statistics
+    """
+    with RasterImage(image_path) as raster_image:
+        return save_tile_statistics(raster_image, **options)
+
+
+def save_tile_statistics(raster_image: RasterImage, **options) -> TileStatistics:
+    """Computes tile statistics of an opened image and writes them next to it.
+    Statistics are returned even if they can not be written, e.g. to a read-only dataset
+
+    Args:
+        raster_image (RasterImage): image to compute statistics of
+        **options: histogram options of TileStatistics.compute()
+
+    Returns:
+        TileStatistics: computed statistics
+    """
+    image_path = raster_image.raster_image_path
+    stat = os.stat(image_path)
+    statistics = TileStatistics.compute(raster_image, **options)
+    statistics.source_mtime_ns, statistics.source_size = stat.st_mtime_ns, stat.st_size
+    try:
+        statistics.save(sidecar_path(image_path))
+    except OSError as exception:
+        LOGGER.warning("Unable to write tile statistics of %s: %s", image_path, str(exception))
+        return statistics
+    LOGGER.debug("Tile statistics of %s have been written", image_path)
+    return statistics
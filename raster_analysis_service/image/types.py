@@ -1,23 +1,462 @@
-from typing import Any
+import collections
+import enum
+import math
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import numpy as np
 import rasterio
+from affine import Affine
+from rasterio.enums import MaskFlags, Resampling
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, from_bounds
+
+from raster_analysis_service.utils.constants import ANALYSIS_CHUNK_BYTES, ANALYSIS_MEMORY_MAP, ANALYSIS_OPEN_DATASETS
+from raster_analysis_service.utils.geometry import geometry_bounds
+from raster_analysis_service.utils.timing import count, stage
+from .memory_map import MemoryMappedRaster, open_memory_map
+
+
+class _MaskSource(enum.Enum):
+    """Ways a dataset marks its invalid pixels"""
+    NONE = "NONE"
+    NODATA = "NODATA"
+    MASK_BAND = "MASK_BAND"
+
+
+class _OpenDataset:
+    """A dataset opened by a worker, with its memory map and number of images using it"""
+    dataset: Any
+    identity: Optional[Tuple[int, int]]
+    users: int
+    _memory_map: Any
+
+    def __init__(self, dataset: Any, identity: Optional[Tuple[int, int]]) -> None:
+        self.dataset = dataset
+        self.identity = identity
+        self.users = 0
+        self._memory_map = False
+
+    @property
+    def memory_map(self) -> Optional[MemoryMappedRaster]:
+        if self._memory_map is False:
+            with stage("open"):
+                self._memory_map = open_memory_map(self.dataset) if ANALYSIS_MEMORY_MAP else None
+        return self._memory_map
+
+    def close(self) -> None:
+        self._memory_map = None
+        self.dataset.close()
+
+
+class _DatasetCache:
+    """Least recently used datasets of each thread, kept open between images and tasks.
+    Datasets are not thread-safe, so every thread of a worker keeps its own cache.
+    A dataset is reopened once its file is modified, and never closed while an image uses it
+    """
+    _max_size: int
+    _local: threading.local
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._local = threading.local()
+
+    def _datasets(self) -> "collections.OrderedDict[str, _OpenDataset]":
+        if not hasattr(self._local, "datasets"):
+            self._local.datasets = collections.OrderedDict()
+        return self._local.datasets
+
+    def acquire(self, path: str) -> _OpenDataset:
+        """Returns an open dataset of a file, opening it unless it is cached"""
+        datasets = self._datasets()
+        identity = _file_identity(path)
+        entry = datasets.get(path)
+        if entry is not None and (identity is None or entry.identity != identity):
+            del datasets[path]
+            if entry.users == 0:
+                entry.close()
+            entry = None
+        if entry is None:
+            entry = _OpenDataset(rasterio.open(path), identity)
+            # Files which can not be checked for modification, such as remote ones, are not cached
+            if identity is not None and self._max_size > 0:
+                datasets[path] = entry
+        else:
+            datasets.move_to_end(path)
+        entry.users += 1
+        self._evict()
+        return entry
+
+    def release(self, path: str, entry: _OpenDataset) -> None:
+        """Marks a dataset unused by an image, closing it if it is not cached"""
+        entry.users -= 1
+        if entry.users == 0 and self._datasets().get(path) is not entry:
+            entry.close()
+        self._evict()
+
+    def clear(self) -> None:
+        """Closes unused datasets of current thread"""
+        datasets = self._datasets()
+        for path, entry in list(datasets.items()):
+            if entry.users == 0:
+                del datasets[path]
+                entry.close()
+
+    def _evict(self) -> None:
+        datasets = self._datasets()
+        for path in list(datasets):
+            if len(datasets) <= self._max_size:
+                break
+            if datasets[path].users == 0:
+                datasets.pop(path).close()
+
+
+def _file_identity(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+_dataset_cache = _DatasetCache(ANALYSIS_OPEN_DATASETS)
+
+
+def close_datasets() -> None:
+    """Closes datasets cached by current thread which are not in use"""
+    _dataset_cache.clear()
 
 
 class RasterImage:
     raster_image_path: str
-    raster_data: Any
+    bytes_read: int
+    skipped_windows: int
+    part: int
+    parts: int
+    _dataset: Optional[_OpenDataset]
+
+    def __init__(self, raster_image_path: str, part: int = 0, parts: int = 1) -> None:
+        """Creates an image, or a part of it. Its file is opened on first access,
+        from datasets kept open by current worker. Close the image, or use it as
+        a context manager, to return its dataset to the worker
 
-    def __init__(self, raster_image_path: str) -> None:
+        Args:
+            raster_image_path (str): path of the raster file
+            part (int, optional): Index of the window range to read. Defaults to 0.
+            parts (int, optional): Number of window ranges the image is split into,
+                so that parts can be read by different workers. Defaults to 1.
+        """
         self.raster_image_path = raster_image_path
-        self.raster_data = rasterio.open(raster_image_path)
+        self.bytes_read = 0
+        self.skipped_windows = 0
+        self.part = part
+        self.parts = parts
+        self._dataset = None
+
+    def __enter__(self) -> "RasterImage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def raster_data(self) -> Any:
+        """Opened rasterio dataset of the image"""
+        return self._open().dataset
+
+    @property
+    def memory_map(self) -> Optional[MemoryMappedRaster]:
+        """Memory map of the file, None if it is read through GDAL"""
+        return self._open().memory_map
+
+    def _open(self) -> _OpenDataset:
+        if self._dataset is None:
+            with stage("open"):
+                self._dataset = _dataset_cache.acquire(self.raster_image_path)
+        return self._dataset
+
+    def close(self) -> None:
+        """Returns dataset of the image to the worker, which may keep it open for later images"""
+        if self._dataset is not None:
+            _dataset_cache.release(self.raster_image_path, self._dataset)
+            self._dataset = None
 
     def array(self) -> np.ndarray:
         """Retrieves numpy array of opened dataset item
 
         Returns:
-            np.ndarray: raster values of selected item
+            np.ndarray: raster values of selected item, a read-only view of the file if it is memory mapped
         """
+        if self.memory_map is not None:
+            return self.memory_map.read(Window(0, 0, self.raster_data.width, self.raster_data.height))
         images = []
         for idx in self.raster_data.indexes:
             images.append(self.raster_data.read(idx))
         return np.array(images)
+
+    def windows(self, max_chunk_bytes: int = ANALYSIS_CHUNK_BYTES) -> Iterator[Window]:
+        """Iterates over windows of the selected part of the image
+
+        Args:
+            max_chunk_bytes (int, optional): Upper limit of bytes read per window.
+                Defaults to ANALYSIS_CHUNK_BYTES.
+
+        Yields:
+            Window: windows of the part, in row major order
+        """
+        windows = list(self._block_windows(max_chunk_bytes))
+        start = len(windows) * self.part // self.parts
+        stop = len(windows) * (self.part + 1) // self.parts
+        yield from windows[start:stop]
+
+    def _block_windows(self, max_chunk_bytes: int) -> Iterator[Window]:
+        """Iterates over windows aligned to internal blocks of the dataset.
+        Neighbouring blocks are coalesced as long as a window of all bands fits
+        into given size. A single block is never split.
+
+        Yields:
+            Window: windows covering the whole dataset, in row major order
+        """
+        block_height, block_width = self.raster_data.block_shapes[0]
+        width, height = self.raster_data.width, self.raster_data.height
+        pixel_bytes = sum(np.dtype(dtype).itemsize for dtype in self.raster_data.dtypes)
+
+        strip_bytes = block_height * width * pixel_bytes
+        if strip_bytes <= max_chunk_bytes:
+            rows = block_height * (max_chunk_bytes // strip_bytes)
+            for row in range(0, height, rows):
+                yield Window(0, row, width, min(rows, height - row))
+            return
+
+        block_bytes = block_height * block_width * pixel_bytes
+        columns = block_width * max(1, max_chunk_bytes // block_bytes)
+        for row in range(0, height, block_height):
+            for column in range(0, width, columns):
+                yield Window(column, row, min(columns, width - column), min(block_height, height - row))
+
+    def chunks(self, max_chunk_bytes: int = ANALYSIS_CHUNK_BYTES, decimation: int = 1,
+               masked: bool = False, aoi: Optional[Dict[str, Any]] = None) -> Iterator[np.ndarray]:
+        """Streams raster values of all bands window by window,
+        so that the whole image is never held in memory.
+        Arguments and chunks are the same as of window_chunks()
+        """
+        for _, chunk in self.window_chunks(max_chunk_bytes, decimation, masked, aoi):
+            yield chunk
+
+    def aoi_windows(self, max_chunk_bytes: int = ANALYSIS_CHUNK_BYTES, decimation: int = 1,
+                    aoi: Optional[Dict[str, Any]] = None
+                    ) -> Iterator[Tuple[Window, Tuple[int, int], Optional[np.ndarray]]]:
+        """Iterates over windows of the selected part of the image which intersect an area of interest
+
+        Args:
+            max_chunk_bytes (int, optional): Upper limit of bytes read per window, at given decimation.
+                Defaults to ANALYSIS_CHUNK_BYTES.
+            decimation (int, optional): Factor to reduce resolution of both axes by. Defaults to 1.
+            aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. Defaults to None.
+
+        Yields:
+            Tuple[Window, Tuple[int, int], Optional[np.ndarray]]: a window, its rows and columns at given
+                decimation, and its pixels outside of the area, None without an area
+        """
+        geometry = transform_geom("EPSG:4326", self.raster_data.crs, aoi) if aoi else None
+        aoi_window = self._geometry_window(geometry) if geometry else None
+        for window in self.windows(max_chunk_bytes * decimation * decimation):
+            if aoi_window is not None:
+                if not _intersects(window, aoi_window):
+                    self.skipped_windows += 1
+                    continue
+                window = _clip_to_blocks(window, aoi_window, self.raster_data.block_shapes[0])
+            shape = (math.ceil(window.height / decimation), math.ceil(window.width / decimation))
+            outside = None
+            if geometry is not None:
+                outside = self._outside_mask(geometry, window, shape)
+                if outside.all():
+                    self.skipped_windows += 1
+                    continue
+            yield window, shape, outside
+
+    def window_chunks(self, max_chunk_bytes: int = ANALYSIS_CHUNK_BYTES, decimation: int = 1, masked: bool = False,
+                      aoi: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[Window, np.ndarray]]:
+        """Streams raster values of all bands window by window, along with their windows
+
+        Args:
+            max_chunk_bytes (int, optional): Upper limit of bytes read per chunk.
+                Defaults to ANALYSIS_CHUNK_BYTES.
+            decimation (int, optional): Factor to reduce resolution of both axes by.
+                Decimated reads are served from overviews of the dataset when available.
+                Defaults to 1.
+            masked (bool, optional): If True, nodata and masked pixels are masked out,
+                and windows without any valid pixel are skipped. Defaults to False.
+            aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. If given, pixels
+                outside of it are masked out, and windows not intersecting it are never read.
+                Defaults to None.
+
+        Yields:
+            Tuple[Window, np.ndarray]: a window, and raster values of it shaped as (bands, rows, columns).
+                If masked, a masked array unless every pixel of the window is valid.
+                Values of a memory mapped file may be a read-only view of it
+        """
+        mask_source = self._mask_source() if masked else _MaskSource.NONE
+        for window, shape, invalid in self.aoi_windows(max_chunk_bytes, decimation, aoi):
+            out_shape = (self.raster_data.count,) + shape
+            read_options = {"window": window}
+            if decimation != 1:
+                read_options["out_shape"] = out_shape
+
+            if mask_source is _MaskSource.MASK_BAND:
+                # Mask bands are cheap to decode, data of empty windows is never read
+                with stage("read"):
+                    masks = self.raster_data.read_masks(**read_options)
+                invalid = masks == 0 if invalid is None else (masks == 0) | invalid
+                if invalid.all():
+                    self.skipped_windows += 1
+                    continue
+
+            with stage("read"):
+                chunk = self._read(window) if decimation == 1 else self.raster_data.read(**read_options)
+            self._count_read(chunk)
+            if mask_source is _MaskSource.NODATA:
+                nodata = self._nodata_mask(chunk)
+                invalid = nodata if invalid is None else nodata | invalid
+            if invalid is not None and invalid.ndim < chunk.ndim:
+                invalid = np.broadcast_to(invalid, chunk.shape)
+            if invalid is None or not invalid.any():
+                yield window, chunk
+            elif invalid.all():
+                self.skipped_windows += 1
+            else:
+                yield window, np.ma.MaskedArray(chunk, mask=invalid)
+
+    def read_resampled(self, bounds: Tuple[float, float, float, float], shape: Tuple[int, int],
+                       resampling: Resampling = Resampling.nearest, masked: bool = True) -> np.ndarray:
+        """Reads raster values of all bands within bounds, resampled onto a grid of given shape,
+        such as the grid of a window of another band of the same scene
+
+        Args:
+            bounds (Tuple[float, float, float, float]): left, bottom, right and top in coordinates of the dataset
+            shape (Tuple[int, int]): rows and columns of the grid
+            resampling (Resampling, optional): Resampling method. Defaults to Resampling.nearest.
+            masked (bool, optional): If True, nodata and masked pixels are masked out. Defaults to True.
+
+        Returns:
+            np.ndarray: raster values shaped as (bands, rows, columns), a masked array if masked
+        """
+        window = from_bounds(*bounds, transform=self.raster_data.transform)
+        with stage("read"):
+            chunk = self.raster_data.read(window=window, out_shape=(self.raster_data.count,) + tuple(shape),
+                                          resampling=resampling, masked=masked)
+        self._count_read(chunk)
+        return chunk
+
+    def read_block(self, window: Window, masked: bool = True) -> np.ndarray:
+        """Reads raster values of all bands within a window
+
+        Args:
+            window (Window): window to read
+            masked (bool, optional): If True, nodata and masked pixels are masked out. Defaults to True.
+
+        Returns:
+            np.ndarray: raster values shaped as (bands, rows, columns). If masked,
+                a masked array unless every pixel of the window is valid
+        """
+        mask_source = self._mask_source() if masked else _MaskSource.NONE
+        with stage("read"):
+            chunk = self._read(window)
+        self._count_read(chunk)
+        if mask_source is _MaskSource.NONE:
+            return chunk
+        if mask_source is _MaskSource.NODATA:
+            invalid = self._nodata_mask(chunk)
+        else:
+            with stage("read"):
+                invalid = self.raster_data.read_masks(window=window) == 0
+        return np.ma.MaskedArray(chunk, mask=invalid) if invalid.any() else chunk
+
+    def tile_coverage(self, tile_statistics, aoi: Optional[Dict[str, Any]] = None
+                      ) -> Tuple[np.ndarray, List[Tuple[Window, np.ndarray]]]:
+        """Splits tiles of the image by how an area of interest covers them
+
+        Args:
+            tile_statistics (TileStatistics): statistics of the image, giving its tile grid
+            aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. Defaults to None,
+                which covers every tile.
+
+        Returns:
+            Tuple[np.ndarray, List[Tuple[Window, np.ndarray]]]: boolean array of tiles fully within
+                the area, and windows of tiles partially within it with their pixels outside of it
+        """
+        grid_shape = tile_statistics.grid_shape
+        if not aoi:
+            return np.ones(grid_shape, dtype=bool), []
+        geometry = transform_geom("EPSG:4326", self.raster_data.crs, aoi)
+        aoi_window = self._geometry_window(geometry)
+        covered = np.zeros(grid_shape, dtype=bool)
+        boundary = []
+        for row in range(grid_shape[0]):
+            for column in range(grid_shape[1]):
+                window = tile_statistics.tile_window(row, column)
+                if not _intersects(window, aoi_window):
+                    continue
+                outside = self._outside_mask(geometry, window, (window.height, window.width))
+                if not outside.any():
+                    covered[row, column] = True
+                elif not outside.all():
+                    boundary.append((window, outside))
+        return covered, boundary
+
+    def _count_read(self, chunk: np.ndarray) -> None:
+        self.bytes_read += chunk.nbytes
+        count("pixels_read", chunk.size)
+
+    def _read(self, window: Window) -> np.ndarray:
+        """Reads a window at full resolution, from the memory map if the file is mapped"""
+        if self.memory_map is not None:
+            return self.memory_map.read(window)
+        return self.raster_data.read(window=window)
+
+    def has_mask(self) -> bool:
+        """Checks if dataset marks any pixel as invalid, by nodata values or a mask band"""
+        return self._mask_source() is not _MaskSource.NONE
+
+    def _geometry_window(self, geometry: Dict[str, Any]) -> Window:
+        """Returns the window of the bounding box of a geometry in dataset coordinates"""
+        return from_bounds(*geometry_bounds(geometry), self.raster_data.transform)
+
+    def _outside_mask(self, geometry: Dict[str, Any], window: Window, shape) -> np.ndarray:
+        """Marks pixels of a window, possibly decimated to given shape, whose centers are outside of a geometry"""
+        transform = self.raster_data.window_transform(window) * Affine.scale(window.width / shape[1],
+                                                                            window.height / shape[0])
+        return geometry_mask([geometry], out_shape=shape, transform=transform)
+
+    def _mask_source(self) -> "_MaskSource":
+        """Finds out how invalid pixels of the dataset are marked"""
+        flags = self.raster_data.mask_flag_enums
+        if all(MaskFlags.all_valid in band_flags for band_flags in flags):
+            return _MaskSource.NONE
+        if all(MaskFlags.nodata in band_flags for band_flags in flags):
+            return _MaskSource.NODATA
+        return _MaskSource.MASK_BAND
+
+    def _nodata_mask(self, chunk: np.ndarray) -> np.ndarray:
+        """Marks pixels equal to nodata value of their band"""
+        nodata = np.array(self.raster_data.nodatavals, dtype=np.float64).reshape(-1, 1, 1)
+        if np.isnan(nodata).any():
+            return np.isnan(chunk) | (chunk == nodata)
+        return chunk == nodata.astype(chunk.dtype)
+
+
+def _clip_to_blocks(window: Window, other: Window, block_shape: Tuple[int, int]) -> Window:
+    """Clips a window to the blocks which intersect another, so that blocks outside of it are never read"""
+    block_height, block_width = block_shape
+    row_start = max(window.row_off, math.floor(other.row_off / block_height) * block_height)
+    row_stop = min(window.row_off + window.height,
+                   math.ceil((other.row_off + other.height) / block_height) * block_height)
+    col_start = max(window.col_off, math.floor(other.col_off / block_width) * block_width)
+    col_stop = min(window.col_off + window.width, math.ceil((other.col_off + other.width) / block_width) * block_width)
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def _intersects(window: Window, other: Window) -> bool:
+    return (window.col_off < other.col_off + other.width and other.col_off < window.col_off + window.width
+            and window.row_off < other.row_off + other.height and other.row_off < window.row_off + window.height)
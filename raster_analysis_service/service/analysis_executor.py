@@ -1,57 +1,538 @@
+import collections
 import concurrent.futures
+import functools
 import logging
+import statistics
+import threading
+import time
 
 from abc import ABC, abstractmethod
-from typing import Iterable
+from multiprocessing.connection import AuthenticationError, Client, Connection
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+
+import rasterio
 
 from raster_analysis_service.image.analysis import Analysis
+from raster_analysis_service.image.partials import Partial, tree_reduce
+from raster_analysis_service.image.tile_statistics import TileStatistics, read_tile_statistics, save_tile_statistics
 from raster_analysis_service.image.types import RasterImage
-from raster_analysis_service.utils.constants import ANALYSIS_WORKERS
+from raster_analysis_service.service.tasks import AnalysisTask, plan_tasks
+from raster_analysis_service.service.worker_pool import GDAL_OPTIONS, WorkerPool, initialize_worker, worker_pool
+from raster_analysis_service.utils.constants import (
+    ANALYSIS_EXECUTOR,
+    ANALYSIS_NODE_AUTHKEY,
+    ANALYSIS_NODE_SLOTS,
+    ANALYSIS_NODES,
+    ANALYSIS_SPLIT_BYTES,
+    ANALYSIS_STRAGGLER_FACTOR,
+    ANALYSIS_TASK_ATTEMPTS,
+    ANALYSIS_WORKERS,
+    TILE_STATISTICS_ENABLED,
+    TILE_STATISTICS_ON_ANALYSIS,
+)
+from raster_analysis_service.utils.timing import StageTimings, add_timings, collect_timings, count, stage
 
 
 LOGGER = logging.getLogger("Analysis")
 
 
+class ImageResult:
+    """Partial state of an analysis for a single image, and how it was computed
+    """
+    image_path: str
+    partial: Partial
+    bytes_read: int
+    timings: Optional[StageTimings]
+
+    def __init__(self, image_path: str, partial: Partial, bytes_read: int = 0,
+                 timings: Optional[StageTimings] = None) -> None:
+        self.image_path = image_path
+        self.partial = partial
+        self.bytes_read = bytes_read
+        self.timings = timings
+
+
+ProgressCallback = Callable[[ImageResult], None]
+
+
+def analyze_task(analysis: Analysis, task: AnalysisTask) -> ImageResult:
+    """Runs an empty copy of given analysis on a single task
+
+    Args:
+        analysis (Analysis): analysis to take configuration from
+        task (AnalysisTask): image, or a part of an image, to analyze
+
+    Returns:
+        ImageResult: partial state of the analysis for given task
+    """
+    LOGGER.debug("Processing part %d/%d of image at %s", task.part + 1, task.parts, str(task.image_path))
+    with collect_timings() as timings:
+        started = time.perf_counter()
+        image_analysis = analysis.spawn()
+        with RasterImage(task.image_path, task.part, task.parts) as raster_image:
+            image_analysis.add(raster_image, _tile_statistics(image_analysis, raster_image))
+        # Time which is not spent opening or reading images is spent reducing their pixels
+        timings.seconds["reduce"] += time.perf_counter() - started - timings.total_seconds()
+        timings.counts["tasks"] += 1
+        timings.counts["bytes_read"] += raster_image.bytes_read
+    return ImageResult(task.image_path, image_analysis.partial(), raster_image.bytes_read, timings)
+
+
+def _tile_statistics(analysis: Analysis, raster_image: RasterImage) -> Optional[TileStatistics]:
+    """Reads tile statistics of an image for an analysis which can use them.
+    Missing statistics are computed when the whole image is read by this task anyway, and the analysis
+    would reduce them. Otherwise the analysis reads pixels it needs, and only them
+    """
+    if not TILE_STATISTICS_ENABLED or not analysis.uses_tile_statistics():
+        return None
+    with stage("read"):
+        tile_statistics = read_tile_statistics(raster_image.raster_image_path)
+    if (tile_statistics is None and TILE_STATISTICS_ON_ANALYSIS and raster_image.parts == 1
+            and analysis.builds_tile_statistics(raster_image)):
+        tile_statistics = save_tile_statistics(raster_image)
+    return tile_statistics
+
+
+def _merge_parts(results: List[ImageResult]) -> ImageResult:
+    """Merges results of all parts of an image, given in part order"""
+    if len(results) == 1:
+        return results[0]
+    partial = tree_reduce([result.partial for result in results])
+    timings = StageTimings()
+    for result in results:
+        if result.timings is not None:
+            timings.update(result.timings)
+    return ImageResult(results[0].image_path, partial, sum(result.bytes_read for result in results), timings)
+
+
 class ExecutorBase(ABC):
     _analysis: Analysis
     _dataset: Iterable
+    _progress: Optional[ProgressCallback]
 
-    def __init__(self, analysis: Analysis, dataset: Iterable) -> None:
+    def __init__(self, analysis: Analysis, dataset: Iterable, progress: Optional[ProgressCallback] = None) -> None:
         self._analysis = analysis
         self._dataset = dataset
+        self._progress = progress
+
+    @property
+    def workers(self) -> int:
+        """Number of tasks which run concurrently"""
+        return 1
+
+    def execute(self) -> Dict[str, Partial]:
+        """Execute analysis on given dataset. Timings of workers, and of merging their results,
+        are added to timings collected by current thread, see utils.timing
+
+        Returns:
+            Dict[str, Partial]: partial state of every image, by image path
+        """
+        image_paths = list(self._dataset)
+        tasks = self._plan(image_paths)
+        started = time.perf_counter()
+
+        part_results: Dict[str, List[Tuple[int, ImageResult]]] = {image_path: [] for image_path in image_paths}
+        results: Dict[str, ImageResult] = {}
+        for task, result in zip(tasks, self._results(tasks)):
+            add_timings(result.timings)
+            part_results[task.image_path].append((task.part, result))
+            if len(part_results[task.image_path]) < task.parts:
+                continue
+            parts = sorted(part_results[task.image_path], key=lambda part: part[0])
+            with stage("merge"):
+                results[task.image_path] = _merge_parts([result for _, result in parts])
+            count("files")
+            if self._progress is not None:
+                self._progress(results[task.image_path])
+
+        # Merge in dataset order, regardless of the order tasks were run in
+        with stage("merge"):
+            partial = tree_reduce([results[image_path].partial for image_path in image_paths])
+            if partial is not None:
+                self._analysis.merge(partial)
+        add_timings(StageTimings(capacity_seconds=(time.perf_counter() - started) * self.workers))
+        return {image_path: result.partial for image_path, result in results.items()}
+
+    def _plan(self, image_paths: List[str]) -> List[AnalysisTask]:
+        """Creates tasks of given images. By default, a task per image in given order"""
+        return plan_tasks(image_paths, split_bytes=0)
 
     @abstractmethod
-    def execute(self):
-        """Execute analysis on given dataset"""
+    def _results(self, tasks: List[AnalysisTask]) -> Iterator[ImageResult]:
+        """Computes results of given tasks, yielding them in given order"""
 
-    def _analyze_image(self, image_path: str):
-        LOGGER.debug("Processing image at %s", str(image_path))
-        raster_image = RasterImage(image_path)
-        self._analysis.add(raster_image)
+    def _analyze_task(self, task: AnalysisTask) -> ImageResult:
+        return analyze_task(self._analysis, task)
 
 
 class SequentialExecutor(ExecutorBase):
     """Executes an analysis on a dataset sequentially"""
-    def execute(self):
-        for image_path in self._dataset:
-            self._analyze_image(image_path)
+    def _results(self, tasks: List[AnalysisTask]) -> Iterator[ImageResult]:
+        with rasterio.Env(**GDAL_OPTIONS):
+            for task in tasks:
+                yield self._analyze_task(task)
 
 
 class ProcessBasedExecutor(ExecutorBase):
-    """Executes an analysis on a dataset using Process based paralellism"""
+    """Executes an analysis on a dataset using Process based paralellism.
+    Work is sent to a long-lived pool, shared with other requests.
+    Large images are split into parts, and biggest tasks are scheduled first
+    """
+    _pool: WorkerPool
+    _split_bytes: int
+
+    def __init__(self, analysis: Analysis, dataset: Iterable, progress: Optional[ProgressCallback] = None,
+                 pool: WorkerPool = worker_pool, split_bytes: int = ANALYSIS_SPLIT_BYTES) -> None:
+        super().__init__(analysis, dataset, progress)
+        self._pool = pool
+        self._split_bytes = split_bytes
+
+    @property
+    def workers(self) -> int:
+        return self._pool.workers
+
+    def _plan(self, image_paths: List[str]) -> List[AnalysisTask]:
+        return plan_tasks(image_paths, self._split_bytes)
+
+    def _results(self, tasks: List[AnalysisTask]) -> Iterator[ImageResult]:
+        # Only an empty analysis is sent to workers, never the executor itself
+        analyze_fn = functools.partial(analyze_task, self._analysis.spawn())
+        yield from self._pool.map(analyze_fn, tasks)
+
+
+class ThreadBasedExecutor(ExecutorBase):
+    """Executes an analysis on a dataset using Thread based paralellism.
+    rasterio releases the GIL while decoding and numpy while reducing large arrays,
+    so threads parallelize I/O bound analyses without pickling or extra interpreters
+    """
     _workers: int
+    _split_bytes: int
 
-    def __init__(self, analysis: Analysis, dataset: Iterable, num_workers: int = ANALYSIS_WORKERS) -> None:
-        super().__init__(analysis, dataset)
+    def __init__(self, analysis: Analysis, dataset: Iterable, progress: Optional[ProgressCallback] = None,
+                 num_workers: int = ANALYSIS_WORKERS, split_bytes: int = ANALYSIS_SPLIT_BYTES) -> None:
+        super().__init__(analysis, dataset, progress)
         self._workers = num_workers
+        self._split_bytes = split_bytes
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def _plan(self, image_paths: List[str]) -> List[AnalysisTask]:
+        return plan_tasks(image_paths, self._split_bytes)
+
+    def _results(self, tasks: List[AnalysisTask]) -> Iterator[ImageResult]:
+        with concurrent.futures.ThreadPoolExecutor(self._workers, thread_name_prefix="analysis-worker",
+                                                   initializer=initialize_worker,
+                                                   initargs=(GDAL_OPTIONS,)) as executor:
+            yield from executor.map(self._analyze_task, tasks)
+
+
+NodeAddress = Tuple[str, int]
+
+
+def parse_node_address(address: str) -> NodeAddress:
+    """Parses host:port of an analysis node
+
+    Raises:
+        ValueError: If address has no valid port
+    """
+    host, _, port = address.strip().rpartition(":")
+    try:
+        return host, int(port)
+    except ValueError as error:
+        message = f"Invalid analysis node address: {address}"
+        LOGGER.error(message)
+        raise ValueError(message) from error
+
+
+def parse_node_addresses(addresses: str) -> List[NodeAddress]:
+    """Parses comma separated host:port of analysis nodes"""
+    return [parse_node_address(address) for address in addresses.split(",") if address.strip()]
+
+
+class _TaskDispatcher:
+    """Hands out tasks to connections of analysis nodes, and collects their results.
+    A failed task is queued again until it runs out of attempts. Once no task is left to start,
+    idle connections run another copy of the longest running task, if it has been running for
+    longer than a factor of the median task, and the first result of a task wins
+    """
+    _tasks: List[AnalysisTask]
+    _max_attempts: int
+    _straggler_factor: float
+    _condition: threading.Condition
+    _pending: collections.deque
+    _running: Dict[int, Dict[int, float]]
+    _attempts: Dict[int, int]
+    _results: Dict[int, ImageResult]
+    _durations: List[float]
+    _live_slots: int
+    _error: Optional[BaseException]
+    _closed: bool
+    retried_tasks: int
+    redispatched_tasks: int
+
+    def __init__(self, tasks: List[AnalysisTask], slots: int, max_attempts: int, straggler_factor: float) -> None:
+        self._tasks = tasks
+        self._max_attempts = max_attempts
+        self._straggler_factor = straggler_factor
+        self._condition = threading.Condition()
+        self._pending = collections.deque(range(len(tasks)))
+        self._running = {}
+        self._attempts = collections.defaultdict(int)
+        self._results = {}
+        self._durations = []
+        self._live_slots = slots
+        self._error = None
+        self._closed = False
+        self.retried_tasks = 0
+        self.redispatched_tasks = 0
+
+    def next_task(self, slot: int) -> Optional[int]:
+        """Waits for a task for a connection to run, None once there is nothing left to run"""
+        with self._condition:
+            while True:
+                if self._closed or self._error is not None or len(self._results) == len(self._tasks):
+                    return None
+                if self._pending:
+                    index = self._pending.popleft()
+                elif (index := self._straggler(slot)) is not None:
+                    LOGGER.info("Dispatching straggling part %d/%d of %s again", self._tasks[index].part + 1,
+                                self._tasks[index].parts, self._tasks[index].image_path)
+                    self.redispatched_tasks += 1
+                else:
+                    # Running tasks may become stragglers without any notification
+                    self._condition.wait(timeout=0.1)
+                    continue
+                self._running.setdefault(index, {})[slot] = time.monotonic()
+                return index
+
+    def _straggler(self, slot: int) -> Optional[int]:
+        if not self._durations:
+            return None
+        threshold = self._straggler_factor * statistics.median(self._durations)
+        now = time.monotonic()
+        candidates = [(now - min(slots.values()), index) for index, slots in self._running.items()
+                      if len(slots) == 1 and slot not in slots and index not in self._results]
+        elapsed, index = max(candidates, default=(0.0, None))
+        return index if elapsed > threshold else None
+
+    def complete(self, index: int, slot: int, result: ImageResult) -> None:
+        with self._condition:
+            started = self._running.get(index, {}).pop(slot, None)
+            if index not in self._results:
+                self._results[index] = result
+                if started is not None:
+                    self._durations.append(time.monotonic() - started)
+            self._condition.notify_all()
+
+    def fail(self, index: int, slot: int, exception: BaseException) -> None:
+        """Queues a failed task again, or fails the whole execution once it has run out of attempts.
+        While another copy of the task is still running, that copy is waited for instead
+        """
+        with self._condition:
+            self._running.get(index, {}).pop(slot, None)
+            if index in self._results:
+                return
+            self._attempts[index] += 1
+            if self._running.get(index):
+                # Another copy of the task is still running, its outcome decides
+                pass
+            elif self._attempts[index] >= self._max_attempts:
+                LOGGER.error("Part %d/%d of %s has failed %d times", self._tasks[index].part + 1,
+                             self._tasks[index].parts, self._tasks[index].image_path, self._attempts[index])
+                self._error = exception
+            else:
+                self.retried_tasks += 1
+                self._pending.appendleft(index)
+            self._condition.notify_all()
+
+    def slot_closed(self) -> None:
+        """Called when a connection stops taking tasks, fails the execution if it was the last one"""
+        with self._condition:
+            self._live_slots -= 1
+            if self._live_slots == 0 and self._error is None and len(self._results) < len(self._tasks):
+                self._error = ConnectionError("No analysis node is reachable")
+            self._condition.notify_all()
+
+    def result(self, index: int) -> ImageResult:
+        """Waits for the result of a task
+
+        Raises:
+            BaseException: Error of a task which has run out of attempts, or ConnectionError
+                if no node is reachable
+        """
+        with self._condition:
+            while index not in self._results:
+                if self._error is not None:
+                    raise self._error
+                self._condition.wait()
+            return self._results[index]
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class DistributedExecutor(ExecutorBase):
+    """Executes an analysis on a dataset using analysis nodes on other hosts, see analysis_node.
+    Nodes read images from a shared dataset path. Each node is sent tasks over several authenticated
+    connections, and partial states returned by nodes are merged by this coordinator.
+    Tasks are retried on another connection when they fail or a node is lost, and straggling tasks
+    are dispatched again to idle nodes
+    """
+    _nodes: List[NodeAddress]
+    _authkey: bytes
+    _slots: int
+    _split_bytes: int
+    _max_attempts: int
+    _straggler_factor: float
+    _retry_delay: float
+    retried_tasks: int
+    redispatched_tasks: int
+
+    def __init__(self, analysis: Analysis, dataset: Iterable, progress: Optional[ProgressCallback] = None,
+                 nodes: Optional[Sequence[NodeAddress]] = None, authkey: str = ANALYSIS_NODE_AUTHKEY,
+                 slots: int = ANALYSIS_NODE_SLOTS, split_bytes: int = ANALYSIS_SPLIT_BYTES,
+                 max_attempts: int = ANALYSIS_TASK_ATTEMPTS, straggler_factor: float = ANALYSIS_STRAGGLER_FACTOR,
+                 retry_delay: float = 0.5) -> None:
+        """Creates an executor
+
+        Args:
+            analysis (Analysis): analysis to merge results into
+            dataset (Iterable): paths of images, as seen by nodes
+            progress (Optional[ProgressCallback], optional): Called with result of every image. Defaults to None.
+            nodes (Optional[Sequence[NodeAddress]], optional): Hosts and ports of nodes. Defaults to ANALYSIS_NODES.
+            authkey (str, optional): Shared secret of nodes. Defaults to ANALYSIS_NODE_AUTHKEY.
+            slots (int, optional): Tasks sent concurrently to each node. Defaults to ANALYSIS_NODE_SLOTS.
+            split_bytes (int, optional): Size above which images are split into parts. Defaults to ANALYSIS_SPLIT_BYTES.
+            max_attempts (int, optional): Attempts of a task, and of a connection. Defaults to ANALYSIS_TASK_ATTEMPTS.
+            straggler_factor (float, optional): Factor of the median task duration after which a task is
+                dispatched again. Defaults to ANALYSIS_STRAGGLER_FACTOR.
+            retry_delay (float, optional): Seconds to wait before reconnecting, doubled on each attempt.
+                Defaults to 0.5.
+
+        Raises:
+            ValueError: If no node or no shared secret is configured
+        """
+        super().__init__(analysis, dataset, progress)
+        self._nodes = list(nodes) if nodes is not None else parse_node_addresses(ANALYSIS_NODES)
+        if not self._nodes or not authkey:
+            message = "Distributed execution requires ANALYSIS_NODES and ANALYSIS_NODE_AUTHKEY"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._authkey = authkey.encode()
+        self._slots = slots
+        self._split_bytes = split_bytes
+        self._max_attempts = max_attempts
+        self._straggler_factor = straggler_factor
+        self._retry_delay = retry_delay
+        self.retried_tasks = 0
+        self.redispatched_tasks = 0
+
+    @property
+    def workers(self) -> int:
+        return len(self._nodes) * self._slots
+
+    def _plan(self, image_paths: List[str]) -> List[AnalysisTask]:
+        return plan_tasks(image_paths, self._split_bytes)
+
+    def _results(self, tasks: List[AnalysisTask]) -> Iterator[ImageResult]:
+        slot_addresses = [address for address in self._nodes for _ in range(self._slots)]
+        dispatcher = _TaskDispatcher(tasks, len(slot_addresses), self._max_attempts, self._straggler_factor)
+        # Only an empty analysis is sent to nodes, never the executor itself
+        analysis = self._analysis.spawn()
+        for slot, address in enumerate(slot_addresses):
+            threading.Thread(target=self._run_slot, args=(dispatcher, tasks, analysis, slot, address),
+                             name=f"analysis-node-{slot}", daemon=True).start()
+        try:
+            for index in range(len(tasks)):
+                yield dispatcher.result(index)
+        finally:
+            # Connections still running copies of straggling tasks are closed once they return
+            dispatcher.close()
+            self.retried_tasks = dispatcher.retried_tasks
+            self.redispatched_tasks = dispatcher.redispatched_tasks
+
+    def _run_slot(self, dispatcher: _TaskDispatcher, tasks: List[AnalysisTask], analysis: Analysis, slot: int,
+                  address: NodeAddress) -> None:
+        """Runs tasks on a connection to a node, reconnecting whenever the connection is lost"""
+        connection = None
+        try:
+            while True:
+                if connection is None:
+                    connection = self._connect(address, analysis)
+                    if connection is None:
+                        return
+                index = dispatcher.next_task(slot)
+                if index is None:
+                    return
+                try:
+                    connection.send(("analyze", tasks[index]))
+                    kind, payload = connection.recv()
+                except (OSError, EOFError) as exception:
+                    LOGGER.warning("Connection to analysis node %s:%d has been lost: %s", *address, repr(exception))
+                    dispatcher.fail(index, slot, exception)
+                    connection.close()
+                    connection = None
+                    continue
+                if kind == "result":
+                    dispatcher.complete(index, slot, payload)
+                else:
+                    LOGGER.warning("Part %d/%d of %s has failed on %s:%d: %s", tasks[index].part + 1,
+                                   tasks[index].parts, tasks[index].image_path, *address, repr(payload))
+                    dispatcher.fail(index, slot, payload)
+        finally:
+            if connection is not None:
+                connection.close()
+            dispatcher.slot_closed()
+
+    def _connect(self, address: NodeAddress, analysis: Analysis) -> Optional[Connection]:
+        """Connects to a node and sends it the analysis to run, None if node is unreachable"""
+        for attempt in range(self._max_attempts):
+            if attempt:
+                time.sleep(self._retry_delay * 2 ** (attempt - 1))
+            try:
+                connection = Client(address, authkey=self._authkey)
+            except AuthenticationError as exception:
+                LOGGER.error("Analysis node %s:%d has refused authentication: %s", *address, str(exception))
+                return None
+            except OSError as exception:
+                LOGGER.warning("Unable to connect to analysis node %s:%d: %s", *address, repr(exception))
+                continue
+            try:
+                connection.send(("analysis", analysis))
+            except OSError as exception:
+                LOGGER.warning("Unable to send analysis to node %s:%d: %s", *address, repr(exception))
+                connection.close()
+                continue
+            return connection
+        return None
+
+
+_EXECUTOR_TYPES: Dict[str, Type[ExecutorBase]] = {
+    "SEQUENTIAL": SequentialExecutor,
+    "PROCESS": ProcessBasedExecutor,
+    "THREAD": ThreadBasedExecutor,
+    "DISTRIBUTED": DistributedExecutor,
+}
 
-    def execute(self):
-        with concurrent.futures.ProcessPoolExecutor(self._workers) as executor:
-            executor.map(self._analyze_image, self._dataset)
 
+def get_executor_type() -> Type[ExecutorBase]:
+    """Return executor type configured by ANALYSIS_EXECUTOR.
+    If it is not set, executor type is based on number of processes provided
 
-def get_executor_type() -> ExecutorBase:
-    """Return executor type based on number of processes provided"""
+    Raises:
+        ValueError: If an invalid executor is configured
+    """
+    if ANALYSIS_EXECUTOR:
+        try:
+            return _EXECUTOR_TYPES[ANALYSIS_EXECUTOR.upper()]
+        except KeyError as error:
+            message = f"Invalid executor type: {error}"
+            LOGGER.error(message)
+            raise ValueError(message) from error
     if ANALYSIS_WORKERS > 1:
         return ProcessBasedExecutor
     else:
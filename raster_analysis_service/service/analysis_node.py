@@ -0,0 +1,130 @@
+"""An analysis node, which runs tasks sent by the DistributedExecutor of a coordinator
+
+Run it on every host next to a copy or a mount of the dataset:
+
+    ANALYSIS_NODE_AUTHKEY=secret python -m raster_analysis_service.service.analysis_node --port 7100
+
+A coordinator opens several connections to a node. Each connection first sends the analysis to run,
+then tasks one at a time, and is answered with a partial state, or with the error of a task.
+Tasks of every connection run on the worker processes of the node, ANALYSIS_WORKERS of them.
+"""
+import argparse
+import functools
+import logging
+import threading
+
+from multiprocessing.connection import AuthenticationError, Connection, Listener
+from typing import Any, Optional, Tuple
+
+from raster_analysis_service.image.analysis import Analysis
+from raster_analysis_service.service.analysis_executor import ImageResult, analyze_task
+from raster_analysis_service.service.tasks import AnalysisTask
+from raster_analysis_service.service.worker_pool import WorkerPool, worker_pool
+from raster_analysis_service.utils.constants import ANALYSIS_NODE_AUTHKEY, ANALYSIS_NODE_PORT
+
+
+LOGGER = logging.getLogger("Analysis")
+
+
+class AnalysisNode:
+    """Serves tasks of coordinators over authenticated connections. A thread per connection waits
+    for its tasks, which run on a pool of worker processes, so that analyses are not bound by the GIL
+    """
+    _listener: Listener
+    _pool: WorkerPool
+
+    def __init__(self, address: Tuple[str, int], authkey: str, pool: WorkerPool = worker_pool) -> None:
+        """Listens on an address
+
+        Args:
+            address (Tuple[str, int]): host and port to listen on, port 0 picks a free one
+            authkey (str): secret shared with coordinators
+            pool (WorkerPool, optional): worker processes which run tasks. Defaults to worker_pool.
+
+        Raises:
+            ValueError: If no shared secret is given
+        """
+        if not authkey:
+            message = "An analysis node requires ANALYSIS_NODE_AUTHKEY"
+            LOGGER.error(message)
+            raise ValueError(message)
+        self._listener = Listener(address, authkey=authkey.encode())
+        self._pool = pool
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._listener.address
+
+    def serve_forever(self) -> None:
+        """Accepts connections until the node is closed"""
+        LOGGER.info("Analysis node is listening on %s:%d", *self.address)
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError as exception:
+                LOGGER.warning("Rejected a connection: %s", str(exception))
+                continue
+            except OSError:
+                # Listener has been closed
+                return
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self) -> None:
+        self._listener.close()
+        self._pool.shutdown()
+
+    def _serve_connection(self, connection: Connection) -> None:
+        analysis: Optional[Analysis] = None
+        try:
+            while True:
+                try:
+                    kind, payload = connection.recv()
+                except (OSError, EOFError):
+                    return
+                if kind == "analysis":
+                    analysis = payload
+                    continue
+                try:
+                    result = self._analyze(analysis, payload)
+                except Exception as exception:
+                    LOGGER.exception("Part %d/%d of %s has failed", payload.part + 1, payload.parts,
+                                     payload.image_path)
+                    self._send(connection, ("error", exception))
+                    continue
+                self._send(connection, ("result", result))
+        finally:
+            connection.close()
+
+    def _analyze(self, analysis: Analysis, task: AnalysisTask) -> ImageResult:
+        result, = self._pool.map(functools.partial(analyze_task, analysis), [task])
+        return result
+
+    @staticmethod
+    def _send(connection: Connection, message: Tuple[str, Any]) -> None:
+        try:
+            connection.send(message)
+        except (OSError, EOFError):
+            # Coordinator has gone, its next receive of this connection fails
+            pass
+        except Exception as exception:
+            # Errors which can not be pickled are sent as their description
+            connection.send(("error", RuntimeError(repr(message[1]) + ": " + repr(exception))))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs tasks of distributed analyses")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=ANALYSIS_NODE_PORT, help="Port to listen on")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s:%(levelname)s:%(message)s")
+    node = AnalysisNode((args.host, args.port), ANALYSIS_NODE_AUTHKEY)
+    worker_pool.start()
+    try:
+        node.serve_forever()
+    except KeyboardInterrupt:
+        node.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,52 @@
+import datetime
 import logging
+import time
 
-from raster_analysis_service.image.analysis import Analysis, AnalysisType, get_analysis
-from raster_analysis_service.service.analysis_executor import ExecutorBase, get_executor_type
-from raster_analysis_service.utils.constants import ABSOLUTE_DATASET_PATH
-from raster_analysis_service.utils.file_io import Globber
+from typing import Any, Dict, List, Optional, Union
+
+from raster_analysis_service.image.analysis import Analysis, AnalysisType, create_analysis
+from raster_analysis_service.image.partials import tree_reduce
+from raster_analysis_service.service.analysis_executor import ExecutorBase, ImageResult, get_executor_type
+from raster_analysis_service.service.dataset_catalog import dataset_catalog
+from raster_analysis_service.service.metrics import analysis_metrics
+from raster_analysis_service.service.result_cache import ResultCache
+from raster_analysis_service.service.spatial_index import SpatialIndex
+from raster_analysis_service.service.types import AnalysisRequest
+from raster_analysis_service.utils.constants import (
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_PATH,
+    SPATIAL_INDEX_PATH,
+)
+from raster_analysis_service.utils.timing import STAGES, StageTimings, collect_timings, count, stage
 
 
 LOGGER = logging.getLogger("Analysis")
 
 
-def create_tif_dataset():
+def create_tif_dataset() -> List[str]:
     LOGGER.info("Preparing available images list")
-    dataset_globber: Globber = Globber(ABSOLUTE_DATASET_PATH)
-    # dataset_globber.add_includes("overview")
-    dataset_globber.add_extension("tif")
-    return dataset_globber.create(recursive=True)
+    return dataset_catalog.files()
+
+
+class AnalysisProgress:
+    """Receives progress of an analysis, from the thread which runs it.
+    Does nothing by default
+    """
+    def started(self, analysis: Analysis, image_count: int) -> None:
+        """Called once images to analyze are known
+
+        Args:
+            analysis (Analysis): the analysis which is about to run
+            image_count (int): number of images in dataset
+        """
+
+    def image_completed(self, result: ImageResult) -> None:
+        """Called for every image once its partial state is available,
+        either computed or taken from result cache
+
+        Args:
+            result (ImageResult): partial state of the image
+        """
 
 
 class AnalyzeService:
@@ -25,14 +57,91 @@ class AnalyzeService:
         LOGGER.debug("Operations %s", str(operations))
         return operations
 
-    def analyze(self, analysis_name: str):
-        """Perform given analyze on downloaded data"""
+    def analyze_request(self, request: AnalysisRequest, progress: Optional[AnalysisProgress] = None):
+        """Perform analyze described by a request on downloaded data"""
+        return self.analyze(request.name, progress, overview_level=request.overview_level, masked=request.masked,
+                            group_by=request.group_by, histogram_bins=request.histogram_bins,
+                            histogram_range=request.histogram_range, percentiles=request.percentiles,
+                            aoi=request.aoi, start_date=request.start_date, end_date=request.end_date,
+                            index=request.index, composite=request.composite and request.composite.value,
+                            cloud_mask=request.cloud_mask, profile=request.profile)
+
+    def analyze(self, analysis_name: Union[str, List[str]], progress: Optional[AnalysisProgress] = None,
+                start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+                profile: bool = False, **options):
+        """Perform given analyze on downloaded data. Its timings are added to service metrics
+
+        Args:
+            analysis_name (Union[str, List[str]]): name of the analysis, or names of several
+                analyses to calculate in a single pass
+            progress (Optional[AnalysisProgress], optional): Listener of progress. Defaults to None.
+            start_date (Optional[datetime.date], optional): Skip images acquired before. Defaults to None.
+            end_date (Optional[datetime.date], optional): Skip images acquired after. Defaults to None.
+            profile (bool, optional): Return the result along with timings of the analysis. Defaults to False.
+            **options: configuration of the analysis, such as overview_level, aoi, index or composite. Options which
+                the analysis does not use are ignored
+        """
         LOGGER.debug("Making preparation to calculate %s", analysis_name)
-        analysis: Analysis = get_analysis(analysis_name)()
-        dataset = create_tif_dataset()
+        progress = progress or AnalysisProgress()
+        started = time.perf_counter()
+        with collect_timings() as timings:
+            analysis: Analysis = create_analysis(analysis_name, **options)
+            with stage("catalog"):
+                dataset = list(create_tif_dataset())
+                if options.get("aoi") or start_date or end_date:
+                    dataset = self._select_dataset(dataset, options.get("aoi"), start_date, end_date)
+                dataset = analysis.select_images(dataset)
+            progress.started(analysis, len(dataset))
 
-        LOGGER.info("Starting calculations for %s", analysis_name)
-        executor: ExecutorBase = get_executor_type()(analysis, dataset)
-        executor.execute()
+            LOGGER.info("Starting calculations for %s", analysis_name)
+            if RESULT_CACHE_ENABLED:
+                self._execute_with_cache(analysis, dataset, progress)
+            else:
+                executor: ExecutorBase = get_executor_type()(analysis, dataset, progress.image_completed)
+                executor.execute()
+        seconds = time.perf_counter() - started
+        analysis_metrics.record(timings, seconds)
         LOGGER.info("Calculation has been completed")
+        if profile:
+            return {"result": analysis.result(), "profile": self._profile(timings, seconds)}
         return analysis.result()
+
+    @staticmethod
+    def _profile(timings: StageTimings, seconds: float) -> Dict[str, Any]:
+        """Breakdown of an analysis. Stages of workers add up over workers, and may exceed its wall time"""
+        capacity_seconds = timings.capacity_seconds
+        return {
+            "seconds": seconds,
+            "stages": {name: timings.seconds[name] for name in STAGES},
+            "files": timings.counts["files"],
+            "cached_files": timings.counts["cached_files"],
+            "tasks": timings.counts["tasks"],
+            "bytes_read": timings.counts["bytes_read"],
+            "pixels_read": timings.counts["pixels_read"],
+            "worker_utilization": timings.busy_seconds / capacity_seconds if capacity_seconds else None,
+            "worker_idle_seconds": max(capacity_seconds - timings.busy_seconds, 0.0),
+        }
+
+    def _select_dataset(self, dataset: List[str], aoi: Optional[Dict[str, Any]],
+                        start_date: Optional[datetime.date], end_date: Optional[datetime.date]) -> List[str]:
+        """Keeps images which intersect given area and were acquired within given dates"""
+        spatial_index = SpatialIndex(SPATIAL_INDEX_PATH)
+        spatial_index.update(dataset)
+        return spatial_index.select(dataset, aoi, start_date, end_date)
+
+    def _execute_with_cache(self, analysis: Analysis, dataset: List[str], progress: AnalysisProgress) -> None:
+        """Computes images which are missing in result cache, then merges cached ones"""
+        cache = ResultCache(RESULT_CACHE_PATH)
+        with stage("catalog"):
+            cached, pending = cache.lookup(analysis.cache_key(), dataset, analysis.input_paths)
+        count("cached_files", len(cached))
+        for image_path, partial in cached.items():
+            progress.image_completed(ImageResult(image_path, partial))
+
+        executor: ExecutorBase = get_executor_type()(analysis, list(pending), progress.image_completed)
+        cache.store(analysis.cache_key(), executor.execute(), pending)
+
+        with stage("merge"):
+            cached_partial = tree_reduce(list(cached.values()))
+            if cached_partial is not None:
+                analysis.merge(cached_partial)
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from raster_analysis_service.utils.constants import (
+    ABSOLUTE_DATASET_PATH,
+    DATASET_CATALOG_PATH,
+    DATASET_CATALOG_REFRESH_INTERVAL,
+)
+
+
+LOGGER = logging.getLogger("Analysis")
+
+_CATALOG_VERSION = 1
+
+
+class _Directory:
+    """Listing of a directory, valid while modification time of the directory is unchanged"""
+    mtime_ns: int
+    files: Dict[str, Tuple[int, int]]
+    directories: List[str]
+
+    def __init__(self, mtime_ns: int, files: Dict[str, Tuple[int, int]], directories: List[str]) -> None:
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.directories = directories
+
+
+class DatasetCatalog:
+    """Files of a dataset, with their modification times and sizes.
+    Catalog is kept in memory and in a file, so that only directories which have changed
+    since the last scan, by their modification time, are listed again.
+    Modification of a file in place does not change its directory, so stats of such files
+    are only updated once a file is added to or removed from its directory
+    """
+    _root: str
+    _catalog_path: Optional[str]
+    _extensions: Tuple[str, ...]
+    _refresh_interval: float
+    _directories: Dict[str, _Directory]
+    _refreshed_at: Optional[float]
+    _lock: threading.Lock
+
+    def __init__(self, root: str, catalog_path: Optional[str] = None, extensions: Sequence[str] = ("tif",),
+                 refresh_interval: float = 0.0) -> None:
+        """Creates a catalog, loading the last scan from catalog file if there is one
+
+        Args:
+            root (str): dataset directory
+            catalog_path (Optional[str], optional): File to persist catalog in. Defaults to None.
+            extensions (Sequence[str], optional): Extensions of files to catalog. Defaults to ("tif",).
+            refresh_interval (float, optional): Seconds to serve the catalog without checking
+                directories for changes. Defaults to 0.
+        """
+        self._root = root
+        self._catalog_path = catalog_path
+        self._extensions = tuple("." + extension.lstrip(".") for extension in extensions)
+        self._refresh_interval = refresh_interval
+        self._directories = self._load()
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def files(self) -> List[str]:
+        """Returns paths of cataloged files in sorted order, refreshing catalog first if it is due"""
+        return sorted(self.stats())
+
+    def stats(self) -> Dict[str, Tuple[int, int]]:
+        """Returns modification time in nanoseconds and size of cataloged files, by path"""
+        with self._lock:
+            if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self._refresh_interval:
+                self._refresh()
+            return {os.path.join(self._root, directory, name): stat
+                    for directory, listing in self._directories.items() for name, stat in listing.files.items()}
+
+    def refresh(self) -> int:
+        """Lists directories which have changed since the last scan
+
+        Returns:
+            int: number of directories which have been listed
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        directories: Dict[str, _Directory] = {}
+        listed = 0
+        pending = [""]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = os.stat(os.path.join(self._root, directory)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            listing = self._directories.get(directory)
+            if listing is None or listing.mtime_ns != mtime_ns:
+                listing = self._list(directory, mtime_ns)
+                listed += 1
+            directories[directory] = listing
+            pending.extend(os.path.join(directory, name) for name in listing.directories)
+
+        changed = listed > 0 or directories.keys() != self._directories.keys()
+        self._directories = directories
+        self._refreshed_at = time.monotonic()
+        if changed:
+            LOGGER.info("Dataset catalog has been refreshed, %d directories listed", listed)
+            self._save()
+        return listed
+
+    def _list(self, directory: str, mtime_ns: int) -> _Directory:
+        files: Dict[str, Tuple[int, int]] = {}
+        directories: List[str] = []
+        with os.scandir(os.path.join(self._root, directory)) as entries:
+            for entry in entries:
+                # Hidden entries are skipped, as glob does
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    directories.append(entry.name)
+                elif entry.name.endswith(self._extensions) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return _Directory(mtime_ns, files, sorted(directories))
+
+    def _load(self) -> Dict[str, _Directory]:
+        if not self._catalog_path or not os.path.exists(self._catalog_path):
+            return {}
+        try:
+            with open(self._catalog_path, "r", encoding="utf-8") as catalog_file:
+                catalog = json.load(catalog_file)
+            if catalog.get("version") != _CATALOG_VERSION or catalog.get("extensions") != list(self._extensions):
+                return {}
+            return {directory: _Directory(listing["mtime_ns"],
+                                          {name: tuple(stat) for name, stat in listing["files"].items()},
+                                          listing["directories"])
+                    for directory, listing in catalog["directories"].items()}
+        except (OSError, ValueError, KeyError) as exception:
+            # Catalog is rebuilt from a full scan
+            LOGGER.warning("Discarding unreadable dataset catalog: %s", str(exception))
+            return {}
+
+    def _save(self) -> None:
+        if not self._catalog_path:
+            return
+        catalog = {
+            "version": _CATALOG_VERSION,
+            "extensions": list(self._extensions),
+            "directories": {directory: {"mtime_ns": listing.mtime_ns, "files": listing.files,
+                                        "directories": listing.directories}
+                            for directory, listing in self._directories.items()},
+        }
+        os.makedirs(os.path.dirname(self._catalog_path), exist_ok=True)
+        temporary_path = f"{self._catalog_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as catalog_file:
+            json.dump(catalog, catalog_file)
+        os.replace(temporary_path, self._catalog_path)
+
+
+dataset_catalog = DatasetCatalog(ABSOLUTE_DATASET_PATH, DATASET_CATALOG_PATH, ("tif",),
+                                 DATASET_CATALOG_REFRESH_INTERVAL)
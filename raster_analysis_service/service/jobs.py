@@ -0,0 +1,145 @@
+import collections
+import enum
+import json
+import logging
+import threading
+import uuid
+
+from typing import Any, Dict, Optional
+
+from raster_analysis_service.image.analysis import Analysis
+from raster_analysis_service.service.analysis_executor import ImageResult
+from raster_analysis_service.service.analyze_service import AnalysisProgress, AnalyzeService
+from raster_analysis_service.service.scheduler import AnalysisScheduler
+from raster_analysis_service.service.types import AnalysisRequest
+
+
+LOGGER = logging.getLogger("Service")
+
+
+class JobStatus(enum.Enum):
+    """States of an analysis job"""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class Job(AnalysisProgress):
+    """An analysis running in background, which reports its progress
+    and a result computed over the images processed so far
+    """
+    job_id: str
+    request: AnalysisRequest
+    status: JobStatus
+    files_total: Optional[int]
+    files_processed: int
+    bytes_read: int
+    error: Optional[str]
+    version: int
+    _result: Any
+    _running_analysis: Optional[Analysis]
+    _lock: threading.Lock
+
+    def __init__(self, request: AnalysisRequest) -> None:
+        self.job_id = uuid.uuid4().hex
+        self.request = request
+        self.status = JobStatus.PENDING
+        self.files_total = None
+        self.files_processed = 0
+        self.bytes_read = 0
+        self.error = None
+        self.version = 0
+        self._result = None
+        self._running_analysis = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def run(self, service: AnalyzeService) -> None:
+        """Runs the analysis of the job, blocks until it finishes"""
+        self._update(status=JobStatus.RUNNING)
+        try:
+            result = service.analyze_request(self.request, progress=self)
+        except Exception as exception:
+            LOGGER.exception("Job %s has failed", self.job_id)
+            self._update(status=JobStatus.FAILED, error=str(exception))
+        else:
+            self._update(status=JobStatus.COMPLETED, _result=result)
+
+    def started(self, analysis: Analysis, image_count: int) -> None:
+        self._update(files_total=image_count, _running_analysis=analysis.spawn())
+
+    def image_completed(self, result: ImageResult) -> None:
+        with self._lock:
+            self._running_analysis.merge(result.partial)
+            self.files_processed += 1
+            self.bytes_read += result.bytes_read
+            self.version += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a snapshot of the job, including result of the images processed so far"""
+        with self._lock:
+            result = self._result
+            if not self.finished and self._running_analysis is not None:
+                result = self._running_analysis.result()
+            return {
+                "id": self.job_id,
+                "name": self.request.name,
+                "request": json.loads(self.request.json()),
+                "status": self.status.value,
+                "files_total": self.files_total,
+                "files_processed": self.files_processed,
+                "bytes_read": self.bytes_read,
+                "result": result,
+                "error": self.error,
+            }
+
+    def _update(self, **attributes) -> None:
+        with self._lock:
+            for name, value in attributes.items():
+                setattr(self, name, value)
+            self.version += 1
+
+
+class JobManager:
+    """Keeps track of analysis jobs, and submits them to a scheduler.
+    Only the most recent jobs are remembered
+    """
+    _scheduler: AnalysisScheduler
+    _jobs: "collections.OrderedDict[str, Job]"
+    _history_size: int
+
+    def __init__(self, scheduler: AnalysisScheduler, history_size: int) -> None:
+        self._scheduler = scheduler
+        self._history_size = history_size
+        self._jobs = collections.OrderedDict()
+
+    def submit(self, request: AnalysisRequest) -> Job:
+        """Creates a job and schedules it, without waiting for it
+
+        Args:
+            request (AnalysisRequest): the analysis to run
+
+        Raises:
+            SchedulerSaturatedError: If scheduler has no capacity left
+
+        Returns:
+            Job: the created job
+        """
+        job = Job(request)
+        self._scheduler.submit(job.job_id, job.run, AnalyzeService())
+        self._jobs[job.job_id] = job
+        self._forget_old_jobs()
+        LOGGER.info("Job %s has been submitted for %s", job.job_id, request)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self._history_size)]:
+            del self._jobs[job_id]
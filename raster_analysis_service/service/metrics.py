@@ -0,0 +1,94 @@
+"""Totals of analyses run by the service, exposed in Prometheus text format
+"""
+import threading
+
+from typing import Dict, List
+
+from raster_analysis_service.utils.timing import STAGES, StageTimings
+
+
+PREFIX = "raster_analysis"
+# Counts of timings exposed as totals, with their description
+COUNTS = {
+    "files": "Images analyzed by workers",
+    "cached_files": "Images taken from result cache",
+    "tasks": "Tasks run by workers, an image is split into several tasks when large",
+    "bytes_read": "Bytes of pixels read from images",
+    "pixels_read": "Pixels read from images",
+}
+
+
+class AnalysisMetrics:
+    """Accumulates timings of every analysis, from the threads which run them"""
+    _lock: threading.Lock
+    _timings: StageTimings
+    _requests: int
+    _request_seconds: float
+    _last_utilization: float
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._timings = StageTimings()
+        self._requests = 0
+        self._request_seconds = 0.0
+        self._last_utilization = 0.0
+
+    def record(self, timings: StageTimings, seconds: float) -> None:
+        """Adds timings of a completed analysis
+
+        Args:
+            timings (StageTimings): timings collected while running the analysis
+            seconds (float): wall time of the analysis
+        """
+        with self._lock:
+            self._timings.update(timings)
+            self._requests += 1
+            self._request_seconds += seconds
+            if timings.capacity_seconds:
+                self._last_utilization = timings.busy_seconds / timings.capacity_seconds
+
+    def render(self, gauges: Dict[str, float]) -> str:
+        """Formats totals, and current values of given gauges, as Prometheus text
+
+        Args:
+            gauges (Dict[str, float]): current values, such as queue depth, by metric name without prefix
+
+        Returns:
+            str: metrics in Prometheus text exposition format
+        """
+        with self._lock:
+            lines: List[str] = []
+            _add_metric(lines, "requests_total", "counter", "Analyses completed", self._requests)
+            _add_metric(lines, "request_seconds_total", "counter", "Wall time of analyses", self._request_seconds)
+            _add_header(lines, "stage_seconds_total", "counter", "Time spent in each stage of analyses")
+            for stage in STAGES:
+                lines.append(f'{PREFIX}_stage_seconds_total{{stage="{stage}"}} {_format(self._timings.seconds[stage])}')
+            for name, description in COUNTS.items():
+                _add_metric(lines, f"{name}_total", "counter", description, self._timings.counts[name])
+            _add_metric(lines, "worker_busy_seconds_total", "counter", "Time workers spent running tasks",
+                        self._timings.busy_seconds)
+            _add_metric(lines, "worker_capacity_seconds_total", "counter",
+                        "Time workers were available to analyses", self._timings.capacity_seconds)
+            _add_metric(lines, "worker_utilization", "gauge", "Busy fraction of workers during last analysis",
+                        self._last_utilization)
+        for name, value in gauges.items():
+            _add_metric(lines, name, "gauge", name.replace("_", " ").capitalize(), value)
+        return "\n".join(lines) + "\n"
+
+
+def _add_header(lines: List[str], name: str, kind: str, description: str) -> None:
+    lines.append(f"# HELP {PREFIX}_{name} {description}")
+    lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+
+def _add_metric(lines: List[str], name: str, kind: str, description: str, value: float) -> None:
+    _add_header(lines, name, kind, description)
+    lines.append(f"{PREFIX}_{name} {_format(value)}")
+
+
+def _format(value: float) -> str:
+    # Counts are exact, however large
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+analysis_metrics = AnalysisMetrics()
@@ -0,0 +1,112 @@
+import contextlib
+import logging
+import os
+import pickle
+import sqlite3
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from raster_analysis_service.image.partials import Partial
+
+
+LOGGER = logging.getLogger("Analysis")
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS partials (
+    analysis TEXT NOT NULL,
+    path TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    partial BLOB NOT NULL,
+    PRIMARY KEY (analysis, path)
+)
+"""
+# Version of the schema, tables of previous versions are dropped
+_SCHEMA_VERSION = 2
+
+
+def _signature(paths: List[str]) -> str:
+    """Paths, modification times and sizes of files, which change along with their content"""
+    lines = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            lines.append(f"{path}:missing")
+            continue
+        lines.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+    return "\n".join(lines)
+
+
+class ResultCache:
+    """An SQLite backed cache of per-file partial states of analyses.
+    An entry is only valid while modification times and sizes of every file it has been computed from are unchanged
+    """
+    _database_path: str
+
+    def __init__(self, database_path: str) -> None:
+        self._database_path = database_path
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+        with self._connect() as connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS partials")
+                connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            connection.execute(_CREATE_TABLE)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection for a single transaction, committed unless it fails, then closes it"""
+        with contextlib.closing(sqlite3.connect(self._database_path, timeout=30)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+
+    def lookup(self, analysis_key: str, paths: Iterable[str],
+               input_paths: Optional[Callable[[str], List[str]]] = None) -> Tuple[Dict[str, Partial], Dict[str, str]]:
+        """Splits given files into cached and pending ones
+
+        Args:
+            analysis_key (str): key of the analysis, see Analysis.cache_key()
+            paths (Iterable[str]): files to look up
+            input_paths (Optional[Callable[[str], List[str]]], optional): Returns files which the partial state
+                of a file is computed from, see Analysis.input_paths(). Defaults to the file itself.
+
+        Returns:
+            Tuple[Dict[str, Partial], Dict[str, str]]: cached partial states by path, and signatures
+                of input files of files which should be computed, by path
+        """
+        cached: Dict[str, Partial] = {}
+        pending: Dict[str, str] = {}
+        with self._connect() as connection:
+            for path in paths:
+                inputs = _signature(input_paths(path) if input_paths else [path])
+                row = connection.execute(
+                    "SELECT partial FROM partials WHERE analysis = ? AND path = ? AND inputs = ?",
+                    (analysis_key, path, inputs)).fetchone()
+                partial = self._load(row[0]) if row else None
+                if partial is None:
+                    pending[path] = inputs
+                else:
+                    cached[path] = partial
+        LOGGER.info("%d images found in result cache, %d to be computed", len(cached), len(pending))
+        return cached, pending
+
+    def store(self, analysis_key: str, partials: Dict[str, Partial], inputs: Dict[str, str]) -> None:
+        """Stores partial states of files
+
+        Args:
+            analysis_key (str): key of the analysis, see Analysis.cache_key()
+            partials (Dict[str, Partial]): partial states by path
+            inputs (Dict[str, str]): signatures of input files, taken by lookup() before they were read
+        """
+        rows = [(analysis_key, path, inputs[path], pickle.dumps(partial)) for path, partial in partials.items()]
+        with self._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO partials VALUES (?, ?, ?, ?)", rows)
+
+    @staticmethod
+    def _load(blob: bytes):
+        try:
+            return pickle.loads(blob)
+        except Exception as exception:
+            # Entries written by an incompatible version are recomputed
+            LOGGER.debug("Discarding unreadable cache entry: %s", str(exception))
+            return None
@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import logging
+
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+LOGGER = logging.getLogger("Service")
+
+
+class SchedulerSaturatedError(Exception):
+    """Raised when a job is submitted while scheduler has no capacity left"""
+
+
+class AnalysisScheduler:
+    """Runs blocking analyses on a long-lived worker pool, off the event loop.
+    Identical in-flight jobs are coalesced and share a single computation
+    """
+    _max_running: int
+    _max_queued: int
+    _pool: Optional[concurrent.futures.ThreadPoolExecutor]
+    _in_flight: Dict[Hashable, asyncio.Future]
+
+    def __init__(self, max_running: int, max_queued: int) -> None:
+        self._max_running = max_running
+        self._max_queued = max_queued
+        self._pool = None
+        self._in_flight = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct jobs which are either running or queued"""
+        return len(self._in_flight)
+
+    @property
+    def running(self) -> int:
+        """Number of distinct jobs which are running"""
+        return min(len(self._in_flight), self._max_running)
+
+    @property
+    def queued(self) -> int:
+        """Number of distinct jobs which wait for a worker"""
+        return max(len(self._in_flight) - self._max_running, 0)
+
+    def start(self) -> None:
+        """Creates worker pool, should be called at application startup"""
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self._max_running,
+                                                               thread_name_prefix="analysis")
+
+    def shutdown(self) -> None:
+        """Waits for running jobs and releases worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, key: Hashable, function: Callable, *args) -> Any:
+        """Runs given function on worker pool and waits for its result.
+        If a job with the same key is in flight, its result is awaited instead
+
+        Args:
+            key (Hashable): identity of the job, used to coalesce identical jobs
+            function (Callable): blocking function to run
+            *args: arguments of the function
+
+        Raises:
+            SchedulerSaturatedError: If running and queued jobs are at their limit
+
+        Returns:
+            Any: return value of the function
+        """
+        # Cancellation of a single waiter should not cancel the shared job
+        return await asyncio.shield(self.submit(key, function, *args))
+
+    def submit(self, key: Hashable, function: Callable, *args) -> asyncio.Future:
+        """Schedules given function on worker pool without waiting for it.
+        If a job with the same key is in flight, its future is returned instead.
+        Must be called from the event loop
+
+        Args:
+            key (Hashable): identity of the job, used to coalesce identical jobs
+            function (Callable): blocking function to run
+            *args: arguments of the function
+
+        Raises:
+            SchedulerSaturatedError: If running and queued jobs are at their limit
+
+        Returns:
+            asyncio.Future: future of the return value of the function
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            LOGGER.info("Joining in-flight job %s", key)
+            return future
+
+        if self._pool is None:
+            raise RuntimeError("Scheduler has not been started")
+        if len(self._in_flight) >= self._max_running + self._max_queued:
+            raise SchedulerSaturatedError(f"{len(self._in_flight)} jobs are already in flight")
+
+        future = asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return future
@@ -0,0 +1,189 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sqlite3
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import rasterio
+from rasterio.errors import RasterioError
+from rasterio.warp import transform_bounds
+
+from raster_analysis_service.utils.file_io import item_date, split_asset_name
+from raster_analysis_service.utils.geometry import bounds_intersect, geometry_bounds
+
+
+LOGGER = logging.getLogger("Analysis")
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS footprints (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    crs TEXT,
+    left REAL NOT NULL,
+    bottom REAL NOT NULL,
+    right REAL NOT NULL,
+    top REAL NOT NULL,
+    west REAL NOT NULL,
+    south REAL NOT NULL,
+    east REAL NOT NULL,
+    north REAL NOT NULL,
+    footprint TEXT NOT NULL,
+    acquired TEXT,
+    cloud_cover REAL
+)
+"""
+
+
+class Footprint:
+    """Location and acquisition metadata of an indexed raster file
+    """
+    path: str
+    crs: Optional[str]
+    bounds: Tuple[float, float, float, float]
+    geographic_bounds: Tuple[float, float, float, float]
+    footprint: Dict[str, Any]
+    acquired: Optional[datetime.date]
+    cloud_cover: Optional[float]
+
+    def __init__(self, path: str, crs: Optional[str], bounds: Tuple[float, float, float, float],
+                 geographic_bounds: Tuple[float, float, float, float], footprint: Dict[str, Any],
+                 acquired: Optional[datetime.date] = None, cloud_cover: Optional[float] = None) -> None:
+        self.path = path
+        self.crs = crs
+        self.bounds = bounds
+        self.geographic_bounds = geographic_bounds
+        self.footprint = footprint
+        self.acquired = acquired
+        self.cloud_cover = cloud_cover
+
+
+def read_footprint(path: str) -> Footprint:
+    """Reads footprint of a raster file from its header, and from the STAC item
+    written next to it by the downloader, {item id}.json, if there is one
+
+    Args:
+        path (str): path of a raster file
+
+    Returns:
+        Footprint: metadata of the file
+    """
+    with rasterio.open(path) as dataset:
+        crs = dataset.crs.to_string() if dataset.crs else None
+        bounds = tuple(dataset.bounds)
+        geographic_bounds = transform_bounds(dataset.crs, "EPSG:4326", *bounds) if dataset.crs else bounds
+
+    west, south, east, north = geographic_bounds
+    footprint = {"type": "Polygon",
+                 "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]]}
+    acquired, cloud_cover = None, None
+
+    item_id = split_asset_name(path)[0]
+    item_path = os.path.join(os.path.dirname(path), item_id + ".json")
+    if os.path.exists(item_path):
+        with open(item_path, "r", encoding="utf-8") as item_file:
+            item = json.load(item_file)
+        properties = item.get("properties", {})
+        footprint = item.get("geometry") or footprint
+        if properties.get("datetime"):
+            acquired = datetime.date.fromisoformat(properties["datetime"][:10])
+        cloud_cover = properties.get("eo:cloud_cover")
+    if acquired is None:
+        acquired = item_date(item_id)
+    return Footprint(path, crs, bounds, tuple(geographic_bounds), footprint, acquired, cloud_cover)
+
+
+class SpatialIndex:
+    """An SQLite backed index of footprints and acquisition dates of raster files.
+    Files are only read when they are new, or when their modification time or size changes
+    """
+    _database_path: str
+
+    def __init__(self, database_path: str) -> None:
+        self._database_path = database_path
+        os.makedirs(os.path.dirname(database_path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(_CREATE_TABLE)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection for a single transaction, committed unless it fails, then closes it"""
+        with contextlib.closing(sqlite3.connect(self._database_path, timeout=30)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+
+    def update(self, paths: Iterable[str]) -> int:
+        """Indexes new and modified files, and forgets files which are not given anymore.
+        Files are read outside of any transaction, so that concurrent requests are not locked out meanwhile
+
+        Args:
+            paths (Iterable[str]): every file of the dataset
+
+        Returns:
+            int: number of files which have been read
+        """
+        paths = list(paths)
+        with self._connect() as connection:
+            indexed = {path: (mtime_ns, size) for path, mtime_ns, size
+                       in connection.execute("SELECT path, mtime_ns, size FROM footprints")}
+        rows = []
+        for path in paths:
+            stat = os.stat(path)
+            if indexed.get(path) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            try:
+                footprint = read_footprint(path)
+            except (RasterioError, ValueError) as exception:
+                LOGGER.warning("Unable to index %s: %s", path, str(exception))
+                continue
+            rows.append((path, stat.st_mtime_ns, stat.st_size, footprint.crs, *footprint.bounds,
+                         *footprint.geographic_bounds, json.dumps(footprint.footprint),
+                         footprint.acquired.isoformat() if footprint.acquired else None, footprint.cloud_cover))
+        removed = set(indexed).difference(paths)
+        with self._connect() as connection:
+            connection.executemany(f"INSERT OR REPLACE INTO footprints VALUES ({', '.join('?' * 15)})", rows)
+            connection.executemany("DELETE FROM footprints WHERE path = ?", [(path,) for path in removed])
+        LOGGER.info("Spatial index has been updated, %d files indexed and %d removed", len(rows), len(removed))
+        return len(rows)
+
+    def select(self, paths: Iterable[str], aoi: Optional[Dict[str, Any]] = None,
+               start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None) -> List[str]:
+        """Filters files by location and acquisition date, without opening them.
+        Files are compared by their bounding boxes, so a file whose box intersects an area
+        is kept even if its footprint does not, and is then only partially read
+
+        Args:
+            paths (Iterable[str]): indexed files to filter
+            aoi (Optional[Dict[str, Any]], optional): A GeoJSON geometry in WGS84. Defaults to None.
+            start_date (Optional[datetime.date], optional): First acquisition date, inclusive. Defaults to None.
+            end_date (Optional[datetime.date], optional): Last acquisition date, inclusive. Defaults to None.
+
+        Returns:
+            List[str]: files matching all filters, in given order. Files with an unknown
+                acquisition date never match a date filter
+        """
+        paths = list(paths)
+        aoi_bounds = geometry_bounds(aoi) if aoi else None
+        with self._connect() as connection:
+            rows = {path: (west, south, east, north, acquired) for path, west, south, east, north, acquired
+                    in connection.execute("SELECT path, west, south, east, north, acquired FROM footprints")}
+
+        selected = []
+        for path in paths:
+            row = rows.get(path)
+            if row is None:
+                continue
+            if aoi_bounds is not None and not bounds_intersect(row[:4], aoi_bounds):
+                continue
+            acquired = datetime.date.fromisoformat(row[4]) if row[4] else None
+            if (start_date or end_date) and acquired is None:
+                continue
+            if start_date and acquired < start_date or end_date and acquired > end_date:
+                continue
+            selected.append(path)
+        LOGGER.info("%d of %d images match location and date filters", len(selected), len(paths))
+        return selected
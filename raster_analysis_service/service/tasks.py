@@ -0,0 +1,48 @@
+import math
+import os
+
+from typing import List
+
+
+class AnalysisTask:
+    """A unit of work for an executor: one part of the windows of an image
+    """
+    image_path: str
+    part: int
+    parts: int
+    size: int
+
+    def __init__(self, image_path: str, part: int = 0, parts: int = 1, size: int = 0) -> None:
+        self.image_path = image_path
+        self.part = part
+        self.parts = parts
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f"AnalysisTask({self.image_path!r}, part={self.part}, parts={self.parts})"
+
+
+def plan_tasks(image_paths: List[str], split_bytes: int) -> List[AnalysisTask]:
+    """Creates tasks for given images, ordered for parallel execution.
+    Images larger than split_bytes are split into several window ranges,
+    then tasks are ordered largest first, so that big images do not end up
+    at the tail of the schedule while other workers are idle
+
+    Args:
+        image_paths (List[str]): images to analyze
+        split_bytes (int): file size above which an image is split. If not positive,
+            a single task is created per image, in given order
+
+    Returns:
+        List[AnalysisTask]: tasks covering every image
+    """
+    if split_bytes <= 0:
+        return [AnalysisTask(image_path) for image_path in image_paths]
+
+    tasks = []
+    for image_path in image_paths:
+        size = os.stat(image_path).st_size
+        parts = max(1, math.ceil(size / split_bytes))
+        tasks.extend(AnalysisTask(image_path, part, parts, size // parts) for part in range(parts))
+    # sorted() is stable, equally sized tasks keep dataset order
+    return sorted(tasks, key=lambda task: task.size, reverse=True)
@@ -1,5 +1,80 @@
-from pydantic import BaseModel
+import datetime
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, validator
+
+from raster_analysis_service.image.analysis import GroupBy
+from raster_analysis_service.image.composite import CompositeMethod
+from raster_analysis_service.image.spectral_index import SPECTRAL_INDICES
 
 
 class AnalysisRequest(BaseModel):
-    name: str
+    # An analysis type, or a list of them to calculate in a single pass
+    name: Union[str, List[str]]
+    # Approximate the analysis over images decimated by 2^overview_level
+    overview_level: int = Field(0, ge=0, le=6)
+    # Skip nodata and masked pixels of images
+    masked: bool = True
+    # Report results per asset, band, tile and/or date, computed in a single pass. DATE reports time series
+    group_by: List[GroupBy] = []
+    # Number of bins and value range of HISTOGRAM
+    histogram_bins: int = Field(64, ge=1, le=65536)
+    histogram_range: Tuple[float, float] = (0, 10000)
+    # Percentiles reported by PERCENTILES, between 0 and 100
+    percentiles: List[float] = Field([5, 25, 50, 75, 95], min_items=1)
+    # Only analyze pixels within a GeoJSON geometry, or feature, in WGS84
+    aoi: Optional[Dict[str, Any]] = None
+    # Only analyze images acquired within a date range, both ends inclusive
+    start_date: Optional[datetime.date] = None
+    end_date: Optional[datetime.date] = None
+    # Analyze a spectral index of scenes, such as NDVI, NDWI or NBR, instead of pixel values
+    index: Optional[str] = None
+    # Analyze a per-pixel MEDIAN or MEAN composite of the dates of each tile, instead of every date
+    composite: Optional[CompositeMethod] = None
+    # Leave cloudy pixels out of composites, according to the SCL asset of each scene
+    cloud_mask: bool = True
+    # Return the time spent in each stage of the analysis, and what it processed, along with its result
+    profile: bool = False
+
+    @validator("index")
+    def supported_index(cls, index):
+        if index is not None and index.upper() not in SPECTRAL_INDICES:
+            raise ValueError(f"index should be one of {', '.join(SPECTRAL_INDICES)}")
+        return index.upper() if index else index
+
+    @validator("end_date")
+    def dates_in_order(cls, end_date, values):
+        start_date = values.get("start_date")
+        if end_date is not None and start_date is not None and start_date > end_date:
+            raise ValueError("start_date should not be after end_date")
+        return end_date
+
+    @validator("histogram_range")
+    def increasing_histogram_range(cls, histogram_range):
+        if not histogram_range[0] < histogram_range[1]:
+            raise ValueError("histogram_range lower edge should be below its upper edge")
+        return histogram_range
+
+    @validator("percentiles", each_item=True)
+    def percentile_between_bounds(cls, percentile):
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentiles should be between 0 and 100")
+        return percentile
+
+    @validator("composite")
+    def composite_of_dates(cls, composite, values):
+        if composite is not None and GroupBy.DATE in values.get("group_by", []):
+            raise ValueError("composite merges dates, it can not be grouped by DATE")
+        return composite
+
+    @validator("aoi")
+    def geometry_of_aoi(cls, aoi):
+        if aoi is None:
+            # An explicit null is validated as well
+            return None
+        if aoi.get("type") == "Feature":
+            aoi = aoi.get("geometry")
+        if aoi is None or aoi.get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError("aoi should be a Polygon or MultiPolygon geometry, or a feature of one")
+        return aoi
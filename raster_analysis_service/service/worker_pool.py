@@ -0,0 +1,157 @@
+import concurrent.futures
+import logging
+import os
+import threading
+
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from raster_analysis_service.utils.constants import (
+    ANALYSIS_GDAL_CACHE_MB,
+    ANALYSIS_GDAL_DISABLE_READDIR_ON_OPEN,
+    ANALYSIS_GDAL_NUM_THREADS,
+    ANALYSIS_WORKER_MAX_TASKS,
+    ANALYSIS_WORKERS,
+)
+
+
+LOGGER = logging.getLogger("Analysis")
+
+GDAL_OPTIONS: Dict[str, Any] = {
+    "GDAL_CACHEMAX": ANALYSIS_GDAL_CACHE_MB,
+    "GDAL_NUM_THREADS": ANALYSIS_GDAL_NUM_THREADS,
+    "GDAL_DISABLE_READDIR_ON_OPEN": ANALYSIS_GDAL_DISABLE_READDIR_ON_OPEN,
+}
+
+# GDAL environment of each worker thread, kept open for the lifetime of the thread
+_worker_environment = threading.local()
+
+
+def initialize_worker(gdal_options: Dict[str, Any]) -> None:
+    """Imports raster libraries and configures GDAL once per worker process or thread"""
+    import rasterio
+
+    _worker_environment.env = rasterio.Env(**gdal_options)
+    _worker_environment.env.__enter__()
+
+
+def _ping(_: Any = None) -> int:
+    return os.getpid()
+
+
+class _ProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+    """Replaces workers which exit after max_tasks_per_child. The idle count of ProcessPoolExecutor
+    still includes exited workers, which are then never replaced: https://github.com/python/cpython/issues/115634
+    """
+    def _adjust_process_count(self) -> None:
+        for _ in range(len(self._processes), self._max_workers):
+            self._spawn_process()
+
+
+class PoolHealth(Enum):
+    HEALTHY = "HEALTHY"
+    # Workers are alive, but too busy with analyses to answer in time
+    BUSY = "BUSY"
+    # A worker has died, the pool has been replaced
+    BROKEN = "BROKEN"
+
+
+class WorkerPool:
+    """A long-lived process pool shared by analyses.
+    Each worker is replaced after a number of tasks, and the whole pool when it breaks
+    """
+    _workers: int
+    _max_tasks: int
+    _gdal_options: Dict[str, Any]
+    _pool: Optional[concurrent.futures.ProcessPoolExecutor]
+    _lock: threading.Lock
+
+    def __init__(self, workers: int, max_tasks: int, gdal_options: Dict[str, Any]) -> None:
+        self._workers = workers
+        self._max_tasks = max_tasks
+        self._gdal_options = gdal_options
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def start(self) -> None:
+        """Creates the pool and spawns its workers ahead of first request"""
+        list(self.map(_ping, [None] * self._workers))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def check_health(self, timeout: float = 60.0) -> PoolHealth:
+        """Pings the pool. Death of any worker breaks the whole pool, which is then replaced.
+        A pool which does not answer in time is busy, its analyses are left running
+
+        Args:
+            timeout (float, optional): Seconds to wait for an answer. Defaults to 60.
+
+        Returns:
+            PoolHealth: health of the pool
+        """
+        pool = self._acquire()
+        try:
+            future = pool.submit(_ping)
+        except BrokenProcessPool as exception:
+            return self._broken(pool, exception)
+        try:
+            future.result(timeout=timeout)
+        except BrokenProcessPool as exception:
+            return self._broken(pool, exception)
+        except concurrent.futures.TimeoutError:
+            # Ping is queued behind tasks of analyses
+            future.cancel()
+            LOGGER.info("Worker pool is busy, ping was not answered within %.1f seconds", timeout)
+            return PoolHealth.BUSY
+        return PoolHealth.HEALTHY
+
+    def map(self, function: Callable, items: List) -> Iterator:
+        """Maps function over items on pool workers, yielding results in order
+
+        Args:
+            function (Callable): a picklable function
+            items (List): arguments, one per task
+
+        Yields:
+            Any: return values of the function
+        """
+        pool = self._acquire()
+        try:
+            yield from pool.map(function, items)
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+    def _acquire(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Returns current pool, creating it if needed"""
+        with self._lock:
+            if self._pool is None:
+                # Workers are spawned, since forked ones can not be replaced after max_tasks
+                self._pool = _ProcessPoolExecutor(
+                    self._workers, initializer=initialize_worker, initargs=(self._gdal_options,),
+                    max_tasks_per_child=self._max_tasks)
+            return self._pool
+
+    def _broken(self, pool: concurrent.futures.ProcessPoolExecutor, exception: Exception) -> PoolHealth:
+        LOGGER.warning("Worker pool is broken, replacing it: %s", repr(exception))
+        self._discard(pool)
+        return PoolHealth.BROKEN
+
+    def _discard(self, pool: concurrent.futures.ProcessPoolExecutor) -> None:
+        """Replaces a broken pool. Its pending tasks have already failed, tasks of a new pool are left alone"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+
+worker_pool = WorkerPool(ANALYSIS_WORKERS, ANALYSIS_WORKER_MAX_TASKS, GDAL_OPTIONS)
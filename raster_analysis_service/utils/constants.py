@@ -9,3 +9,53 @@ RELATIVE_DATASET_PATH = os.environ.get("DATASET_PATH", "dataset")
 ABSOLUTE_DATASET_PATH = os.path.join(PROJECT_PATH, RELATIVE_DATASET_PATH)
 
 ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "16"))
+# One of SEQUENTIAL, PROCESS, THREAD or DISTRIBUTED. If empty, chosen by number of workers
+ANALYSIS_EXECUTOR = os.environ.get("ANALYSIS_EXECUTOR", "")
+ANALYSIS_WORKER_MAX_TASKS = int(os.environ.get("ANALYSIS_WORKER_MAX_TASKS", "10000"))
+ANALYSIS_GDAL_CACHE_MB = int(os.environ.get("ANALYSIS_GDAL_CACHE_MB", "64"))
+# Threads of a worker decompressing blocks, a number or ALL_CPUS
+ANALYSIS_GDAL_NUM_THREADS = os.environ.get("ANALYSIS_GDAL_NUM_THREADS", "1")
+# EMPTY_DIR saves listing dataset directories on open, but hides external overviews and masks
+ANALYSIS_GDAL_DISABLE_READDIR_ON_OPEN = os.environ.get("ANALYSIS_GDAL_DISABLE_READDIR_ON_OPEN", "FALSE")
+# Datasets each worker thread keeps open between tasks
+ANALYSIS_OPEN_DATASETS = int(os.environ.get("ANALYSIS_OPEN_DATASETS", "16"))
+ANALYSIS_CONCURRENCY = int(os.environ.get("ANALYSIS_CONCURRENCY", "2"))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get("ANALYSIS_QUEUE_SIZE", "8"))
+ANALYSIS_CHUNK_BYTES = int(os.environ.get("ANALYSIS_CHUNK_BYTES", str(16 * 1024 * 1024)))
+ANALYSIS_SPLIT_BYTES = int(os.environ.get("ANALYSIS_SPLIT_BYTES", str(64 * 1024 * 1024)))
+# Uncompressed GeoTIFFs are read from a memory map instead of through GDAL
+ANALYSIS_MEMORY_MAP = os.environ.get("ANALYSIS_MEMORY_MAP", "1") == "1"
+
+# Analysis nodes of the DISTRIBUTED executor, as comma separated host:port, sharing the dataset path
+ANALYSIS_NODES = os.environ.get("ANALYSIS_NODES", "")
+ANALYSIS_NODE_PORT = int(os.environ.get("ANALYSIS_NODE_PORT", "7100"))
+# Shared secret which the coordinator and nodes authenticate each other with
+ANALYSIS_NODE_AUTHKEY = os.environ.get("ANALYSIS_NODE_AUTHKEY", "")
+# Tasks sent concurrently to each node, which runs them on its own ANALYSIS_WORKERS processes
+ANALYSIS_NODE_SLOTS = int(os.environ.get("ANALYSIS_NODE_SLOTS", "4"))
+# Attempts of a task, or of a connection to a node, before giving up
+ANALYSIS_TASK_ATTEMPTS = int(os.environ.get("ANALYSIS_TASK_ATTEMPTS", "3"))
+# Tasks running longer than this factor times the median task are dispatched again to an idle node
+ANALYSIS_STRAGGLER_FACTOR = float(os.environ.get("ANALYSIS_STRAGGLER_FACTOR", "4.0"))
+
+JOB_HISTORY_SIZE = int(os.environ.get("JOB_HISTORY_SIZE", "100"))
+JOB_EVENTS_INTERVAL = float(os.environ.get("JOB_EVENTS_INTERVAL", "1.0"))
+
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", os.path.join(ABSOLUTE_DATASET_PATH, ".analysis_cache.sqlite"))
+
+SPATIAL_INDEX_PATH = os.environ.get("SPATIAL_INDEX_PATH", os.path.join(ABSOLUTE_DATASET_PATH, ".spatial_index.sqlite"))
+
+DATASET_CATALOG_PATH = os.environ.get("DATASET_CATALOG_PATH",
+                                      os.path.join(ABSOLUTE_DATASET_PATH, ".catalog", "catalog.json"))
+# Seconds to list dataset files from memory, before checking directories for changes
+DATASET_CATALOG_REFRESH_INTERVAL = float(os.environ.get("DATASET_CATALOG_REFRESH_INTERVAL", "1.0"))
+
+# Analyses reduce per-tile statistics of images instead of their pixels when possible.
+# Missing statistics are computed by the first analysis of an image which reads it in a single task
+TILE_STATISTICS_ENABLED = os.environ.get("TILE_STATISTICS_ENABLED", "1") == "1"
+TILE_STATISTICS_ON_ANALYSIS = os.environ.get("TILE_STATISTICS_ON_ANALYSIS", "1") == "1"
+
+# Layout of rasters rewritten by the ingest step of the downloader
+INGEST_COMPRESSION = os.environ.get("INGEST_COMPRESSION", "ZSTD")
+INGEST_BLOCK_SIZE = int(os.environ.get("INGEST_BLOCK_SIZE", "512"))
@@ -1,72 +1,47 @@
-import glob
-from itertools import chain
-from typing import Iterator, List
+import datetime
+import os
+import re
+from typing import Optional, Tuple
 
 
-class Globber:
-    """A class to create glob based on one or multiple extensions
-    """
-    _extensions: List[str]
-    _includes: str
-    _starting_directory: str
-
-    def __init__(self, starting_directory) -> None:
-        self._starting_directory = starting_directory
-        self._extensions = []
-        self._includes = None
-
-    def add_extension(self, extension: str):
-        """Add given extension to glob list
-
-        Args:
-            extension (str): file extension to be searched
-        """
-        if extension.startswith("."):
-            extension = extension[1:]
-        if extension not in self._extensions:
-            self._extensions.append(extension)
+# Sentinel-2 item ids end with their processing level, e.g. S2A_32TQM_20230115_0_L2A
+_ITEM_ASSET_PATTERN = re.compile(r"^(?P<item>.+_L(?:1C|2A))_(?P<asset>.+)$")
+# and contain their MGRS tile and acquisition date
+_ITEM_TILE_PATTERN = re.compile(r"_(?P<tile>\d{1,2}[A-Z]{3})_")
+_ITEM_DATE_PATTERN = re.compile(r"_(?P<date>\d{8})_")
 
-    def add_includes(self, inclusion: str) -> None:
-        if not inclusion.isalpha():
-            raise ValueError("Only letters are supported")
-        self._includes = inclusion
 
-    def create(self, recursive: bool = True) -> Iterator:
-        """Creates chain of iterators for globbing
+def split_asset_name(file_path: str) -> Tuple[str, str]:
+    """Splits a file name written by the downloader, {item id}_{asset key}.{extension},
+    into item id and asset key
 
-        Args:
-            recursive (bool, optional): If True, subdirectories will be included in search.
-                Defaults to True.
+    Args:
+        file_path (str): path of a downloaded asset
 
-        Returns:
-            Iterator: A glob iterator with files found
-        """
-        globbers: List[Iterator] = []
-        for extension in self._extensions:
-            glob_iterator = self._create_for_extension(extension, recursive)
-            globbers.append(glob_iterator)
-        return chain.from_iterable(globbers)
-
-    def _create_for_extension(self, extension: str, recursive: bool):
-        """Creates a single iterator for a single file type
-
-        Args:
-            extension (str): extension to create generator for
-            recursive (bool, optional): If True, subdirectories will be included in search
-
-        Returns:
-            Iterator: A glob iterator for given extension with files found
-        """
-        search_string = self._build_search_string(extension, recursive)
-        return glob.iglob(search_string, recursive=recursive)
+    Returns:
+        Tuple[str, str]: item id and asset key
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    match = _ITEM_ASSET_PATTERN.match(stem)
+    if match:
+        return match["item"], match["asset"]
+    item_id, _, asset_key = stem.rpartition("_")
+    return item_id, asset_key
+
+
+def item_tile(item_id: str) -> Optional[str]:
+    """Returns MGRS tile of a Sentinel-2 item id, e.g. 32TQM, None if it has none"""
+    match = _ITEM_TILE_PATTERN.search(item_id)
+    return match["tile"] if match else None
+
+
+def item_date(item_id: str) -> Optional[datetime.date]:
+    """Returns acquisition date of a Sentinel-2 item id, None if it has none"""
+    match = _ITEM_DATE_PATTERN.search(item_id)
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match["date"], "%Y%m%d").date()
+    except ValueError:
+        return None
 
-    def _build_search_string(self, extension: str, recursive: bool) -> str:
-        """Build and returns a search string for given extension
-        """
-        search_string = self._starting_directory + "/"
-        if recursive:
-            search_string = search_string + "**/"
-        if self._includes:
-            search_string += "*" + self._includes + "*"
-        search_string += f"*.{extension}"
-        return search_string
@@ -0,0 +1,35 @@
+from typing import Any, Dict, Iterator, Tuple
+
+
+def _positions(coordinates) -> Iterator:
+    """Iterates over positions of nested GeoJSON coordinates"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for item in coordinates:
+        yield from _positions(item)
+
+
+def geometry_bounds(geometry: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """Computes bounding box of a GeoJSON geometry
+
+    Args:
+        geometry (Dict[str, Any]): a GeoJSON geometry with coordinates, such as a Polygon
+
+    Raises:
+        ValueError: If geometry has no position
+
+    Returns:
+        Tuple[float, float, float, float]: left, bottom, right and top
+    """
+    positions = list(_positions(geometry.get("coordinates", [])))
+    if not positions:
+        raise ValueError(f"Geometry has no coordinates: {geometry.get('type')}")
+    xs = [position[0] for position in positions]
+    ys = [position[1] for position in positions]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def bounds_intersect(first: Tuple[float, float, float, float], second: Tuple[float, float, float, float]) -> bool:
+    """Checks if two bounding boxes, given as left, bottom, right and top, overlap"""
+    return first[0] <= second[2] and second[0] <= first[2] and first[1] <= second[3] and second[1] <= first[3]
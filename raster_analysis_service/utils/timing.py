@@ -0,0 +1,124 @@
+"""Seconds spent in stages of analyses, collected by the thread which runs them
+
+Workers collect timings of each task and send them back with its result,
+so that the parent merges timings of all workers, wherever they run.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+from typing import Dict, Iterator, List, Optional
+
+
+# Stages of tasks, run by workers. Time of a task which is not spent in another stage is spent reducing
+WORKER_STAGES = ("open", "read", "reduce")
+# Stages of an analysis, in order
+STAGES = ("catalog",) + WORKER_STAGES + ("merge",)
+
+
+class StageTimings:
+    """Seconds spent per stage, and counts of what was processed, such as files or pixels.
+    Capacity is the time workers were available to tasks, the whole execution times their number
+    """
+    seconds: Dict[str, float]
+    counts: Dict[str, int]
+    capacity_seconds: float
+
+    def __init__(self, seconds: Optional[Dict[str, float]] = None, counts: Optional[Dict[str, int]] = None,
+                 capacity_seconds: float = 0.0) -> None:
+        self.seconds = collections.defaultdict(float, seconds or {})
+        self.counts = collections.defaultdict(int, counts or {})
+        self.capacity_seconds = capacity_seconds
+
+    @property
+    def busy_seconds(self) -> float:
+        """Seconds workers spent running tasks"""
+        return sum(self.seconds[stage] for stage in WORKER_STAGES)
+
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def update(self, other: "StageTimings") -> None:
+        """Adds timings of another into these"""
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] += seconds
+        for name, count in other.counts.items():
+            self.counts[name] += count
+        self.capacity_seconds += other.capacity_seconds
+
+    # Timings are sent between processes, without their default factories
+    def __getstate__(self):
+        return dict(self.seconds), dict(self.counts), self.capacity_seconds
+
+    def __setstate__(self, state) -> None:
+        self.__init__(*state)
+
+
+class _Frame:
+    """A stage being timed, and time spent in stages nested within it"""
+    stage: str
+    started: float
+    nested_seconds: float
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.started = time.perf_counter()
+        self.nested_seconds = 0.0
+
+
+_collector = threading.local()
+
+
+def current_timings() -> Optional[StageTimings]:
+    """Returns timings collected by current thread, None if it does not collect any"""
+    return getattr(_collector, "timings", None)
+
+
+@contextlib.contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Collects timings of stages run by current thread within the context.
+    Timings collected by an enclosing context are resumed once it exits
+    """
+    previous = getattr(_collector, "timings", None), getattr(_collector, "frames", None)
+    _collector.timings, _collector.frames = StageTimings(), []
+    try:
+        yield _collector.timings
+    finally:
+        _collector.timings, _collector.frames = previous
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Adds time spent within the context to a stage, unless current thread does not collect timings.
+    Time spent in a nested stage is only added to the nested one
+    """
+    timings = getattr(_collector, "timings", None)
+    if timings is None:
+        yield
+        return
+    frames: List[_Frame] = _collector.frames
+    frame = _Frame(name)
+    frames.append(frame)
+    try:
+        yield
+    finally:
+        frames.pop()
+        elapsed = time.perf_counter() - frame.started
+        timings.seconds[name] += elapsed - frame.nested_seconds
+        if frames:
+            frames[-1].nested_seconds += elapsed
+
+
+def count(name: str, value: int = 1) -> None:
+    """Adds to a count of current thread, unless it does not collect timings"""
+    timings = getattr(_collector, "timings", None)
+    if timings is not None:
+        timings.counts[name] += value
+
+
+def add_timings(other: Optional[StageTimings]) -> None:
+    """Adds timings, such as those of a task run by another worker, to those of current thread"""
+    timings = getattr(_collector, "timings", None)
+    if timings is not None and other is not None:
+        timings.update(other)
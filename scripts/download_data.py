@@ -1,19 +1,26 @@
 import argparse
+import asyncio
 import concurrent.futures
 import json
 import logging
 import os
-import traceback
+import sys
 
 from datetime import datetime
-from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
 
-from satsearch import Search
-from satstac import utils
 from satstac.item import FILENAME_TEMPLATE, Item
 
+from download_engine import DownloadEngine, DownloadRequest, parse_multihash
+from stac_search import search_items
+
+# The ingest step is shared with the service package
+sys.path.insert(0, str(Path(__file__).parents[1]))
+from raster_analysis_service.image.ingest import ingest_image, is_ingested  # noqa: E402
+
 
 BASE_URL = "https://earth-search.aws.element84.com/v0"
 LOGGER = logging.getLogger("Dataset Downloader")
@@ -38,6 +45,18 @@ def parse_arguments():
                         help="Use to set logging level")
     parser.add_argument("--output-dir", type=str, default="dataset",
                         help=" A path from project path where dataset will be downloaded")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Number of assets downloaded at once")
+    parser.add_argument("--range-workers", type=int, default=4,
+                        help="Number of byte ranges of an asset downloaded at once")
+    parser.add_argument("--range-size", type=int, default=16 * 1024 * 1024,
+                        help="Size of byte ranges large assets are downloaded in")
+    parser.add_argument("--page-size", type=int, default=100,
+                        help="Number of items requested per search page")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="Number of assets queued for download, before search waits")
+    parser.add_argument("--ingest", action="store_true",
+                        help="Rewrite downloaded rasters as COGs for analysis, with tile statistics")
     parser.add_argument("--date", type=str, default=f"{TODAY.replace(day=TODAY.day - 2)}/{TODAY}",
                         help="A date filter to limit results." +
                         "Should be either a single date or a range")
@@ -104,15 +123,31 @@ def prepare_query_parameters(arguments) -> Dict[str, Any]:
     return query_parameters
 
 
-def download_item(item: Item, output_dir: str) -> None:
-    """Downloads a single SAC STAC item
-    This method is copied and updated from satstac.item.Item.download()
+def save_item_metadata(item: Item, output_dir: str) -> None:
+    """Writes STAC metadata of an item next to its assets, as {item id}.json.
+    The service indexes footprint, date and cloud cover of assets from it
+
+    Args:
+        item (Item): SAC STAC item to be downloaded
+        output_dir (str): Output directory for downloaded item data
+    """
+    file_path = os.path.join(PROJECT_PATH, output_dir, item.get_path(FILENAME_TEMPLATE) + ".json")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as item_file:
+        json.dump(item._data, item_file)
+
+
+def item_download_requests(item: Item, output_dir: str) -> List[DownloadRequest]:
+    """Lists assets of a single SAC STAC item to download, as {item id}_{asset key}.{extension}
 
     Args:
         item (Item): SAC STAC item to be downloaded
         output_dir (str): Output directory for downloaded item data
+
+    Returns:
+        List[DownloadRequest]: a request per asset, with its size and checksum if item declares them
     """
-    overwrite = False
+    download_requests = []
     for key in item._data['assets'].keys():
         asset = item.asset(key)
         if asset is None:
@@ -121,28 +156,83 @@ def download_item(item: Item, output_dir: str) -> None:
         ext = os.path.splitext(asset['href'])[1]
         filename = item.get_path(FILENAME_TEMPLATE) + '_' + key + ext
         file_path = os.path.join(PROJECT_PATH, output_dir, filename)
-        if not os.path.exists(file_path) or overwrite:
-            try:
-                utils.download_file(asset['href'], filename=file_path,
-                                    requester_pays=False, headers={})
-            except Exception as exception:
-                LOGGER.error("Unable to download %s: %s", asset['href'], str(exception))
-                LOGGER.debug(traceback.format_exc())
+        download_requests.append(DownloadRequest(asset['href'], file_path, asset.get("file:size"),
+                                                 parse_multihash(asset.get("file:checksum"))))
+    return download_requests
 
 
-def download_items(items: List[Item], output_dir: str) -> None:
-    """Downloads all the STAC Items to given directory
+def download_asset(engine: DownloadEngine, request: DownloadRequest, ingest: bool = False) -> None:
+    """Downloads a single asset, then optionally ingests it.
+    Ingested assets are rewritten, so they are recognized by their tile statistics instead of their size
 
     Args:
-        items (List[Item]): Items to be downloaded
-        output_dir (str): Dataset directory to download items
+        engine (DownloadEngine): engine to download asset with
+        request (DownloadRequest): asset to download
+        ingest (bool, optional): If True, rasters are converted to COG with tile statistics. Defaults to False.
     """
-    download_fn = partial(download_item, output_dir=output_dir)
+    if is_ingested(request.file_path):
+        LOGGER.debug("Skipping %s, already ingested", request.file_path)
+        return
+    engine.download(request)
+    if ingest and request.file_path.endswith(".tif"):
+        ingest_image(request.file_path)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        executor.map(download_fn, items)
-    LOGGER.info("Download operation has been completed")
 
+async def download_search_results(search_url: str, search_parameters: Dict[str, Any], output_dir: str,
+                                  engine: DownloadEngine, workers: int = 8, queue_size: int = 64,
+                                  page_size: int = 100, ingest: bool = False) -> Tuple[int, int]:
+    """Searches STAC API and downloads assets of found items while search goes on.
+    Assets of each page are put into a bounded queue, which is consumed by download workers.
+    When the queue is full, next page is not requested until downloads catch up
+
+    Args:
+        search_url (str): URL of the STAC API
+        search_parameters (Dict[str, Any]): search body. Its limit is the maximum number of items
+        output_dir (str): Dataset directory to download items
+        engine (DownloadEngine): engine to download assets with
+        workers (int, optional): Number of assets downloaded at once. Defaults to 8.
+        queue_size (int, optional): Maximum number of queued assets. Defaults to 64.
+        page_size (int, optional): Number of items per search page. Defaults to 100.
+        ingest (bool, optional): If True, rasters are converted to COG with tile statistics. Defaults to False.
+
+    Returns:
+        Tuple[int, int]: number of assets found, and number of assets which could not be downloaded
+    """
+    search_parameters = dict(search_parameters)
+    limit = search_parameters.pop("limit", None)
+    queue: "asyncio.Queue[Optional[DownloadRequest]]" = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+    failures: List[DownloadRequest] = []
+    found = 0
+
+    async def download_worker(executor: concurrent.futures.Executor) -> None:
+        while True:
+            request = await queue.get()
+            if request is None:
+                return
+            try:
+                await loop.run_in_executor(executor, download_asset, engine, request, ingest)
+            except Exception as exception:
+                LOGGER.error("Unable to download %s: %s", request.url, str(exception))
+                failures.append(request)
+
+    with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="download") as executor:
+        tasks = [asyncio.create_task(download_worker(executor)) for _ in range(workers)]
+        try:
+            async with httpx.AsyncClient(timeout=60, transport=httpx.AsyncHTTPTransport(retries=3)) as client:
+                async for feature in search_items(client, search_url, search_parameters, page_size, limit):
+                    item = Item(feature)
+                    save_item_metadata(item, output_dir)
+                    for request in item_download_requests(item, output_dir):
+                        found += 1
+                        await queue.put(request)
+        finally:
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+
+    LOGGER.info("Download operation has been completed, %d of %d assets have failed", len(failures), found)
+    return found, len(failures)
 
 
 def main():
@@ -157,11 +247,15 @@ def main():
     search_parameters.update({"query": query_parameters})
     LOGGER.info("Configured parameters: \n %s", json.dumps(search_parameters, indent=4))
 
-    search = Search(url=BASE_URL, **search_parameters)
-    # Access protected variable to download with Threads.
-    # Default implementation only supports sequential download
-    item_collection: List[Item] = search.items()._items  
-    download_items(item_collection, args.output_dir)
+    engine = DownloadEngine(args.workers, args.range_workers, args.range_size)
+    try:
+        _, failed_count = asyncio.run(download_search_results(
+            args.search_url, search_parameters, args.output_dir, engine, workers=args.workers,
+            queue_size=args.queue_size, page_size=args.page_size, ingest=args.ingest))
+    finally:
+        engine.close()
+    if failed_count:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,275 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from typing import Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+LOGGER = logging.getLogger("Dataset Downloader")
+
+# Algorithm and hex digest of a file, e.g. ("sha256", "9f86d0...")
+Checksum = Tuple[str, str]
+
+# Multihash codes of hash functions, used by STAC file:checksum
+_MULTIHASH_ALGORITHMS = {0xd5: "md5", 0x11: "sha1", 0x12: "sha256", 0x13: "sha512"}
+
+_PART_SUFFIX = ".part"
+_STATE_SUFFIX = ".part.json"
+
+
+class DownloadError(Exception):
+    """Raised when a file can not be downloaded completely and intact"""
+
+
+class DownloadRequest:
+    """A file to download, with what is known about it ahead of download
+    """
+    url: str
+    file_path: str
+    size: Optional[int]
+    checksum: Optional[Checksum]
+
+    def __init__(self, url: str, file_path: str, size: Optional[int] = None,
+                 checksum: Optional[Checksum] = None) -> None:
+        self.url = url
+        self.file_path = file_path
+        self.size = size
+        self.checksum = checksum
+
+    def __repr__(self) -> str:
+        return f"DownloadRequest({self.url!r}, {self.file_path!r})"
+
+
+def parse_multihash(multihash: Optional[str]) -> Optional[Checksum]:
+    """Converts a hex encoded multihash, as in file:checksum of STAC assets, to a checksum
+
+    Args:
+        multihash (Optional[str]): hex encoded multihash
+
+    Returns:
+        Optional[Checksum]: checksum, None if hash function is not supported
+    """
+    if not multihash or len(multihash) < 4:
+        return None
+    try:
+        code, length = int(multihash[0:2], 16), int(multihash[2:4], 16)
+    except ValueError:
+        return None
+    digest = multihash[4:]
+    if code not in _MULTIHASH_ALGORITHMS or len(digest) != 2 * length:
+        return None
+    return _MULTIHASH_ALGORITHMS[code], digest.lower()
+
+
+class DownloadEngine:
+    """Downloads files over HTTP into temporary files, which are renamed once verified.
+    Files may be downloaded by several threads at once, and files larger than a range are downloaded
+    in parallel byte ranges. Interrupted downloads are resumed from completed ranges
+    """
+    _range_workers: int
+    _range_size: int
+    _retries: int
+    _timeout: float
+    _session: requests.Session
+
+    def __init__(self, max_workers: int = 8, range_workers: int = 4, range_size: int = 16 * 1024 * 1024,
+                 retries: int = 3, timeout: float = 60.0) -> None:
+        """Creates an engine with a connection pool shared by all downloads
+
+        Args:
+            max_workers (int, optional): Number of threads downloading files at once, connections are pooled
+                for them. Defaults to 8.
+            range_workers (int, optional): Number of ranges of a file downloaded at once. Defaults to 4.
+            range_size (int, optional): Size of a byte range in bytes. Defaults to 16 MiB.
+            retries (int, optional): Attempts to download a range or a file. Defaults to 3.
+            timeout (float, optional): Seconds to wait for a connection or data. Defaults to 60.
+        """
+        self._range_workers = range_workers
+        self._range_size = range_size
+        self._retries = retries
+        self._timeout = timeout
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers * range_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def download(self, request: DownloadRequest) -> bool:
+        """Downloads a single file, unless it has already been downloaded
+
+        Args:
+            request (DownloadRequest): file to download
+
+        Raises:
+            DownloadError: If file can not be downloaded, or does not match its size or checksum
+
+        Returns:
+            bool: True if file has been downloaded, False if it already existed
+        """
+        if request.size is not None and _file_size(request.file_path) == request.size:
+            # Known size of an existing file is checked without a request to the server
+            LOGGER.debug("Skipping %s, already downloaded", request.file_path)
+            return False
+        size, accepts_ranges = self._probe(request.url)
+        expected_size = request.size if request.size is not None else size
+        if os.path.exists(request.file_path):
+            if expected_size is None or os.path.getsize(request.file_path) == expected_size:
+                LOGGER.debug("Skipping %s, already downloaded", request.file_path)
+                return False
+            LOGGER.warning("Downloading %s again, its size does not match", request.file_path)
+
+        os.makedirs(os.path.dirname(request.file_path) or ".", exist_ok=True)
+        part_path = request.file_path + _PART_SUFFIX
+        state_path = request.file_path + _STATE_SUFFIX
+        LOGGER.info("Downloading %s as %s", request.url, request.file_path)
+        if accepts_ranges and expected_size is not None and expected_size > self._range_size:
+            self._download_ranges(request.url, part_path, state_path, expected_size)
+        else:
+            if os.path.exists(state_path):
+                # A preallocated partial file of a range download can not be appended to
+                _remove(part_path)
+                _remove(state_path)
+            self._download_stream(request.url, part_path, accepts_ranges)
+
+        try:
+            self._verify(part_path, expected_size, request.checksum)
+        except DownloadError:
+            _remove(part_path)
+            _remove(state_path)
+            raise
+        os.replace(part_path, request.file_path)
+        _remove(state_path)
+        return True
+
+    def _probe(self, url: str) -> Tuple[Optional[int], bool]:
+        """Returns size of a file, if known, and whether the server serves byte ranges of it"""
+        try:
+            response = self._session.head(url, allow_redirects=True, timeout=self._timeout)
+        except requests.RequestException as exception:
+            LOGGER.debug("HEAD request of %s has failed: %s", url, str(exception))
+            return None, False
+        if not response.ok:
+            return None, False
+        length = response.headers.get("Content-Length")
+        size = int(length) if length and "Content-Encoding" not in response.headers else None
+        return size, response.headers.get("Accept-Ranges", "").lower() == "bytes"
+
+    def _download_stream(self, url: str, part_path: str, accepts_ranges: bool) -> None:
+        """Downloads a file in a single request, appending to an earlier partial file if server allows"""
+        for attempt in range(1, self._retries + 1):
+            offset = os.path.getsize(part_path) if accepts_ranges and os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with self._session.get(url, headers=headers, stream=True, timeout=self._timeout) as response:
+                    if response.status_code == 416:
+                        # Partial file is already complete
+                        return
+                    response.raise_for_status()
+                    # A server may ignore the range and send the whole file
+                    mode = "ab" if offset and response.status_code == 206 else "wb"
+                    with open(part_path, mode) as part_file:
+                        for block in response.iter_content(chunk_size=1024 * 1024):
+                            part_file.write(block)
+                return
+            except requests.RequestException as exception:
+                if attempt == self._retries:
+                    raise DownloadError(f"{url}: {exception}") from exception
+                LOGGER.warning("Retrying download of %s after error: %s", url, str(exception))
+
+    def _download_ranges(self, url: str, part_path: str, state_path: str, size: int) -> None:
+        """Downloads byte ranges of a file in parallel into a preallocated partial file.
+        Completed ranges are recorded in a state file, so that an interrupted download is resumed
+        """
+        completed = self._load_state(state_path, size) if os.path.exists(part_path) else set()
+        if not completed or os.path.getsize(part_path) != size:
+            completed = set()
+            with open(part_path, "wb") as part_file:
+                part_file.truncate(size)
+
+        starts = [start for start in range(0, size, self._range_size) if start not in completed]
+        LOGGER.debug("Downloading %d of %d ranges of %s", len(starts), -(-size // self._range_size), url)
+        lock = threading.Lock()
+
+        def download_range(start: int) -> None:
+            self._download_range(url, part_path, start, min(start + self._range_size, size) - 1)
+            with lock:
+                completed.add(start)
+                _write_json(state_path, {"size": size, "completed": sorted(completed)})
+
+        with concurrent.futures.ThreadPoolExecutor(self._range_workers, thread_name_prefix="range") as executor:
+            for future in [executor.submit(download_range, start) for start in starts]:
+                future.result()
+
+    def _download_range(self, url: str, part_path: str, start: int, end: int) -> None:
+        for attempt in range(1, self._retries + 1):
+            try:
+                with self._session.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True,
+                                       timeout=self._timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise DownloadError(f"{url}: server has ignored range {start}-{end}")
+                    written = 0
+                    with open(part_path, "r+b") as part_file:
+                        part_file.seek(start)
+                        for block in response.iter_content(chunk_size=1024 * 1024):
+                            part_file.write(block)
+                            written += len(block)
+                if written != end - start + 1:
+                    raise requests.RequestException(f"received {written} bytes of range {start}-{end}")
+                return
+            except requests.RequestException as exception:
+                if attempt == self._retries:
+                    raise DownloadError(f"{url}: {exception}") from exception
+                LOGGER.warning("Retrying range %d-%d of %s after error: %s", start, end, url, str(exception))
+
+    @staticmethod
+    def _load_state(state_path: str, size: int) -> Set[int]:
+        try:
+            with open(state_path, "r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return set()
+        return set(state["completed"]) if state.get("size") == size else set()
+
+    @staticmethod
+    def _verify(file_path: str, size: Optional[int], checksum: Optional[Checksum]) -> None:
+        actual_size = os.path.getsize(file_path)
+        if size is not None and actual_size != size:
+            raise DownloadError(f"{file_path}: expected {size} bytes, received {actual_size}")
+        if checksum is not None:
+            algorithm, expected = checksum
+            digest = hashlib.new(algorithm)
+            with open(file_path, "rb") as downloaded_file:
+                for block in iter(lambda: downloaded_file.read(1024 * 1024), b""):
+                    digest.update(block)
+            if digest.hexdigest() != expected.lower():
+                raise DownloadError(f"{file_path}: {algorithm} checksum does not match")
+
+
+def _write_json(file_path: str, content) -> None:
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as json_file:
+        json.dump(content, json_file)
+    os.replace(temporary_path, file_path)
+
+
+def _file_size(file_path: str) -> Optional[int]:
+    try:
+        return os.path.getsize(file_path)
+    except FileNotFoundError:
+        return None
+
+
+def _remove(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,66 @@
+import logging
+
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+
+LOGGER = logging.getLogger("Dataset Downloader")
+
+
+def search_endpoint(search_url: str) -> str:
+    """Returns URL of the search endpoint of a STAC API"""
+    return urljoin(search_url.rstrip("/") + "/", "search")
+
+
+def _next_page_request(client: httpx.AsyncClient, page: Dict[str, Any],
+                       body: Dict[str, Any]) -> Optional[httpx.Request]:
+    """Builds request of the next page from the next link of a page, None if it is the last page"""
+    links = [link for link in page.get("links", []) if link.get("rel") == "next"]
+    if not links:
+        return None
+    link = links[0]
+    if link.get("method", "GET").upper() == "GET":
+        return client.build_request("GET", link["href"])
+    next_body = {**body, **link.get("body", {})} if link.get("merge", False) or "body" not in link else link["body"]
+    return client.build_request("POST", link["href"], json=next_body, headers=link.get("headers"))
+
+
+async def search_items(client: httpx.AsyncClient, search_url: str, parameters: Dict[str, Any],
+                       page_size: int = 100, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Searches a STAC API page by page, yielding items as their pages arrive.
+    A page is only requested once items of the previous one have been consumed
+
+    Args:
+        client (httpx.AsyncClient): client to send requests with
+        search_url (str): URL of the STAC API
+        parameters (Dict[str, Any]): search body, such as intersects, datetime and query
+        page_size (int, optional): Number of items per page. Defaults to 100.
+        limit (Optional[int], optional): Maximum number of items. Defaults to no limit.
+
+    Raises:
+        httpx.HTTPError: If a page can not be retrieved
+
+    Yields:
+        Dict[str, Any]: STAC items, as GeoJSON features
+    """
+    if limit is not None:
+        page_size = min(page_size, limit)
+    body = {**parameters, "limit": page_size}
+    request: Optional[httpx.Request] = client.build_request("POST", search_endpoint(search_url), json=body)
+    found = 0
+    pages = 0
+    while request is not None:
+        response = await client.send(request)
+        response.raise_for_status()
+        page = response.json()
+        pages += 1
+        LOGGER.debug("Received page %d with %d items", pages, len(page.get("features", [])))
+        for feature in page.get("features", []):
+            if limit is not None and found >= limit:
+                return
+            found += 1
+            yield feature
+        request = _next_page_request(client, page, body)
+    LOGGER.info("Search has been completed, %d items found in %d pages", found, pages)
@@ -4,7 +4,15 @@ import unittest
 from typing import Optional
 from unittest.mock import Mock
 
-from raster_analysis_service.image.analysis import AnalysisType, get_analysis, MeanValueAnalysis
+from raster_analysis_service.image.analysis import (
+    AnalysisType,
+    GroupBy,
+    HistogramAnalysis,
+    MeanValueAnalysis,
+    StatisticsAnalysis,
+    create_analysis,
+    get_analysis,
+)
 
 
 class MeanValueAnalysisTest(unittest.TestCase):
@@ -17,26 +25,204 @@ class MeanValueAnalysisTest(unittest.TestCase):
         self.analysis = None
 
     def test_initial_values(self):
-        self.assertEqual(self.analysis.pixel_count.value, 0)
-        self.assertEqual(self.analysis.average_mean.value, 0)
+        self.assertEqual(self.analysis.pixel_count, 0)
+        self.assertEqual(self.analysis.result(), 0)
 
     def test_add(self):
         mock_raster = Mock()
-        mock_raster.array.return_value = np.ones((3, 5, 5))
+        mock_raster.chunks.return_value = [np.ones((3, 5, 5))]
         self.analysis.add(mock_raster)
 
-        self.assertEqual(self.analysis.pixel_count.value, 75)
-        self.assertEqual(self.analysis.average_mean.value, 1)
+        self.assertEqual(self.analysis.pixel_count, 75)
+        self.assertEqual(self.analysis.result(), 1)
 
     def test_add_two_images(self):
         mock_raster = Mock()
-        mock_raster.array.return_value = np.ones((3, 5, 5))
+        mock_raster.chunks.return_value = [np.ones((3, 5, 5))]
         self.analysis.add(mock_raster)
-        mock_raster.array.return_value = np.ones((3, 5, 5)) * 5
+        mock_raster.chunks.return_value = [np.ones((3, 2, 5)) * 5, np.ones((3, 3, 5)) * 5]
         self.analysis.add(mock_raster)
 
-        self.assertEqual(self.analysis.pixel_count.value, 150)
-        self.assertEqual(self.analysis.average_mean.value, 3)
+        self.assertEqual(self.analysis.pixel_count, 150)
+        self.assertEqual(self.analysis.result(), 3)
+
+    def test_merge_partial_of_spawned_analysis(self):
+        mock_raster = Mock()
+        mock_raster.chunks.return_value = [np.ones((3, 5, 5))]
+        self.analysis.add(mock_raster)
+
+        worker_analysis = self.analysis.spawn()
+        mock_raster.chunks.return_value = [np.ones((1, 5, 5)) * 5]
+        worker_analysis.add(mock_raster)
+        self.analysis.merge(worker_analysis.partial())
+
+        self.assertEqual(worker_analysis.pixel_count, 25)
+        self.assertEqual(self.analysis.pixel_count, 100)
+        self.assertEqual(self.analysis.result(), 2)
+
+
+class ApproximateMeanValueAnalysisTest(unittest.TestCase):
+    def test_add_reads_decimated_chunks(self):
+        analysis = MeanValueAnalysis(overview_level=2)
+        mock_raster = Mock()
+        mock_raster.chunks.return_value = [np.array([[[1, 3]]])]
+        analysis.add(mock_raster)
+
+        mock_raster.chunks.assert_called_once_with(decimation=4, masked=True)
+        self.assertDictEqual(analysis.result(),
+                             {"value": 2.0, "error": 1.0, "overview_level": 2, "sampled_pixels": 2})
+
+    def test_spawn_keeps_overview_level(self):
+        analysis = MeanValueAnalysis(overview_level=3)
+
+        self.assertEqual(analysis.spawn().cache_key(), analysis.cache_key())
+        self.assertNotEqual(analysis.cache_key(), MeanValueAnalysis().cache_key())
+
+
+class MaskedMeanValueAnalysisTest(unittest.TestCase):
+    def test_masked_pixels_are_skipped(self):
+        analysis = MeanValueAnalysis()
+        mock_raster = Mock()
+        mock_raster.chunks.return_value = [np.ma.MaskedArray([[[0, 2, 4]]], mask=[[[True, False, False]]])]
+        analysis.add(mock_raster)
+
+        mock_raster.chunks.assert_called_once_with(decimation=1, masked=True)
+        self.assertEqual(analysis.pixel_count, 2)
+        self.assertEqual(analysis.result(), 3)
+
+    def test_unmasked_analysis(self):
+        analysis = MeanValueAnalysis(masked=False)
+        mock_raster = Mock()
+        mock_raster.chunks.return_value = [np.array([[[0, 2, 4]]])]
+        analysis.add(mock_raster)
+
+        mock_raster.chunks.assert_called_once_with(decimation=1, masked=False)
+        self.assertEqual(analysis.result(), 2)
+        self.assertNotEqual(analysis.cache_key(), MeanValueAnalysis().cache_key())
+
+
+class GroupedMeanValueAnalysisTest(unittest.TestCase):
+    def _mock_raster(self, path, chunks):
+        mock_raster = Mock()
+        mock_raster.raster_image_path = path
+        mock_raster.raster_data.indexes = (1, 2)
+        mock_raster.chunks.return_value = chunks
+        return mock_raster
+
+    def setUp(self) -> None:
+        self.b04 = self._mock_raster("S2B_32TQM_20230115_0_L2A_B04.tif",
+                                     [np.stack([np.ones((2, 2)), np.ones((2, 2)) * 3])])
+        self.b08 = self._mock_raster("S2B_32TQM_20230115_0_L2A_B08.tif",
+                                     [np.stack([np.ones((2, 2)) * 5, np.ones((2, 2)) * 7])])
+
+    def test_group_by_asset(self):
+        analysis = MeanValueAnalysis(group_by=[GroupBy.ASSET])
+        analysis.add(self.b04)
+        analysis.add(self.b08)
+
+        self.assertDictEqual(analysis.result(), {"B04": 2.0, "B08": 6.0})
+
+    def test_group_by_band(self):
+        analysis = MeanValueAnalysis(group_by=[GroupBy.BAND])
+        analysis.add(self.b04)
+        analysis.add(self.b08)
+
+        self.assertDictEqual(analysis.result(), {"1": 3.0, "2": 5.0})
+        self.assertDictEqual(analysis.pixel_count, {"1": 8, "2": 8})
+
+    def test_group_by_asset_and_band(self):
+        analysis = MeanValueAnalysis(group_by=[GroupBy.ASSET, GroupBy.BAND])
+        analysis.add(self.b04)
+        worker_analysis = analysis.spawn()
+        worker_analysis.add(self.b08)
+        analysis.merge(worker_analysis.partial())
+
+        self.assertDictEqual(analysis.result(), {"B04": {"1": 1.0, "2": 3.0}, "B08": {"1": 5.0, "2": 7.0}})
+        self.b04.chunks.assert_called_once()
+
+    def test_grouping_is_part_of_cache_key(self):
+        grouped = MeanValueAnalysis(group_by=["ASSET"])
+
+        self.assertNotEqual(grouped.cache_key(), MeanValueAnalysis().cache_key())
+        self.assertEqual(grouped.spawn().cache_key(), grouped.cache_key())
+
+
+class StatisticsAnalysisTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.mock_raster = Mock()
+        self.mock_raster.chunks.return_value = [np.ma.MaskedArray([[[0, 1, 2]], [[3, 4, 5]]], mask=False),
+                                                np.ma.MaskedArray([[[6, 7, 99]]], mask=[[[False, False, True]]])]
+
+    def test_statistics_in_one_read(self):
+        analysis = StatisticsAnalysis(["MEAN_VALUE", "MIN_VALUE", "MAX_VALUE", "VARIANCE", "STANDARD_DEVIATION",
+                                       "HISTOGRAM", "PERCENTILES"], histogram_bins=2, histogram_range=(0, 8),
+                                      percentiles=[50])
+        analysis.add(self.mock_raster)
+
+        self.mock_raster.chunks.assert_called_once_with(decimation=1, masked=True)
+        result = analysis.result()
+        self.assertEqual(result["MEAN_VALUE"], 3.5)
+        self.assertEqual((result["MIN_VALUE"], result["MAX_VALUE"]), (0, 7))
+        self.assertAlmostEqual(result["VARIANCE"], 6.0)
+        self.assertAlmostEqual(result["STANDARD_DEVIATION"], 6.0 ** 0.5)
+        self.assertDictEqual(result["HISTOGRAM"],
+                             {"edges": [0.0, 4.0, 8.0], "counts": [4, 4], "underflow": 0, "overflow": 0})
+        self.assertAlmostEqual(result["PERCENTILES"]["50"], 3.0, delta=0.03)
+
+    def test_nan_pixels_are_skipped_by_every_statistic(self):
+        analysis = StatisticsAnalysis(["MEAN_VALUE", "MIN_VALUE", "VARIANCE", "HISTOGRAM"], masked=False,
+                                      histogram_bins=2, histogram_range=(0, 4))
+        self.mock_raster.chunks.return_value = [np.array([[[1.0, np.nan, 3.0]]])]
+        analysis.add(self.mock_raster)
+
+        result = analysis.result()
+        self.assertEqual(result["MEAN_VALUE"], 2.0)
+        self.assertEqual(result["MIN_VALUE"], 1.0)
+        self.assertAlmostEqual(result["VARIANCE"], 2.0)
+        self.assertListEqual(result["HISTOGRAM"]["counts"], [1, 1])
+
+    def test_merge_partial_of_spawned_analysis(self):
+        analysis = StatisticsAnalysis([AnalysisType.MIN_VALUE, AnalysisType.MAX_VALUE], group_by=[GroupBy.BAND])
+        self.mock_raster.raster_image_path = "S2B_32TQM_20230115_0_L2A_B04.tif"
+        self.mock_raster.raster_data.indexes = (1, 2)
+        self.mock_raster.chunks.return_value = [np.array([[[0, 1]], [[2, 3]]])]
+        worker_analysis = analysis.spawn()
+        worker_analysis.add(self.mock_raster)
+        analysis.merge(worker_analysis.partial())
+
+        self.assertEqual(worker_analysis.cache_key(), analysis.cache_key())
+        self.assertDictEqual(analysis.result(), {"1": {"MIN_VALUE": 0, "MAX_VALUE": 1},
+                                                 "2": {"MIN_VALUE": 2, "MAX_VALUE": 3}})
+
+    def test_invalid_operations_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            StatisticsAnalysis([])
+        with self.assertRaises(ValueError):
+            StatisticsAnalysis(["MEAN_VALUE", "ERROR"])
+
+
+class CreateAnalysisTest(unittest.TestCase):
+    def test_single_type_ignores_unused_options(self):
+        analysis = create_analysis("MEAN_VALUE", overview_level=1, histogram_bins=8)
+
+        self.assertEqual(analysis.cache_key(), MeanValueAnalysis(overview_level=1).cache_key())
+
+    def test_single_type_with_own_options(self):
+        analysis = create_analysis(AnalysisType.HISTOGRAM, histogram_bins=8)
+
+        self.assertEqual(analysis.cache_key(), HistogramAnalysis(histogram_bins=8).cache_key())
+
+    def test_list_of_types(self):
+        analysis = create_analysis(["MEAN_VALUE", "PERCENTILES"], percentiles=[50])
+
+        self.assertIsInstance(analysis, StatisticsAnalysis)
+        self.assertDictEqual(analysis.result(), {"MEAN_VALUE": 0.0, "PERCENTILES": {"50": None}})
+
+    def test_invalid_options_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            create_analysis("HISTOGRAM", histogram_range=(5, 5))
+        with self.assertRaises(ValueError):
+            create_analysis("PERCENTILES", percentiles=[50, 500])
 
 
 class GetAnalysisTest(unittest.TestCase):
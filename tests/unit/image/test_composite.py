@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.image.analysis import GroupBy, MeanValueAnalysis, StatisticsAnalysis
+from raster_analysis_service.image.composite import CompositeMethod, composite_chunks, group_stacks
+from raster_analysis_service.image.types import RasterImage
+
+
+DATES = ("20230115", "20230120", "20230125")
+
+
+class GroupStacksTest(unittest.TestCase):
+    def test_images_are_stacked_by_tile_and_asset_in_date_order(self):
+        image_paths = ["/data/l2a/2023-01-20/S2B_32TQM_20230120_0_L2A_B04.tif",
+                       "/data/l2a/2023-01-15/S2A_32TQM_20230115_0_L2A_B04.tif",
+                       "/data/l2a/2023-01-15/S2A_32TQM_20230115_0_L2A_B08.tif",
+                       "/data/l2a/2023-01-15/S2A_32TQM_20230115_0_L2A_SCL.tif",
+                       "/data/l2a/2023-01-15/S2A_33TUG_20230115_0_L2A_B04.tif"]
+
+        stacks = group_stacks(image_paths)
+
+        self.assertDictEqual(stacks, {
+            image_paths[1]: [image_paths[1], image_paths[0]],
+            image_paths[2]: [image_paths[2]],
+            image_paths[4]: [image_paths[4]],
+        })
+
+
+class CompositeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.values = rng.integers(1, 10000, (len(DATES), 1, 8, 8), dtype=np.uint16)
+        self.values[0, 0, 0, 0] = 0
+        self.clouds = np.zeros_like(self.values, dtype=bool)
+        self.clouds[1, 0, :2] = True
+        self.image_paths = []
+        for date, values, clouds in zip(DATES, self.values, self.clouds):
+            self.image_paths.append(self._write(date, "B04", values, "uint16", nodata=0))
+            self._write(date, "SCL", np.where(clouds, 9, 4).astype(np.uint8), "uint8")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, date, asset_key, data, dtype, nodata=None):
+        directory = os.path.join(self.directory.name, "l2a", date)
+        os.makedirs(directory, exist_ok=True)
+        image_path = os.path.join(directory, f"S2A_32TQM_{date}_0_L2A_{asset_key}.tif")
+        with rasterio.open(image_path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1], count=1,
+                           dtype=dtype, nodata=nodata, crs="EPSG:32632", blockysize=2,
+                           transform=from_origin(300000, 5000000, 10, 10)) as dataset:
+            dataset.write(data)
+        return image_path
+
+    def _expected(self, cloud_mask=True):
+        invalid = self.values == 0
+        if cloud_mask:
+            invalid |= self.clouds
+        return np.ma.MaskedArray(self.values.astype(np.float64), mask=invalid)
+
+    def test_cloud_masked_median_is_streamed_in_windows(self):
+        with RasterImage(self.image_paths[0]) as raster_image:
+            # Strips of two rows of a band and of its classification, for every date
+            chunks = list(composite_chunks(raster_image, self.image_paths, max_chunk_bytes=len(DATES) * 2 * 2 * 8 * 2,
+                                           masked=True))
+            bytes_read = raster_image.bytes_read
+
+        self.assertEqual(len(chunks), 4)
+        composite = np.ma.concatenate(chunks, axis=1)
+        np.testing.assert_allclose(composite, np.ma.median(self._expected(), axis=0))
+        self.assertEqual(bytes_read, len(DATES) * 8 * 8 * (2 + 1))
+
+    def test_mean_without_cloud_mask(self):
+        with RasterImage(self.image_paths[0]) as raster_image:
+            chunks = list(composite_chunks(raster_image, self.image_paths, CompositeMethod.MEAN, cloud_mask=False,
+                                           masked=True))
+
+        np.testing.assert_allclose(np.ma.concatenate(chunks, axis=1), self._expected(False).mean(axis=0))
+
+    def test_analysis_of_composite(self):
+        analysis = MeanValueAnalysis(composite="median")
+        image_paths = analysis.select_images(self.image_paths)
+        worker_analysis = analysis.spawn()
+        with RasterImage(image_paths[0]) as raster_image:
+            worker_analysis.add(raster_image)
+        analysis.merge(worker_analysis.partial())
+
+        self.assertListEqual(image_paths, [self.image_paths[0]])
+        self.assertAlmostEqual(analysis.result(), float(np.ma.median(self._expected(), axis=0).mean()))
+        self.assertFalse(analysis.uses_tile_statistics())
+
+    def test_cache_key_depends_on_stacks(self):
+        analysis = MeanValueAnalysis(composite="MEDIAN")
+        analysis.select_images(self.image_paths)
+        other_analysis = MeanValueAnalysis(composite="MEDIAN")
+        other_analysis.select_images(self.image_paths[:2])
+
+        self.assertNotEqual(analysis.cache_key(), other_analysis.cache_key())
+        self.assertEqual(analysis.cache_key(), analysis.spawn().cache_key())
+
+    def test_input_paths_are_every_date_of_stack(self):
+        analysis = MeanValueAnalysis(composite="MEDIAN")
+        reference_path = analysis.select_images(self.image_paths)[0]
+        without_cloud_mask = MeanValueAnalysis(composite="MEDIAN", cloud_mask=False)
+        without_cloud_mask.select_images(self.image_paths)
+
+        self.assertListEqual(analysis.input_paths(reference_path),
+                             [path for image_path in self.image_paths
+                              for path in (image_path, image_path.replace("_B04.tif", "_SCL.tif"))])
+        self.assertListEqual(without_cloud_mask.input_paths(reference_path), self.image_paths)
+
+    def test_time_series_of_dates(self):
+        analysis = StatisticsAnalysis(["MEAN_VALUE"], group_by=[GroupBy.TILE, GroupBy.DATE])
+        for image_path in self.image_paths:
+            with RasterImage(image_path) as raster_image:
+                analysis.add(raster_image)
+
+        result = analysis.result()
+        self.assertListEqual(list(result["32TQM"]), ["2023-01-15", "2023-01-20", "2023-01-25"])
+        values = self._expected(False)
+        for date, expected in zip(result["32TQM"].values(), values):
+            self.assertAlmostEqual(date["MEAN_VALUE"], float(expected.mean()))
+
+    def test_composite_grouped_by_date_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            MeanValueAnalysis(composite="MEDIAN", group_by=[GroupBy.DATE])
+
+    def test_invalid_composite_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            MeanValueAnalysis(composite="MODE")
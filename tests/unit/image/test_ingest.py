@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.image.ingest import convert_to_cog, ingest_image, is_ingested
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = np.random.default_rng(0).integers(0, 10000, (1, 300, 400), dtype=np.uint16)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write_image(self, name: str) -> str:
+        image_path = os.path.join(self.directory.name, name)
+        with rasterio.open(image_path, "w", driver="GTiff", width=400, height=300, count=1, dtype="uint16",
+                           crs="EPSG:32632", transform=from_origin(0, 0, 10, 10)) as dataset:
+            dataset.write(self.data)
+        return image_path
+
+    def test_convert_to_cog(self):
+        image_path = self._write_image("S2A_32TQM_20230115_0_L2A_B04.tif")
+
+        self.assertTrue(convert_to_cog(image_path, compression="LZW", block_size=128))
+        with rasterio.open(image_path) as dataset:
+            self.assertEqual(dataset.tags(ns="IMAGE_STRUCTURE")["LAYOUT"], "COG")
+            self.assertEqual(dataset.compression.name, "lzw")
+            self.assertListEqual(dataset.block_shapes, [(128, 128)])
+            self.assertListEqual(dataset.overviews(1), [2, 4])
+            np.testing.assert_array_equal(dataset.read(), self.data)
+        self.assertListEqual(os.listdir(self.directory.name), ["S2A_32TQM_20230115_0_L2A_B04.tif"])
+
+    def test_failed_conversion_leaves_no_temporary_file(self):
+        image_path = self._write_image("S2A_32TQM_20230115_0_L2A_B04.tif")
+
+        with patch("raster_analysis_service.image.ingest.os.replace", side_effect=OSError("full")):
+            with self.assertRaises(OSError):
+                convert_to_cog(image_path, compression="LZW", block_size=128)
+        self.assertListEqual(os.listdir(self.directory.name), ["S2A_32TQM_20230115_0_L2A_B04.tif"])
+
+    def test_cog_with_requested_layout_is_kept(self):
+        image_path = self._write_image("S2A_32TQM_20230115_0_L2A_B04.tif")
+        convert_to_cog(image_path, compression="LZW", block_size=128)
+
+        self.assertFalse(convert_to_cog(image_path, compression="LZW", block_size=128))
+        self.assertTrue(convert_to_cog(image_path, compression="DEFLATE", block_size=128))
+
+    def test_cog_with_fallback_compression_is_kept(self):
+        image_path = self._write_image("S2A_32TQM_20230115_0_L2A_B04.tif")
+        convert_to_cog(image_path, compression="LZW", block_size=128)
+
+        with patch("raster_analysis_service.image.ingest._supports_compression", return_value=False):
+            self.assertFalse(convert_to_cog(image_path, compression="ZSTD", block_size=128))
+
+    def test_ingest_image_writes_tile_statistics(self):
+        image_path = self._write_image("S2A_32TQM_20230115_0_L2A_SCL.tif")
+        self.assertFalse(is_ingested(image_path))
+
+        statistics = ingest_image(image_path, compression="LZW", block_size=128)
+        self.assertTrue(is_ingested(image_path))
+        self.assertEqual(statistics.totals.sum(), self.data.sum(dtype=np.float64))
+        self.assertTupleEqual(statistics.block_shape, (128, 128))
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from raster_analysis_service.image.memory_map import open_memory_map
+from raster_analysis_service.image.types import RasterImage
+
+
+LAYOUTS = [
+    {},
+    {"interleave": "band"},
+    {"blockysize": 7},
+    {"interleave": "band", "blockysize": 7},
+    {"tiled": True, "blockxsize": 16, "blockysize": 16},
+    {"interleave": "band", "tiled": True, "blockxsize": 16, "blockysize": 16},
+]
+
+
+class MemoryMapTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.directory.name, "image.tif")
+        self.data = np.random.default_rng(0).integers(0, 60000, (3, 30, 40), dtype=np.uint16)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, **options):
+        with rasterio.open(self.image_path, "w", driver="GTiff", width=40, height=30, count=3, dtype="uint16",
+                           crs="EPSG:4326", transform=from_origin(0, 30, 1, 1), **options) as dataset:
+            dataset.write(self.data)
+
+    def test_windows_of_uncompressed_layouts(self):
+        windows = [Window(0, 0, 40, 30), Window(3, 5, 20, 17), Window(39, 29, 1, 1)]
+        for layout in LAYOUTS:
+            with self.subTest(**layout):
+                self._write(**layout)
+                with rasterio.open(self.image_path) as dataset:
+                    memory_map = open_memory_map(dataset)
+                    for window in windows:
+                        np.testing.assert_array_equal(memory_map.read(window), dataset.read(window=window))
+
+    def test_strips_are_read_without_copy(self):
+        self._write(interleave="band", blockysize=7)
+        with rasterio.open(self.image_path) as dataset:
+            memory_map = open_memory_map(dataset)
+            chunk = memory_map.read(Window(3, 5, 20, 17))
+
+        self.assertTrue(np.shares_memory(chunk, memory_map._buffer))
+        self.assertFalse(chunk.flags.writeable)
+
+    def test_compressed_files_are_not_mapped(self):
+        self._write(compress="deflate")
+        with rasterio.open(self.image_path) as dataset:
+            self.assertIsNone(open_memory_map(dataset))
+
+    def test_raster_image_reads_from_map(self):
+        self._write(tiled=True, blockxsize=16, blockysize=16)
+        with RasterImage(self.image_path) as raster_image:
+            self.assertIsNotNone(raster_image.memory_map)
+            np.testing.assert_array_equal(raster_image.array(), self.data)
+            chunks = list(raster_image.chunks(max_chunk_bytes=16 * 40 * 6))
+        np.testing.assert_array_equal(np.concatenate(chunks, axis=1), self.data)
+
+    @patch("raster_analysis_service.image.types.ANALYSIS_MEMORY_MAP", False)
+    def test_disabled_memory_map(self):
+        self._write()
+        with RasterImage(self.image_path) as raster_image:
+            self.assertIsNone(raster_image.memory_map)
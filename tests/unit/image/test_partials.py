@@ -0,0 +1,199 @@
+import unittest
+
+import numpy as np
+
+from raster_analysis_service.image.partials import (
+    GroupedPartial,
+    HistogramPartial,
+    MeanPartial,
+    MinMaxPartial,
+    MomentsPartial,
+    QuantileSketch,
+    tree_reduce,
+)
+
+
+class MeanPartialTest(unittest.TestCase):
+    def test_from_array(self):
+        partial = MeanPartial.from_array(np.arange(10, dtype=np.uint16))
+
+        self.assertEqual(partial.count, 10)
+        self.assertEqual(partial.mean(), 4.5)
+
+    def test_from_masked_array(self):
+        array = np.ma.MaskedArray([1, 2, 3, 10], mask=[False, False, False, True])
+        partial = MeanPartial.from_array(array)
+
+        self.assertEqual(partial.count, 3)
+        self.assertEqual(partial.mean(), 2.0)
+
+    def test_nan_is_skipped(self):
+        partial = MeanPartial.from_array(np.array([1.0, np.nan, 3.0]))
+
+        self.assertEqual(partial.count, 2)
+        self.assertEqual(partial.mean(), 2.0)
+
+    def test_empty_mean(self):
+        self.assertEqual(MeanPartial().mean(), 0.0)
+
+    def test_merge_does_not_modify_operands(self):
+        first = MeanPartial(2, 2.0)
+        second = MeanPartial(2, 6.0)
+        merged = first.merge(second)
+
+        self.assertEqual(merged.count, 4)
+        self.assertEqual(merged.mean(), 2.0)
+        self.assertEqual(first.count, 2)
+        self.assertEqual(second.total, 6.0)
+
+    def test_merge_compensates_rounding(self):
+        partials = [MeanPartial(1, 1e16), MeanPartial(1, 1.0), MeanPartial(1, -1e16), MeanPartial(1, 1.0)]
+        merged = tree_reduce(partials)
+
+        self.assertEqual(merged.total + merged.compensation, 2.0)
+
+
+class MomentsPartialTest(unittest.TestCase):
+    def test_from_array(self):
+        values = np.arange(10, dtype=np.uint16)
+        partial = MomentsPartial.from_array(values)
+
+        self.assertEqual(partial.count, 10)
+        self.assertEqual(partial.mean, 4.5)
+        self.assertAlmostEqual(partial.variance(), np.var(values, ddof=1))
+
+    def test_nan_is_skipped(self):
+        partial = MomentsPartial.from_array(np.array([1.0, np.nan, 3.0]))
+
+        self.assertEqual((partial.count, partial.mean, partial.m2), (2, 2.0, 2.0))
+
+    def test_from_masked_array(self):
+        array = np.ma.MaskedArray([1, 3, 100], mask=[False, False, True])
+        partial = MomentsPartial.from_array(array)
+
+        self.assertEqual(partial.count, 2)
+        self.assertEqual(partial.variance(), 2.0)
+
+    def test_empty(self):
+        partial = MomentsPartial.from_array(np.array([]))
+
+        self.assertEqual(partial.variance(), 0.0)
+        self.assertEqual(partial.standard_error(), 0.0)
+
+    def test_merge_matches_single_pass(self):
+        values = np.random.default_rng(0).random(1000) * 1e4 + 1e6
+        partials = [MomentsPartial.from_array(part) for part in np.array_split(values, 7)]
+        merged = tree_reduce(partials)
+
+        self.assertEqual(merged.count, 1000)
+        self.assertAlmostEqual(merged.mean, np.mean(values))
+        self.assertAlmostEqual(merged.variance() / np.var(values, ddof=1), 1.0, places=9)
+
+    def test_merge_with_empty(self):
+        partial = MomentsPartial.from_array(np.array([1.0, 3.0]))
+        merged = MomentsPartial().merge(partial)
+
+        self.assertEqual(merged.mean, 2.0)
+        self.assertEqual(merged.variance(), 2.0)
+        self.assertEqual(merged.standard_error(), 1.0)
+
+
+class MinMaxPartialTest(unittest.TestCase):
+    def test_from_masked_array(self):
+        partial = MinMaxPartial.from_array(np.ma.MaskedArray([0, 2, 4, 9], mask=[True, False, False, True]))
+
+        self.assertEqual((partial.minimum, partial.maximum), (2, 4))
+
+    def test_nan_is_skipped(self):
+        partial = MinMaxPartial.from_array(np.array([np.nan, 2.0, 4.0]))
+
+        self.assertEqual((partial.minimum, partial.maximum), (2.0, 4.0))
+        self.assertIsNone(MinMaxPartial.from_array(np.array([np.nan])).minimum)
+
+    def test_merge_with_empty(self):
+        merged = MinMaxPartial().merge(MinMaxPartial(1, 5)).merge(MinMaxPartial(-1, 3))
+
+        self.assertEqual((merged.minimum, merged.maximum), (-1, 5))
+        self.assertIsNone(MinMaxPartial.from_array(np.array([])).minimum)
+
+
+class HistogramPartialTest(unittest.TestCase):
+    def test_from_array(self):
+        partial = HistogramPartial.from_array(np.array([-1, 0, 4, 5, 9, 10, 20]), 2, (0, 10))
+
+        self.assertListEqual(partial.counts.tolist(), [1, 2, 2, 2])
+        self.assertListEqual(partial.edges(), [0.0, 5.0, 10.0])
+
+    def test_nan_is_skipped(self):
+        partial = HistogramPartial.from_array(np.array([np.nan, 1.0, 6.0, np.nan]), 2, (0, 10))
+
+        self.assertListEqual(partial.counts.tolist(), [0, 1, 1, 0])
+
+    def test_merge_matches_single_pass(self):
+        values = np.random.default_rng(0).integers(0, 100, 1000)
+        partials = [HistogramPartial.from_array(part, 10, (0, 100)) for part in np.array_split(values, 3)]
+
+        self.assertListEqual(tree_reduce(partials).counts[1:-1].tolist(),
+                             np.histogram(values, 10, (0, 100))[0].tolist())
+
+
+class QuantileSketchTest(unittest.TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        values = np.random.default_rng(0).normal(1000, 300, 10000)
+        partials = [QuantileSketch.from_array(part, 0.01) for part in np.array_split(values, 4)]
+        sketch = tree_reduce(partials)
+
+        self.assertEqual(sketch.count, 10000)
+        for quantile in (0.0, 0.05, 0.5, 0.95, 1.0):
+            expected = np.quantile(values, quantile, method="lower")
+            self.assertLessEqual(abs(sketch.quantile(quantile) - expected), 0.01 * abs(expected))
+
+    def test_zero_and_negative_values(self):
+        sketch = QuantileSketch.from_array(np.array([-10.0, 0.0, 0.0, 10.0]), 0.01)
+
+        self.assertAlmostEqual(sketch.quantile(0.0), -10.0, delta=0.1)
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertAlmostEqual(sketch.quantile(1.0), 10.0, delta=0.1)
+
+    def test_empty(self):
+        self.assertIsNone(QuantileSketch(0.01).quantile(0.5))
+
+
+class GroupedPartialTest(unittest.TestCase):
+    def test_add(self):
+        partial = GroupedPartial()
+        partial.add("B04", MeanPartial(1, 1.0))
+        partial.add("B04", MeanPartial(1, 3.0))
+
+        self.assertEqual(partial.groups["B04"].mean(), 2.0)
+
+    def test_merge_unites_groups(self):
+        first = GroupedPartial({"B04": MeanPartial(1, 1.0)})
+        second = GroupedPartial({"B04": MeanPartial(1, 3.0), "B08": MeanPartial(1, 5.0)})
+        merged = first.merge(second)
+
+        self.assertEqual(merged.groups["B04"].mean(), 2.0)
+        self.assertEqual(merged.groups["B08"].mean(), 5.0)
+        self.assertEqual(first.groups["B04"].mean(), 1.0)
+
+
+class TreeReduceTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertIsNone(tree_reduce([]))
+
+    def test_single(self):
+        partial = MeanPartial(1, 1.0)
+        self.assertIs(tree_reduce([partial]), partial)
+
+    def test_odd_number_of_partials(self):
+        partials = [MeanPartial(1, float(value)) for value in range(7)]
+        merged = tree_reduce(partials)
+
+        self.assertEqual(merged.count, 7)
+        self.assertEqual(merged.mean(), 3.0)
+
+    def test_deterministic(self):
+        values = np.random.default_rng(0).random(33) * 1e6
+        partials = [MeanPartial(1, float(value)) for value in values]
+
+        self.assertEqual(tree_reduce(partials).mean(), tree_reduce(partials).mean())
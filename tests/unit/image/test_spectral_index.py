@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.image.analysis import MeanValueAnalysis, StatisticsAnalysis
+from raster_analysis_service.image.spectral_index import SPECTRAL_INDICES, get_spectral_index, select_scenes
+from raster_analysis_service.image.types import RasterImage
+
+
+ITEM_ID = "S2A_32TQM_20230115_0_L2A"
+
+
+class SpectralIndexTest(unittest.TestCase):
+    def test_normalized_difference(self):
+        positive = np.ma.MaskedArray([[30, 10], [0, 5]], mask=[[False, False], [False, True]])
+        negative = np.array([[10, 30], [0, 5]])
+
+        index = SPECTRAL_INDICES["NDVI"].compute(positive, negative)
+
+        np.testing.assert_allclose(index.compressed(), [0.5, -0.5])
+        self.assertListEqual(index.mask.tolist(), [[False, False], [True, True]])
+
+    def test_reflectance_offset_is_applied(self):
+        index = SPECTRAL_INDICES["NDVI"].compute(np.array([4000]), np.array([2000]), (0.0001, -0.1), (0.0001, -0.1))
+
+        self.assertAlmostEqual(float(index[0]), 0.2 / 0.4, places=6)
+
+    def test_invalid_index_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            get_spectral_index("EVI")
+
+    def test_scenes_with_every_band_are_selected(self):
+        image_paths = [f"/data/{ITEM_ID}_B04.tif", f"/data/{ITEM_ID}_B08.tif", f"/data/{ITEM_ID}_SCL.tif",
+                       "/data/S2B_32TQM_20230120_0_L2A_red.tif", "/data/S2B_32TQM_20230120_0_L2A_nir.tif",
+                       "/data/S2A_32TQM_20230125_0_L2A_B08.tif"]
+
+        selected = select_scenes(image_paths, SPECTRAL_INDICES["NDVI"])
+
+        self.assertListEqual(selected, [f"/data/{ITEM_ID}_B08.tif", "/data/S2B_32TQM_20230120_0_L2A_nir.tif"])
+
+
+class IndexAnalysisTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        # Near infrared at 10 m, red at 20 m over the same extent
+        self.nir = rng.integers(1, 10000, (1, 8, 8), dtype=np.uint16)
+        self.red = rng.integers(1, 10000, (1, 4, 4), dtype=np.uint16)
+        self.red[0, 0, 0] = 0
+        self.nir_path = self._write("B08", self.nir, 10)
+        self._write("B04", self.red, 20)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _write(self, asset_key, data, resolution):
+        image_path = os.path.join(self.directory.name, f"{ITEM_ID}_{asset_key}.tif")
+        with rasterio.open(image_path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1], count=1,
+                           dtype="uint16", nodata=0, crs="EPSG:32632",
+                           transform=from_origin(300000, 5000000, resolution, resolution)) as dataset:
+            dataset.write(data)
+        return image_path
+
+    def _expected_index(self):
+        red = np.repeat(np.repeat(self.red, 2, axis=1), 2, axis=2).astype(np.float64)
+        nir = self.nir.astype(np.float64)
+        valid = red > 0
+        return ((nir - red) / (nir + red))[valid]
+
+    def test_index_of_resampled_bands(self):
+        analysis = MeanValueAnalysis(index="ndvi")
+        with RasterImage(self.nir_path) as raster_image:
+            analysis.add(raster_image)
+
+        expected = self._expected_index()
+        self.assertEqual(analysis.pixel_count, expected.size)
+        self.assertAlmostEqual(analysis.result(), expected.mean(), places=5)
+        self.assertEqual(raster_image.bytes_read, 8 * 8 * 2 * 2)
+
+    def test_offset_of_stac_item_is_applied(self):
+        raster_bands = [{"scale": 0.0001, "offset": -0.1}]
+        item = {"assets": {"B04": {"raster:bands": raster_bands}, "B08": {"raster:bands": raster_bands}}}
+        with open(os.path.join(self.directory.name, f"{ITEM_ID}.json"), "w", encoding="utf-8") as item_file:
+            json.dump(item, item_file)
+        analysis = StatisticsAnalysis(["MIN_VALUE", "MAX_VALUE"], index="NDVI")
+        with RasterImage(self.nir_path) as raster_image:
+            analysis.add(raster_image)
+
+        red = np.repeat(np.repeat(self.red, 2, axis=1), 2, axis=2) * 0.0001 - 0.1
+        nir = self.nir * 0.0001 - 0.1
+        expected = ((nir - red) / (nir + red))[red > -0.1]
+        self.assertAlmostEqual(analysis.result()["MIN_VALUE"], expected.min(), places=4)
+        self.assertAlmostEqual(analysis.result()["MAX_VALUE"], expected.max(), places=4)
+
+    def test_grouped_by_index(self):
+        analysis = MeanValueAnalysis(index="NDVI", group_by=["ASSET"])
+        with RasterImage(self.nir_path) as raster_image:
+            analysis.add(raster_image)
+
+        self.assertListEqual(list(analysis.result()), ["NDVI"])
+
+    def test_input_paths_are_files_of_the_scene(self):
+        analysis = MeanValueAnalysis(index="NDVI")
+
+        self.assertListEqual(analysis.input_paths(self.nir_path),
+                             [self.nir_path, os.path.join(self.directory.name, f"{ITEM_ID}_B04.tif"),
+                              os.path.join(self.directory.name, f"{ITEM_ID}.json")])
+        self.assertListEqual(MeanValueAnalysis().input_paths(self.nir_path), [self.nir_path])
+
+    def test_index_analyses_do_not_use_tile_statistics(self):
+        self.assertTrue(MeanValueAnalysis().uses_tile_statistics())
+        self.assertFalse(MeanValueAnalysis(index="NDVI").uses_tile_statistics())
+        self.assertListEqual(MeanValueAnalysis(index="NDVI").select_images([self.nir_path]), [])
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.image.analysis import (
+    MeanValueAnalysis,
+    PercentilesAnalysis,
+    StatisticsAnalysis,
+    TileStatisticsReducer,
+)
+from raster_analysis_service.image.tile_statistics import read_tile_statistics, sidecar_path, write_tile_statistics
+from raster_analysis_service.image.types import RasterImage
+
+
+class TileStatisticsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A_B04.tif")
+        self.data = np.random.default_rng(0).integers(1, 10000, (2, 40, 50), dtype=np.uint16)
+        self.data[:, :16, :16] = 0
+        with rasterio.open(self.image_path, "w", driver="GTiff", width=50, height=40, count=2, dtype="uint16",
+                           nodata=0, tiled=True, blockxsize=16, blockysize=16, crs="EPSG:32632",
+                           transform=from_origin(0, 0, 10, 10)) as dataset:
+            dataset.write(self.data)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_statistics_of_tiles(self):
+        statistics = write_tile_statistics(self.image_path)
+
+        self.assertTupleEqual(statistics.counts.shape, (2, 3, 4))
+        self.assertEqual(statistics.counts[:, 0, 0].sum(), 0)
+        self.assertTrue(np.isnan(statistics.minimums[0, 0, 0]))
+        self.assertEqual(statistics.counts.sum(), np.count_nonzero(self.data))
+        self.assertEqual(statistics.totals.sum(), self.data.sum(dtype=np.float64))
+        self.assertEqual(np.nanmax(statistics.maximums[1]), self.data[1].max())
+        self.assertEqual(statistics.histograms.sum(), np.count_nonzero(self.data))
+        self.assertTrue(statistics.has_mask)
+        window = statistics.tile_window(2, 3)
+        self.assertTupleEqual((window.row_off, window.col_off, window.height, window.width), (32, 48, 8, 2))
+        tile = self.data[0, 32:40, 48:50].astype(np.float64)
+        self.assertAlmostEqual(statistics.m2[0, 2, 3], ((tile - tile.mean()) ** 2).sum())
+
+    def test_statistics_are_read_back_while_image_is_unchanged(self):
+        written = write_tile_statistics(self.image_path)
+        read = read_tile_statistics(self.image_path)
+
+        np.testing.assert_array_equal(read.histograms, written.histograms)
+        self.assertTupleEqual(read.block_shape, (16, 16))
+
+        os.utime(self.image_path, ns=(0, 0))
+        self.assertIsNone(read_tile_statistics(self.image_path))
+
+    def test_minimum_and_maximum_have_the_type_of_pixels(self):
+        float_path = os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A_B08.tif")
+        with rasterio.open(float_path, "w", driver="GTiff", width=16, height=16, count=1, dtype="float32",
+                           crs="EPSG:32632", transform=from_origin(0, 0, 10, 10)) as dataset:
+            dataset.write(np.arange(256, dtype=np.float32).reshape(1, 16, 16))
+        float_statistics = write_tile_statistics(float_path)
+        integer_statistics = write_tile_statistics(self.image_path)
+
+        float_minimum = float_statistics.min_max_partial(0, np.ones(float_statistics.grid_shape, dtype=bool)).minimum
+        integer_minimum = integer_statistics.min_max_partial(
+            0, np.ones(integer_statistics.grid_shape, dtype=bool)).minimum
+
+        self.assertIs(type(float_minimum), float)
+        self.assertIs(type(integer_minimum), int)
+
+    def test_nan_pixels_of_float_images_are_not_valid(self):
+        float_path = os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A_B08.tif")
+        data = np.arange(64 * 64, dtype=np.float32).reshape(1, 64, 64) + 5
+        data[0, 0, 0] = np.nan
+        with rasterio.open(float_path, "w", driver="GTiff", width=64, height=64, count=1, dtype="float32",
+                           tiled=True, blockxsize=32, blockysize=32, crs="EPSG:32632",
+                           transform=from_origin(0, 0, 10, 10)) as dataset:
+            dataset.write(data)
+
+        statistics = write_tile_statistics(float_path)
+        tiles = np.ones(statistics.grid_shape, dtype=bool)
+
+        self.assertEqual(statistics.min_max_partial(0, tiles).minimum, 6.0)
+        self.assertEqual(statistics.counts.sum(), 64 * 64 - 1)
+        self.assertEqual(statistics.histograms.sum(), 64 * 64 - 1)
+        self.assertEqual(statistics.totals.sum(), np.nansum(data, dtype=np.float64))
+        self.assertFalse(np.isnan(statistics.m2).any())
+
+    def test_missing_or_unreadable_statistics(self):
+        self.assertIsNone(read_tile_statistics(self.image_path))
+        with open(sidecar_path(self.image_path), "wb") as sidecar_file:
+            sidecar_file.write(b"not a sidecar")
+        self.assertIsNone(read_tile_statistics(self.image_path))
+
+        write_tile_statistics(self.image_path)
+        with open(sidecar_path(self.image_path), "r+b") as sidecar_file:
+            sidecar_file.truncate(os.path.getsize(sidecar_path(self.image_path)) // 2)
+        self.assertIsNone(read_tile_statistics(self.image_path))
+
+    def test_statistics_are_written_without_temporary_files(self):
+        with patch("raster_analysis_service.image.tile_statistics.os.replace", side_effect=OSError("full")):
+            # Statistics which can not be written are still returned
+            self.assertIsNotNone(write_tile_statistics(self.image_path))
+        write_tile_statistics(self.image_path)
+
+        self.assertListEqual(sorted(os.listdir(self.directory.name)),
+                             sorted([os.path.basename(self.image_path), os.path.basename(sidecar_path(self.image_path))]))
+
+
+class TileStatisticsAnalysisTest(unittest.TestCase):
+    OPERATIONS = ["MEAN_VALUE", "MIN_VALUE", "MAX_VALUE", "VARIANCE", "HISTOGRAM"]
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A_B04.tif")
+        data = np.random.default_rng(1).integers(1, 10000, (2, 40, 50), dtype=np.uint16)
+        data[:, 20:30, :12] = 0
+        with rasterio.open(self.image_path, "w", driver="GTiff", width=50, height=40, count=2, dtype="uint16",
+                           nodata=0, tiled=True, blockxsize=16, blockysize=16, crs="EPSG:4326",
+                           transform=from_origin(0, 40, 1, 1)) as dataset:
+            dataset.write(data)
+        self.tile_statistics = write_tile_statistics(self.image_path)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _analyze(self, tile_statistics, **options):
+        analysis = StatisticsAnalysis(self.OPERATIONS, **options)
+        with RasterImage(self.image_path) as raster_image:
+            analysis.add(raster_image, tile_statistics)
+        return analysis.result(), raster_image.bytes_read
+
+    def _assert_results_equal(self, result, expected):
+        for operation in ("MIN_VALUE", "MAX_VALUE", "HISTOGRAM"):
+            self.assertEqual(result[operation], expected[operation])
+        self.assertAlmostEqual(result["MEAN_VALUE"], expected["MEAN_VALUE"])
+        self.assertAlmostEqual(result["VARIANCE"], expected["VARIANCE"], places=3)
+
+    def test_tiles_are_reduced_instead_of_pixels(self):
+        expected, _ = self._analyze(None)
+        result, bytes_read = self._analyze(self.tile_statistics)
+
+        self._assert_results_equal(result, expected)
+        self.assertEqual(bytes_read, 0)
+
+    def test_only_boundary_tiles_of_aoi_are_read(self):
+        # Covers block column 1 fully and block column 2 partially, in each of three block rows
+        aoi = {"type": "Polygon", "coordinates": [[[16, 0], [40, 0], [40, 40], [16, 40], [16, 0]]]}
+        expected, expected_bytes = self._analyze(None, aoi=aoi)
+        result, bytes_read = self._analyze(self.tile_statistics, aoi=aoi)
+
+        self._assert_results_equal(result, expected)
+        self.assertEqual(bytes_read, 2 * 2 * (16 + 16 + 8) * 16)
+        self.assertLess(bytes_read, expected_bytes)
+
+    def test_grouped_by_band(self):
+        expected, _ = self._analyze(None, group_by=["BAND"])
+        result, _ = self._analyze(self.tile_statistics, group_by=["BAND"])
+
+        self.assertListEqual(sorted(result), ["1", "2"])
+        for band in result:
+            self._assert_results_equal(result[band], expected[band])
+
+    def test_statistics_of_other_pixels_or_bins_are_not_used(self):
+        self.assertFalse(StatisticsAnalysis(self.OPERATIONS, masked=False)._accepts_tile_statistics(
+            self.tile_statistics))
+        self.assertFalse(StatisticsAnalysis(self.OPERATIONS, histogram_bins=32)._accepts_tile_statistics(
+            self.tile_statistics))
+        self.assertFalse(StatisticsAnalysis(self.OPERATIONS, overview_level=1).uses_tile_statistics())
+        self.assertFalse(PercentilesAnalysis().uses_tile_statistics())
+
+    def test_reducers_of_tiles_implement_their_partial(self):
+        class IncompleteAnalysis(PercentilesAnalysis, TileStatisticsReducer):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteAnalysis()
+        self.assertTrue(MeanValueAnalysis().uses_tile_statistics())
@@ -1,10 +1,17 @@
+import os
+import tempfile
 from typing import Optional
 import unittest
 from unittest.mock import call, patch
 
 import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.enums import MaskFlags
+from rasterio.transform import from_origin
+from rasterio.windows import transform as window_transform
 
-from raster_analysis_service.image.types import RasterImage
+from raster_analysis_service.image.types import RasterImage, _dataset_cache, close_datasets
 
 
 TEST_IMAGE_PATH = "test_path"
@@ -19,12 +26,15 @@ class RasterImageTest(unittest.TestCase):
         self.raster_image = RasterImage(TEST_IMAGE_PATH)
 
     def tearDown(self) -> None:
+        self.patcher.stop()
         self.raster_image = None
 
-    def test_init_loads_data(self):
-        RasterImage(TEST_IMAGE_PATH)
+    def test_data_is_loaded_on_first_access(self):
+        raster_image = RasterImage(TEST_IMAGE_PATH)
+        self.mock_rasterio.open.assert_not_called()
 
-        self.mock_rasterio.open.assert_called_with(TEST_IMAGE_PATH)
+        self.assertIs(raster_image.raster_data, raster_image.raster_data)
+        self.mock_rasterio.open.assert_called_once_with(TEST_IMAGE_PATH)
         self.assertEqual(self.raster_image.raster_image_path, TEST_IMAGE_PATH)
 
     def test_array_calls_read(self):
@@ -51,3 +61,213 @@ class RasterImageTest(unittest.TestCase):
 
         for idx in indexes:
             self.assertTrue(call(idx) in self.raster_image.raster_data.read.call_args_list)
+
+
+class RasterImageChunksTest(unittest.TestCase):
+    raster_image: Optional[RasterImage]
+
+    def setUp(self) -> None:
+        self.patcher = patch("raster_analysis_service.image.types.rasterio")
+        self.mock_rasterio = self.patcher.start()
+        self.raster_image = RasterImage(TEST_IMAGE_PATH)
+        self.raster_image.raster_data.width = 100
+        self.raster_image.raster_data.height = 70
+        self.raster_image.raster_data.dtypes = ("uint16", "uint16")
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        self.raster_image = None
+
+    def _assert_covers_image(self, windows):
+        covered = np.zeros((70, 100), dtype=int)
+        for window in windows:
+            covered[window.row_off:window.row_off + window.height,
+                    window.col_off:window.col_off + window.width] += 1
+        self.assertTrue((covered == 1).all())
+
+    def test_windows_coalesce_strips(self):
+        self.raster_image.raster_data.block_shapes = [(10, 100)]
+        windows = list(self.raster_image.windows(max_chunk_bytes=3 * 10 * 100 * 4))
+
+        self.assertListEqual([window.height for window in windows], [30, 30, 10])
+        self._assert_covers_image(windows)
+
+    def test_windows_split_wide_rows_into_blocks(self):
+        self.raster_image.raster_data.block_shapes = [(32, 32)]
+        windows = list(self.raster_image.windows(max_chunk_bytes=2 * 32 * 32 * 4))
+
+        self.assertListEqual([window.width for window in windows[:2]], [64, 36])
+        self.assertEqual(len(windows), 6)
+        self._assert_covers_image(windows)
+
+    def test_windows_never_split_a_block(self):
+        self.raster_image.raster_data.block_shapes = [(32, 32)]
+        windows = list(self.raster_image.windows(max_chunk_bytes=1))
+
+        self.assertEqual(len(windows), 12)
+        self._assert_covers_image(windows)
+
+    def test_chunks_read_windows(self):
+        self.raster_image.raster_data.block_shapes = [(70, 100)]
+        self.raster_image.raster_data.read.return_value = np.zeros((2, 70, 100), dtype=np.uint16)
+        chunks = list(self.raster_image.chunks())
+
+        self.assertEqual(len(chunks), 1)
+        self.raster_image.raster_data.read.assert_called_once()
+        self.assertEqual(self.raster_image.bytes_read, 2 * 70 * 100 * 2)
+
+    def test_windows_of_parts_cover_image(self):
+        self.raster_image.raster_data.block_shapes = [(10, 100)]
+        windows = []
+        for part in range(3):
+            self.raster_image.part, self.raster_image.parts = part, 3
+            part_windows = list(self.raster_image.windows(max_chunk_bytes=10 * 100 * 4))
+            self.assertIn(len(part_windows), (2, 3))
+            windows.extend(part_windows)
+
+        self._assert_covers_image(windows)
+
+    def test_decimated_chunks(self):
+        self.raster_image.raster_data.block_shapes = [(70, 100)]
+        self.raster_image.raster_data.count = 2
+        self.raster_image.raster_data.read.return_value = np.zeros((2, 18, 25), dtype=np.uint16)
+        list(self.raster_image.chunks(decimation=4))
+
+        _, kwargs = self.raster_image.raster_data.read.call_args
+        self.assertTupleEqual(kwargs["out_shape"], (2, 18, 25))
+        self.assertEqual(self.raster_image.bytes_read, 2 * 18 * 25 * 2)
+
+
+class RasterImageMaskedChunksTest(unittest.TestCase):
+    raster_image: Optional[RasterImage]
+
+    def setUp(self) -> None:
+        self.patcher = patch("raster_analysis_service.image.types.rasterio")
+        self.mock_rasterio = self.patcher.start()
+        self.raster_image = RasterImage(TEST_IMAGE_PATH)
+        raster_data = self.raster_image.raster_data
+        raster_data.width, raster_data.height = 4, 4
+        raster_data.dtypes = ("uint16",)
+        raster_data.block_shapes = [(2, 4)]
+        self.data = np.array([[[0, 0, 0, 0], [0, 0, 0, 0], [0, 5, 5, 5], [5, 5, 5, 5]]], dtype=np.uint16)
+        raster_data.read.side_effect = lambda window: self.data[:, window.row_off:window.row_off + window.height]
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        self.raster_image = None
+
+    def test_all_valid_dataset_is_not_masked(self):
+        self.raster_image.raster_data.mask_flag_enums = ([MaskFlags.all_valid],)
+        chunks = list(self.raster_image.chunks(max_chunk_bytes=16, masked=True))
+
+        self.assertEqual(len(chunks), 2)
+        self.assertFalse(any(np.ma.isMaskedArray(chunk) for chunk in chunks))
+
+    def test_nodata_pixels_are_masked(self):
+        self.raster_image.raster_data.mask_flag_enums = ([MaskFlags.nodata],)
+        self.raster_image.raster_data.nodatavals = (0,)
+        chunks = list(self.raster_image.chunks(max_chunk_bytes=16, masked=True))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].count(), 7)
+        self.assertEqual(self.raster_image.skipped_windows, 1)
+
+    def test_empty_windows_of_mask_band_are_not_read(self):
+        self.raster_image.raster_data.mask_flag_enums = ([MaskFlags.per_dataset],)
+        self.raster_image.raster_data.read_masks.side_effect = \
+            lambda window: (self.data[:, window.row_off:window.row_off + window.height] > 0) * 255
+        chunks = list(self.raster_image.chunks(max_chunk_bytes=16, masked=True))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].count(), 7)
+        self.raster_image.raster_data.read.assert_called_once()
+        self.assertEqual(self.raster_image.skipped_windows, 1)
+
+    def test_windows_outside_of_aoi_are_not_read(self):
+        self.raster_image.raster_data.mask_flag_enums = ([MaskFlags.all_valid],)
+        self.raster_image.raster_data.count = 1
+        self.raster_image.raster_data.transform = Affine(1, 0, 0, 0, -1, 4)
+        self.raster_image.raster_data.window_transform.side_effect = \
+            lambda window: window_transform(window, Affine(1, 0, 0, 0, -1, 4))
+        # Lower left quarter of the image
+        aoi = {"type": "Polygon", "coordinates": [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]}
+        with patch("raster_analysis_service.image.types.transform_geom", side_effect=lambda _, __, geometry: geometry):
+            chunks = list(self.raster_image.chunks(max_chunk_bytes=16, aoi=aoi))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertListEqual(chunks[0].compressed().tolist(), [0, 5, 5, 5])
+        self.raster_image.raster_data.read.assert_called_once()
+        self.assertEqual(self.raster_image.skipped_windows, 1)
+
+    def test_windows_are_clipped_to_blocks_within_aoi(self):
+        raster_data = self.raster_image.raster_data
+        raster_data.mask_flag_enums = ([MaskFlags.all_valid],)
+        raster_data.count = 1
+        raster_data.block_shapes = [(2, 2)]
+        raster_data.transform = Affine(1, 0, 0, 0, -1, 4)
+        raster_data.window_transform.side_effect = lambda window: window_transform(window, Affine(1, 0, 0, 0, -1, 4))
+        raster_data.read.side_effect = lambda window: self.data[:, window.row_off:window.row_off + window.height,
+                                                                window.col_off:window.col_off + window.width]
+        # Within the lower left block of the image
+        aoi = {"type": "Polygon", "coordinates": [[[0, 0], [1.5, 0], [1.5, 1.5], [0, 1.5], [0, 0]]]}
+        with patch("raster_analysis_service.image.types.transform_geom", side_effect=lambda _, __, geometry: geometry):
+            windows = [window for window, _ in self.raster_image.window_chunks(max_chunk_bytes=1024, aoi=aoi)]
+
+        self.assertListEqual([(window.col_off, window.row_off, window.width, window.height) for window in windows],
+                             [(0, 2, 2, 2)])
+        self.assertEqual(self.raster_image.bytes_read, 2 * 2 * 2)
+
+
+class DatasetCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_paths = [os.path.join(self.directory.name, f"image_{index}.tif") for index in range(3)]
+        for index, image_path in enumerate(self.image_paths):
+            self._write(image_path, index)
+        close_datasets()
+        self.patcher = patch.object(_dataset_cache, "_max_size", 2)
+        self.patcher.start()
+
+    def tearDown(self) -> None:
+        close_datasets()
+        self.patcher.stop()
+        self.directory.cleanup()
+
+    @staticmethod
+    def _write(image_path, value, width=4):
+        with rasterio.open(image_path, "w", driver="GTiff", width=width, height=4, count=1, dtype="uint8",
+                           crs="EPSG:4326", transform=from_origin(0, 4, 1, 1)) as dataset:
+            dataset.write(np.full((1, 4, width), value, dtype=np.uint8))
+
+    def test_dataset_is_reused_by_later_images(self):
+        with RasterImage(self.image_paths[0]) as first:
+            dataset = first.raster_data
+        with RasterImage(self.image_paths[0]) as second:
+            self.assertIs(second.raster_data, dataset)
+        self.assertFalse(dataset.closed)
+
+    def test_least_recently_used_datasets_are_closed(self):
+        datasets = []
+        for image_path in self.image_paths:
+            with RasterImage(image_path) as raster_image:
+                datasets.append(raster_image.raster_data)
+
+        self.assertListEqual([dataset.closed for dataset in datasets], [True, False, False])
+
+    def test_datasets_in_use_are_not_closed(self):
+        raster_images = [RasterImage(image_path) for image_path in self.image_paths]
+        datasets = [raster_image.raster_data for raster_image in raster_images]
+        self.assertFalse(any(dataset.closed for dataset in datasets))
+
+        for raster_image in raster_images:
+            raster_image.close()
+        self.assertListEqual([dataset.closed for dataset in datasets], [True, False, False])
+
+    def test_modified_file_is_reopened(self):
+        with RasterImage(self.image_paths[0]) as raster_image:
+            dataset = raster_image.raster_data
+        self._write(self.image_paths[0], 9, width=8)
+
+        with RasterImage(self.image_paths[0]) as raster_image:
+            self.assertEqual(raster_image.array().max(), 9)
+        self.assertTrue(dataset.closed)
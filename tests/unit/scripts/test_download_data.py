@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parents[3] / "scripts"))
+
+from download_data import download_search_results  # noqa: E402
+from download_engine import DownloadEngine  # noqa: E402
+from tests.unit.scripts.test_stac_search import MockStacHandler, MockStacServerTestCase  # noqa: E402
+
+
+class DownloadSearchResultsTest(MockStacServerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = DownloadEngine(max_workers=1)
+        self.patcher = patch("download_data.PROJECT_PATH", self.directory.name)
+        self.patcher.start()
+
+    def tearDown(self) -> None:
+        self.patcher.stop()
+        self.engine.close()
+        self.directory.cleanup()
+
+    def test_assets_and_items_are_downloaded(self):
+        found, failed = asyncio.run(download_search_results(self.search_url, {}, "dataset", self.engine,
+                                                            workers=2, page_size=2))
+
+        self.assertTupleEqual((found, failed), (5, 0))
+        item_directory = os.path.join(self.directory.name, "dataset", "sentinel-s2-l2a-cogs", "2023-01-10")
+        self.assertListEqual(sorted(os.listdir(item_directory)),
+                             ["S2A_32TQM_20230110_0_L2A.json", "S2A_32TQM_20230110_0_L2A_B04.tif"])
+
+    def test_downloads_start_before_search_completes(self):
+        asyncio.run(download_search_results(self.search_url, {}, "dataset", self.engine,
+                                            workers=1, queue_size=1, page_size=2))
+
+        events = MockStacHandler.events
+        first_asset = next(index for index, event in enumerate(events) if event[0] == "asset")
+        self.assertLess(first_asset, events.index(("page", 3)))
+
+    def test_search_limit(self):
+        found, _ = asyncio.run(download_search_results(self.search_url, {"limit": 3}, "dataset", self.engine,
+                                                       page_size=2))
+
+        self.assertEqual(found, 3)
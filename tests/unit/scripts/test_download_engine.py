@@ -0,0 +1,163 @@
+import hashlib
+import http.server
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parents[3] / "scripts"))
+
+from download_engine import DownloadEngine, DownloadError, DownloadRequest, parse_multihash  # noqa: E402
+
+
+CONTENT = bytes(range(256)) * 400
+
+
+class _FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves CONTENT at any path, with byte ranges unless disabled"""
+    accept_ranges = True
+    requested_ranges = []
+    head_requests = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        type(self).head_requests += 1
+        self._respond(with_body=False)
+
+    def do_GET(self) -> None:
+        self._respond(with_body=True)
+
+    def _respond(self, with_body: bool) -> None:
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.accept_ranges:
+            start = int(match[1])
+            end = int(match[2]) if match[2] else len(CONTENT) - 1
+            type(self).requested_ranges.append((start, end))
+            body = CONTENT[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        else:
+            body = CONTENT
+            self.send_response(200)
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+
+class DownloadEngineTest(unittest.TestCase):
+    engine: Optional[DownloadEngine]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/S2A_L2A_B04.tif"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, "items", "S2A_L2A_B04.tif")
+        self.engine = DownloadEngine(max_workers=2, range_workers=3, range_size=10000)
+        _FileHandler.accept_ranges = True
+        _FileHandler.requested_ranges = []
+        _FileHandler.head_requests = 0
+
+    def tearDown(self) -> None:
+        self.engine.close()
+        self.engine = None
+        self.directory.cleanup()
+
+    def _read(self) -> bytes:
+        with open(self.file_path, "rb") as downloaded_file:
+            return downloaded_file.read()
+
+    def test_download_in_ranges(self):
+        checksum = ("sha256", hashlib.sha256(CONTENT).hexdigest())
+        self.assertTrue(self.engine.download(DownloadRequest(self.url, self.file_path, checksum=checksum)))
+
+        self.assertEqual(self._read(), CONTENT)
+        self.assertEqual(len(_FileHandler.requested_ranges), 11)
+        self.assertListEqual(sorted(os.listdir(os.path.dirname(self.file_path))), ["S2A_L2A_B04.tif"])
+
+    def test_download_without_range_support(self):
+        _FileHandler.accept_ranges = False
+        self.engine.download(DownloadRequest(self.url, self.file_path))
+
+        self.assertEqual(self._read(), CONTENT)
+
+    def test_downloaded_file_is_skipped(self):
+        self.engine.download(DownloadRequest(self.url, self.file_path))
+        _FileHandler.requested_ranges = []
+
+        self.assertFalse(self.engine.download(DownloadRequest(self.url, self.file_path)))
+        self.assertListEqual(_FileHandler.requested_ranges, [])
+
+    def test_incomplete_file_is_downloaded_again(self):
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path, "wb") as incomplete_file:
+            incomplete_file.write(CONTENT[:100])
+
+        self.assertTrue(self.engine.download(DownloadRequest(self.url, self.file_path)))
+        self.assertEqual(self._read(), CONTENT)
+
+    def test_interrupted_range_download_is_resumed(self):
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path + ".part", "wb") as part_file:
+            part_file.write(CONTENT[:20000] + bytes(len(CONTENT) - 20000))
+        with open(self.file_path + ".part.json", "w") as state_file:
+            state_file.write('{"size": %d, "completed": [0, 10000]}' % len(CONTENT))
+
+        self.engine.download(DownloadRequest(self.url, self.file_path))
+        self.assertEqual(self._read(), CONTENT)
+        self.assertNotIn((0, 9999), _FileHandler.requested_ranges)
+        self.assertEqual(len(_FileHandler.requested_ranges), 9)
+
+    def test_interrupted_stream_download_is_resumed(self):
+        engine = DownloadEngine(range_size=len(CONTENT))
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path + ".part", "wb") as part_file:
+            part_file.write(CONTENT[:5000])
+
+        engine.download(DownloadRequest(self.url, self.file_path))
+        engine.close()
+        self.assertEqual(self._read(), CONTENT)
+        self.assertListEqual(_FileHandler.requested_ranges, [(5000, len(CONTENT) - 1)])
+
+    def test_checksum_mismatch_is_not_kept(self):
+        request = DownloadRequest(self.url, self.file_path, checksum=("sha256", "0" * 64))
+
+        with self.assertRaises(DownloadError):
+            self.engine.download(request)
+        self.assertListEqual(os.listdir(os.path.dirname(self.file_path)), [])
+
+    def test_downloaded_file_of_known_size_is_not_probed(self):
+        self.engine.download(DownloadRequest(self.url, self.file_path, size=len(CONTENT)))
+        _FileHandler.head_requests = 0
+
+        self.assertFalse(self.engine.download(DownloadRequest(self.url, self.file_path, size=len(CONTENT))))
+        self.assertEqual(_FileHandler.head_requests, 0)
+
+
+class ParseMultihashTest(unittest.TestCase):
+    def test_sha256(self):
+        digest = hashlib.sha256(b"").hexdigest()
+
+        self.assertTupleEqual(parse_multihash("1220" + digest), ("sha256", digest))
+
+    def test_unsupported(self):
+        self.assertIsNone(parse_multihash(None))
+        self.assertIsNone(parse_multihash("ff02abcd"))
+        self.assertIsNone(parse_multihash("1220abcd"))
@@ -0,0 +1,125 @@
+import asyncio
+import http.server
+import json
+import sys
+import threading
+import unittest
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parents[3] / "scripts"))
+
+from stac_search import search_items  # noqa: E402
+
+
+class MockStacHandler(http.server.BaseHTTPRequestHandler):
+    """A STAC API with item_count items, paginated by POST next links with a page number,
+    or by GET next links when get_links is set. Assets are served under /assets/
+    """
+    item_count = 5
+    get_links = False
+    events = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self._respond_page(body.get("page", 1), body["limit"])
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/search":
+            query = parse_qs(url.query)
+            self._respond_page(int(query["page"][0]), int(query["limit"][0]))
+        else:
+            self._respond_asset(with_body=True)
+
+    def do_HEAD(self) -> None:
+        self._respond_asset(with_body=False)
+
+    def _respond_page(self, page: int, limit: int) -> None:
+        type(self).events.append(("page", page))
+        base_url = f"http://{self.headers['Host']}"
+        first = (page - 1) * limit
+        features = [self._item(base_url, index) for index in range(first, min(first + limit, self.item_count))]
+        links = []
+        if first + limit < self.item_count:
+            if self.get_links:
+                links.append({"rel": "next", "href": f"{base_url}/search?page={page + 1}&limit={limit}"})
+            else:
+                links.append({"rel": "next", "href": f"{base_url}/search", "method": "POST",
+                              "body": {"page": page + 1}, "merge": True})
+        self._send_json({"type": "FeatureCollection", "features": features, "links": links})
+
+    @staticmethod
+    def _item(base_url: str, index: int):
+        item_id = f"S2A_32TQM_202301{index + 10}_0_L2A"
+        return {"type": "Feature", "id": item_id, "collection": "sentinel-s2-l2a-cogs",
+                "geometry": None, "links": [],
+                "properties": {"datetime": f"2023-01-{index + 10}T10:00:00Z", "eo:cloud_cover": 10},
+                "assets": {"B04": {"href": f"{base_url}/assets/{item_id}/B04.tif"}}}
+
+    def _respond_asset(self, with_body: bool) -> None:
+        if with_body:
+            type(self).events.append(("asset", self.path))
+        content = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(content)
+
+    def _send_json(self, content) -> None:
+        body = json.dumps(content).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockStacServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockStacHandler)
+        cls.search_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        MockStacHandler.item_count = 5
+        MockStacHandler.get_links = False
+        MockStacHandler.events = []
+
+
+class SearchItemsTest(MockStacServerTestCase):
+    def _search(self, **options):
+        async def collect():
+            async with httpx.AsyncClient() as client:
+                return [item["id"] async for item in search_items(client, self.search_url, {}, **options)]
+        return asyncio.run(collect())
+
+    def test_pages_are_followed_with_post_links(self):
+        item_ids = self._search(page_size=2)
+
+        self.assertEqual(len(item_ids), 5)
+        self.assertListEqual(MockStacHandler.events, [("page", 1), ("page", 2), ("page", 3)])
+
+    def test_pages_are_followed_with_get_links(self):
+        MockStacHandler.get_links = True
+
+        self.assertEqual(len(self._search(page_size=2)), 5)
+
+    def test_limit_stops_pagination(self):
+        item_ids = self._search(page_size=2, limit=3)
+
+        self.assertListEqual(item_ids, ["S2A_32TQM_20230110_0_L2A", "S2A_32TQM_20230111_0_L2A",
+                                        "S2A_32TQM_20230112_0_L2A"])
+        self.assertListEqual(MockStacHandler.events, [("page", 1), ("page", 2)])
@@ -1,8 +1,54 @@
+import os
+import tempfile
 from typing import Optional
 import unittest
-from unittest.mock import Mock, call
+from unittest.mock import Mock, patch
 
-from raster_analysis_service.service.analysis_executor import ProcessBasedExecutor, SequentialExecutor, get_executor_type
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+from raster_analysis_service.image.analysis import HistogramAnalysis, MeanValueAnalysis
+from raster_analysis_service.image.partials import MeanPartial
+from raster_analysis_service.image.tile_statistics import sidecar_path
+from raster_analysis_service.service.analysis_executor import (
+    ImageResult,
+    ProcessBasedExecutor,
+    SequentialExecutor,
+    ThreadBasedExecutor,
+    _TaskDispatcher,
+    analyze_task,
+    get_executor_type,
+    parse_node_addresses,
+)
+from raster_analysis_service.service.tasks import AnalysisTask
+from raster_analysis_service.utils.timing import collect_timings
+
+
+class TaskDispatcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tasks = [AnalysisTask("first.tif", 0, 1), AnalysisTask("second.tif", 0, 1)]
+        self.dispatcher = _TaskDispatcher(tasks, slots=2, max_attempts=1, straggler_factor=0.0)
+        self.result = ImageResult("first.tif", MeanPartial(1.0, 1))
+        # Second slot completes its task, then runs a copy of the straggling first task
+        self.assertEqual(self.dispatcher.next_task(0), 0)
+        self.assertEqual(self.dispatcher.next_task(1), 1)
+        self.dispatcher.complete(1, 1, self.result)
+        self.assertEqual(self.dispatcher.next_task(1), 0)
+
+    def test_failed_copy_waits_for_running_copy(self):
+        self.dispatcher.fail(0, 1, OSError("lost"))
+        self.dispatcher.complete(0, 0, self.result)
+
+        self.assertIs(self.dispatcher.result(0), self.result)
+
+    def test_failure_of_last_running_copy_raises(self):
+        self.dispatcher.fail(0, 1, OSError("lost"))
+        self.dispatcher.fail(0, 0, OSError("failed"))
+
+        with self.assertRaisesRegex(OSError, "failed"):
+            self.dispatcher.result(0)
 
 
 class GetExecutorTypeTest(unittest.TestCase):
@@ -10,6 +56,29 @@ class GetExecutorTypeTest(unittest.TestCase):
         executor_type = get_executor_type()
         self.assertEqual(executor_type, ProcessBasedExecutor)
 
+    @patch("raster_analysis_service.service.analysis_executor.ANALYSIS_WORKERS", 1)
+    def test_sequential_return(self):
+        self.assertEqual(get_executor_type(), SequentialExecutor)
+
+    @patch("raster_analysis_service.service.analysis_executor.ANALYSIS_EXECUTOR", "thread")
+    def test_configured_executor(self):
+        self.assertEqual(get_executor_type(), ThreadBasedExecutor)
+
+    @patch("raster_analysis_service.service.analysis_executor.ANALYSIS_EXECUTOR", "ERROR")
+    def test_invalid_executor_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            get_executor_type()
+
+
+class ParseNodeAddressesTest(unittest.TestCase):
+    def test_addresses(self):
+        self.assertListEqual(parse_node_addresses("node1:7100, 10.0.0.2:7101,"),
+                             [("node1", 7100), ("10.0.0.2", 7101)])
+
+    def test_address_without_port_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            parse_node_addresses("node1")
+
 
 class SequentialExecutorTest(unittest.TestCase):
     executor: Optional[SequentialExecutor]
@@ -25,7 +94,115 @@ class SequentialExecutorTest(unittest.TestCase):
         self.executor = None
 
     def test_execute(self):
-        self.executor._analyze_image = Mock()
+        self.executor._analyze_task = Mock()
+        self.executor.execute()
+        analyzed_paths = [args[0].image_path for args, _ in self.executor._analyze_task.call_args_list]
+        self.assertListEqual(analyzed_paths, self._dataset)
+
+    def test_execute_merges_partials(self):
+        self.executor._analyze_task = Mock()
         self.executor.execute()
-        for p in self._dataset:
-            self.assertTrue(call(p) in self.executor._analyze_image.call_args_list)
+
+        self._analysis.merge.assert_called_once()
+
+    def test_execute_on_empty_dataset_does_not_merge(self):
+        self.executor = SequentialExecutor(self._analysis, [])
+        self.executor.execute()
+
+        self._analysis.merge.assert_not_called()
+
+
+class ExecutorPartsTest(unittest.TestCase):
+    def test_parts_are_merged_per_image(self):
+        tasks = [AnalysisTask("PATH2", 0, 1), AnalysisTask("PATH1", 1, 2), AnalysisTask("PATH1", 0, 2)]
+        partials = {("PATH2", 0): MeanPartial(1, 5.0), ("PATH1", 1): MeanPartial(1, 3.0),
+                    ("PATH1", 0): MeanPartial(1, 1.0)}
+        progress = Mock()
+        analysis = Mock()
+        executor = SequentialExecutor(analysis, ["PATH1", "PATH2"], progress)
+        executor._plan = Mock(return_value=tasks)
+        executor._analyze_task = lambda task: ImageResult(task.image_path, partials[(task.image_path, task.part)], 10)
+
+        image_partials = executor.execute()
+
+        self.assertEqual(image_partials["PATH1"].count, 2)
+        self.assertEqual(image_partials["PATH1"].mean(), 2.0)
+        self.assertEqual(image_partials["PATH2"].mean(), 5.0)
+        self.assertListEqual([args[0].image_path for args, _ in progress.call_args_list], ["PATH2", "PATH1"])
+        self.assertEqual(progress.call_args_list[1][0][0].bytes_read, 20)
+        self.assertEqual(analysis.merge.call_args[0][0].mean(), 3.0)
+
+
+class ThreadBasedExecutorTest(unittest.TestCase):
+    def test_execute_keeps_dataset_order(self):
+        dataset = [f"PATH{index}" for index in range(8)]
+        analysis = Mock()
+        executor = ThreadBasedExecutor(analysis, dataset, num_workers=4, split_bytes=0)
+        executor._analyze_task = lambda task: ImageResult(task.image_path, MeanPartial(1, float(task.image_path[4:])))
+
+        image_partials = executor.execute()
+
+        self.assertListEqual(list(image_partials), dataset)
+        self.assertEqual(analysis.merge.call_args[0][0].mean(), 3.5)
+
+
+class AnalyzeTaskTileStatisticsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A_B04.tif")
+        with rasterio.open(self.image_path, "w", driver="GTiff", width=32, height=32, count=1, dtype="uint16",
+                           tiled=True, blockxsize=16, blockysize=16, crs="EPSG:32632",
+                           transform=from_origin(0, 0, 10, 10)) as dataset:
+            dataset.write(np.arange(32 * 32, dtype=np.uint16).reshape(1, 32, 32))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_statistics_are_written_by_first_analysis(self):
+        first = analyze_task(MeanValueAnalysis(), AnalysisTask(self.image_path, 0, 1))
+        second = analyze_task(MeanValueAnalysis(), AnalysisTask(self.image_path, 0, 1))
+
+        self.assertTrue(os.path.exists(sidecar_path(self.image_path)))
+        self.assertEqual(first.partial.mean(), second.partial.mean())
+        self.assertEqual(first.bytes_read, 32 * 32 * 2)
+        self.assertEqual(second.bytes_read, 0)
+
+    def test_statistics_which_analysis_would_not_use_are_not_written(self):
+        result = analyze_task(HistogramAnalysis(histogram_bins=10), AnalysisTask(self.image_path, 0, 1))
+
+        self.assertFalse(os.path.exists(sidecar_path(self.image_path)))
+        self.assertEqual(result.bytes_read, 32 * 32 * 2)
+
+    def test_analysis_within_aoi_does_not_write_statistics(self):
+        with rasterio.open(self.image_path) as dataset:
+            west, south, east, north = transform_bounds(dataset.crs, "EPSG:4326", *dataset.bounds)
+        aoi = {"type": "Polygon", "coordinates": [[[west, south], [east, south], [east, north], [west, north],
+                                                   [west, south]]]}
+
+        analyze_task(MeanValueAnalysis(aoi=aoi), AnalysisTask(self.image_path, 0, 1))
+
+        self.assertFalse(os.path.exists(sidecar_path(self.image_path)))
+
+    def test_parts_of_an_image_do_not_write_statistics(self):
+        results = [analyze_task(MeanValueAnalysis(), AnalysisTask(self.image_path, part, 2)) for part in range(2)]
+
+        self.assertFalse(os.path.exists(sidecar_path(self.image_path)))
+        self.assertEqual(results[0].partial.merge(results[1].partial).count, 32 * 32)
+
+    @patch("raster_analysis_service.service.analysis_executor.TILE_STATISTICS_ENABLED", False)
+    def test_timings_of_tasks_are_collected_by_executor(self):
+        with collect_timings() as timings:
+            SequentialExecutor(MeanValueAnalysis(), [self.image_path, self.image_path]).execute()
+
+        self.assertEqual(timings.counts["files"], 2)
+        self.assertEqual(timings.counts["tasks"], 2)
+        self.assertEqual(timings.counts["pixels_read"], 2 * 32 * 32)
+        self.assertEqual(timings.counts["bytes_read"], 2 * 32 * 32 * 2)
+        self.assertGreater(timings.seconds["read"], 0)
+        self.assertLessEqual(timings.busy_seconds, timings.capacity_seconds)
+
+    @patch("raster_analysis_service.service.analysis_executor.TILE_STATISTICS_ENABLED", False)
+    def test_disabled_statistics(self):
+        analyze_task(MeanValueAnalysis(), AnalysisTask(self.image_path, 0, 1))
+
+        self.assertFalse(os.path.exists(sidecar_path(self.image_path)))
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.image.analysis import MeanValueAnalysis
+from raster_analysis_service.service.analysis_executor import DistributedExecutor
+from raster_analysis_service.service.analysis_node import AnalysisNode
+from raster_analysis_service.service.worker_pool import GDAL_OPTIONS, WorkerPool
+
+
+AUTHKEY = "secret"
+SLOW_TASK_SECONDS = 30
+
+
+class _TestNode(AnalysisNode):
+    """A node which is slow on every task, or which crashes on its first task"""
+    def __init__(self, address, authkey, behaviour):
+        super().__init__(address, authkey, WorkerPool(2, 100, GDAL_OPTIONS))
+        self._behaviour = behaviour
+
+    def _analyze(self, analysis, task):
+        if self._behaviour == "slow":
+            time.sleep(SLOW_TASK_SECONDS)
+        elif self._behaviour == "crash":
+            os._exit(1)
+        return super()._analyze(analysis, task)
+
+
+def _run_node(addresses, behaviour):
+    node = _TestNode(("127.0.0.1", 0), AUTHKEY, behaviour)
+    # Workers of the node are shut down along with it
+    signal.signal(signal.SIGTERM, lambda *_: node.close())
+    addresses.put(node.address)
+    node.serve_forever()
+
+
+class DistributedExecutorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.image_paths = []
+        for index in range(4):
+            image_path = os.path.join(self.directory.name, f"S2A_32TQM_2023011{index}_0_L2A_B04.tif")
+            with rasterio.open(image_path, "w", driver="GTiff", width=16, height=16, count=1, dtype="uint16",
+                               crs="EPSG:32632", transform=from_origin(0, 0, 10, 10)) as dataset:
+                dataset.write(np.full((1, 16, 16), index + 1, dtype=np.uint16))
+            self.image_paths.append(image_path)
+        self.processes = []
+
+    def tearDown(self) -> None:
+        for process in self.processes:
+            process.terminate()
+            process.join(timeout=10)
+            process.kill()
+            process.join()
+        self.directory.cleanup()
+
+    def _start_nodes(self, *behaviours):
+        addresses = multiprocessing.Queue()
+        for behaviour in behaviours:
+            process = multiprocessing.Process(target=_run_node, args=(addresses, behaviour))
+            process.start()
+            self.processes.append(process)
+        return [addresses.get(timeout=10) for _ in behaviours]
+
+    def _executor(self, analysis, nodes, **options):
+        options = {"authkey": AUTHKEY, "slots": 2, "split_bytes": 0, "retry_delay": 0.01, **options}
+        return DistributedExecutor(analysis, self.image_paths, nodes=nodes, **options)
+
+    def test_partials_of_nodes_are_merged(self):
+        analysis = MeanValueAnalysis()
+
+        image_partials = self._executor(analysis, self._start_nodes("normal", "normal")).execute()
+
+        self.assertListEqual(list(image_partials), self.image_paths)
+        self.assertEqual(image_partials[self.image_paths[2]].mean(), 3.0)
+        self.assertEqual(analysis.result(), 2.5)
+
+    def test_tasks_of_a_lost_node_are_retried(self):
+        analysis = MeanValueAnalysis()
+        executor = self._executor(analysis, self._start_nodes("crash", "normal"), slots=1)
+
+        executor.execute()
+
+        self.assertEqual(analysis.result(), 2.5)
+        self.assertGreaterEqual(executor.retried_tasks, 1)
+
+    def test_straggling_tasks_are_dispatched_again(self):
+        analysis = MeanValueAnalysis()
+        executor = self._executor(analysis, self._start_nodes("slow", "normal"), slots=1, straggler_factor=2.0)
+
+        started = time.monotonic()
+        executor.execute()
+
+        self.assertLess(time.monotonic() - started, SLOW_TASK_SECONDS)
+        self.assertEqual(analysis.result(), 2.5)
+        self.assertGreaterEqual(executor.redispatched_tasks, 1)
+
+    def test_failing_task_raises_its_error(self):
+        self.image_paths.append(os.path.join(self.directory.name, "missing.tif"))
+        executor = self._executor(MeanValueAnalysis(), self._start_nodes("normal"))
+
+        with self.assertRaises(OSError):
+            executor.execute()
+
+    def test_unreachable_nodes_raise_connection_error(self):
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            closed_address = unused.getsockname()
+        nodes = [closed_address] + self._start_nodes("normal")
+
+        with self.assertRaises(ConnectionError):
+            self._executor(MeanValueAnalysis(), nodes, authkey="wrong").execute()
+
+    def test_shared_secret_is_required(self):
+        with self.assertRaises(ValueError):
+            DistributedExecutor(MeanValueAnalysis(), self.image_paths, nodes=[("127.0.0.1", 7100)], authkey="")
@@ -1,9 +1,11 @@
 import unittest
 from typing import Optional
-from unittest.mock import patch
+from unittest.mock import ANY, Mock, patch
 
 from raster_analysis_service.service.analyze_service import AnalyzeService
-from raster_analysis_service.image.analysis import AnalysisType
+from raster_analysis_service.service.types import AnalysisRequest
+from raster_analysis_service.image.analysis import AnalysisType, MeanValueAnalysis, StatisticsAnalysis
+from raster_analysis_service.image.partials import MeanPartial
 
 
 class AnalyzeServiceTest(unittest.TestCase):
@@ -21,6 +23,7 @@ class AnalyzeServiceTest(unittest.TestCase):
         for supported_operation in supported_operations:
             AnalysisType[supported_operation]
 
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
     @patch("raster_analysis_service.service.analyze_service.get_executor_type")
     @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
     def test_analyze(self, mock_create_dataset, mock_get_executor_type):
@@ -30,3 +33,116 @@ class AnalyzeServiceTest(unittest.TestCase):
         self.service.analyze(AnalysisType.MEAN_VALUE)
         mock_get_executor_type.return_value.assert_called_once()
         mock_get_executor_type.return_value.return_value.execute.assert_called_once()
+
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_request_with_profile(self, mock_create_dataset, mock_get_executor_type):
+        mock_create_dataset.return_value = ["PATH1"]
+        request = AnalysisRequest(name="MEAN_VALUE", profile=True)
+
+        response = self.service.analyze_request(request)
+
+        self.assertListEqual(sorted(response), ["profile", "result"])
+        self.assertListEqual(list(response["profile"]["stages"]), ["catalog", "open", "read", "reduce", "merge"])
+        self.assertEqual(response["profile"]["files"], 0)
+        self.assertGreaterEqual(response["profile"]["seconds"], response["profile"]["stages"]["catalog"])
+
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_request_configures_analysis(self, mock_create_dataset, mock_get_executor_type):
+        mock_create_dataset.return_value = ["PATH1"]
+        request = AnalysisRequest(name="MEAN_VALUE", overview_level=2)
+
+        self.service.analyze_request(request)
+        analysis = mock_get_executor_type.return_value.call_args[0][0]
+        self.assertEqual(analysis.cache_key(), MeanValueAnalysis(overview_level=2).cache_key())
+
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_request_with_several_operations(self, mock_create_dataset, mock_get_executor_type):
+        mock_create_dataset.return_value = ["PATH1"]
+        request = AnalysisRequest(name=["MEAN_VALUE", "HISTOGRAM"], histogram_bins=16)
+
+        result = self.service.analyze_request(request)
+        analysis = mock_get_executor_type.return_value.call_args[0][0]
+        self.assertIsInstance(analysis, StatisticsAnalysis)
+        self.assertListEqual(sorted(result), ["HISTOGRAM", "MEAN_VALUE"])
+        self.assertEqual(len(result["HISTOGRAM"]["counts"]), 16)
+
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
+    @patch("raster_analysis_service.service.analyze_service.SpatialIndex")
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_request_within_aoi(self, mock_create_dataset, mock_get_executor_type, mock_index_type):
+        mock_create_dataset.return_value = ["PATH1", "PATH2"]
+        mock_index_type.return_value.select.return_value = ["PATH2"]
+        aoi = {"type": "Polygon", "coordinates": [[[7, 50], [8, 50], [8, 51], [7, 50]]]}
+        request = AnalysisRequest(name="MEAN_VALUE", aoi={"type": "Feature", "geometry": aoi},
+                                  start_date="2023-01-01")
+
+        self.service.analyze_request(request)
+        mock_index_type.return_value.update.assert_called_once_with(["PATH1", "PATH2"])
+        mock_index_type.return_value.select.assert_called_once_with(["PATH1", "PATH2"], aoi, ANY, None)
+        analysis = mock_get_executor_type.return_value.call_args[0][0]
+        self.assertEqual(mock_get_executor_type.return_value.call_args[0][1], ["PATH2"])
+        self.assertEqual(analysis.cache_key(), MeanValueAnalysis(aoi=aoi).cache_key())
+
+    @patch("raster_analysis_service.service.analyze_service.RESULT_CACHE_ENABLED", False)
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_request_of_index(self, mock_create_dataset, mock_get_executor_type):
+        item_id = "S2A_32TQM_20230115_0_L2A"
+        mock_create_dataset.return_value = [f"{item_id}_B04.tif", f"{item_id}_B08.tif", f"{item_id}_SCL.tif"]
+        request = AnalysisRequest(name="MEAN_VALUE", index="ndvi")
+
+        self.service.analyze_request(request)
+        analysis = mock_get_executor_type.return_value.call_args[0][0]
+        self.assertEqual(mock_get_executor_type.return_value.call_args[0][1], [f"{item_id}_B08.tif"])
+        self.assertEqual(analysis.cache_key(), MeanValueAnalysis(index="NDVI").cache_key())
+
+    def test_invalid_index_is_rejected(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="MEAN_VALUE", index="EVI")
+
+    def test_dates_out_of_order_are_rejected(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="MEAN_VALUE", start_date="2023-03-01", end_date="2023-01-01")
+        AnalysisRequest(name="MEAN_VALUE", start_date="2023-01-01", end_date="2023-01-01")
+
+    def test_invalid_histogram_range_is_rejected(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="HISTOGRAM", histogram_range=(5, 5))
+
+    def test_percentiles_out_of_bounds_are_rejected(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="PERCENTILES", percentiles=[500, -3])
+
+    def test_aoi_is_validated(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="MEAN_VALUE", aoi={"type": "Point", "coordinates": [0, 0]})
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="MEAN_VALUE", aoi={"type": "Feature", "geometry": None})
+        self.assertIsNone(AnalysisRequest.parse_obj({"name": "MEAN_VALUE", "aoi": None}).aoi)
+
+    def test_composite_grouped_by_date_is_rejected(self):
+        with self.assertRaises(ValueError):
+            AnalysisRequest(name="MEAN_VALUE", composite="MEDIAN", group_by=["TILE", "DATE"])
+
+    @patch("raster_analysis_service.service.analyze_service.ResultCache")
+    @patch("raster_analysis_service.service.analyze_service.get_executor_type")
+    @patch("raster_analysis_service.service.analyze_service.create_tif_dataset")
+    def test_analyze_computes_only_pending_images(self, mock_create_dataset, mock_get_executor_type, mock_cache_type):
+        mock_create_dataset.return_value = ["PATH1", "PATH2"]
+        mock_cache = mock_cache_type.return_value
+        mock_cache.lookup.return_value = ({"PATH1": MeanPartial(2, 2.0)}, {"PATH2": Mock()})
+        mock_executor_type = mock_get_executor_type.return_value
+        mock_executor_type.return_value.execute.return_value = {"PATH2": MeanPartial(2, 6.0)}
+
+        self.service.analyze(AnalysisType.MEAN_VALUE)
+
+        mock_executor_type.assert_called_once_with(ANY, ["PATH2"], ANY)
+        mock_cache.store.assert_called_once_with(
+            MeanValueAnalysis().cache_key(), {"PATH2": ANY}, mock_cache.lookup.return_value[1])
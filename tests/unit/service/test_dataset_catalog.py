@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+from raster_analysis_service.service.dataset_catalog import DatasetCatalog
+
+
+class DatasetCatalogTest(unittest.TestCase):
+    catalog: Optional[DatasetCatalog]
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "dataset")
+        self.catalog_path = os.path.join(self.directory.name, "catalog", "catalog.json")
+        self._write("sentinel-s2-l2a-cogs/2023-01-15/S2A_L2A_B04.tif")
+        self._write("sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B04.tif")
+        self._write("sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A.json")
+        self._write(".hidden/image.tif")
+        self.catalog = DatasetCatalog(self.root, self.catalog_path)
+
+    def tearDown(self) -> None:
+        self.catalog = None
+        self.directory.cleanup()
+
+    def _write(self, relative_path: str) -> str:
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as image_file:
+            image_file.write(b"0000")
+        return path
+
+    def _relative_files(self, catalog: DatasetCatalog):
+        return [os.path.relpath(path, self.root) for path in catalog.files()]
+
+    def test_files_of_extension(self):
+        self.assertListEqual(self._relative_files(self.catalog), ["sentinel-s2-l2a-cogs/2023-01-15/S2A_L2A_B04.tif",
+                                                                  "sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B04.tif"])
+        path = os.path.join(self.root, "sentinel-s2-l2a-cogs/2023-01-15/S2A_L2A_B04.tif")
+        self.assertEqual(self.catalog.stats()[path], (os.stat(path).st_mtime_ns, 4))
+
+    def test_only_changed_directories_are_listed(self):
+        self.assertEqual(self.catalog.refresh(), 4)
+        self.assertEqual(self.catalog.refresh(), 0)
+
+        self._write("sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B08.tif")
+        self.assertEqual(self.catalog.refresh(), 1)
+        self.assertIn("sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B08.tif", self._relative_files(self.catalog))
+
+    def test_removed_directories_are_forgotten(self):
+        self.catalog.refresh()
+        os.remove(os.path.join(self.root, "sentinel-s2-l2a-cogs/2023-01-15/S2A_L2A_B04.tif"))
+        os.rmdir(os.path.join(self.root, "sentinel-s2-l2a-cogs/2023-01-15"))
+
+        self.assertListEqual(self._relative_files(self.catalog), ["sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B04.tif"])
+
+    def test_catalog_is_loaded_from_file(self):
+        self.catalog.refresh()
+        catalog = DatasetCatalog(self.root, self.catalog_path)
+
+        self.assertEqual(catalog.refresh(), 0)
+        self.assertListEqual(self._relative_files(catalog), self._relative_files(self.catalog))
+
+    def test_unreadable_catalog_file_is_rebuilt(self):
+        os.makedirs(os.path.dirname(self.catalog_path))
+        with open(self.catalog_path, "w") as catalog_file:
+            catalog_file.write("{")
+        catalog = DatasetCatalog(self.root, self.catalog_path)
+
+        self.assertEqual(catalog.refresh(), 4)
+
+    def test_directories_are_not_checked_within_refresh_interval(self):
+        catalog = DatasetCatalog(self.root, refresh_interval=60)
+        catalog.files()
+        self._write("sentinel-s2-l2a-cogs/2023-01-16/S2B_L2A_B08.tif")
+
+        with patch.object(catalog, "_refresh") as mock_refresh:
+            self.assertEqual(len(catalog.files()), 2)
+        mock_refresh.assert_not_called()
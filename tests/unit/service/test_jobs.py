@@ -0,0 +1,102 @@
+import unittest
+from typing import Optional
+from unittest.mock import Mock
+
+from raster_analysis_service.image.analysis import MeanValueAnalysis
+from raster_analysis_service.image.partials import MeanPartial
+from raster_analysis_service.service.analysis_executor import ImageResult
+from raster_analysis_service.service.jobs import Job, JobManager, JobStatus
+from raster_analysis_service.service.types import AnalysisRequest
+
+
+ANALYSIS_REQUEST = AnalysisRequest(name="MEAN_VALUE")
+
+
+class JobTest(unittest.TestCase):
+    job: Optional[Job]
+
+    def setUp(self) -> None:
+        self.job = Job(ANALYSIS_REQUEST)
+
+    def tearDown(self) -> None:
+        self.job = None
+
+    def test_initial_state(self):
+        snapshot = self.job.to_dict()
+
+        self.assertEqual(snapshot["status"], JobStatus.PENDING.value)
+        self.assertEqual(snapshot["files_processed"], 0)
+        self.assertIsNone(snapshot["result"])
+
+    def test_progress_reports_running_result(self):
+        self.job.started(MeanValueAnalysis(), 3)
+        self.job.image_completed(ImageResult("PATH1", MeanPartial(2, 2.0), 100))
+        self.job.image_completed(ImageResult("PATH2", MeanPartial(2, 6.0), 50))
+        snapshot = self.job.to_dict()
+
+        self.assertEqual(snapshot["files_total"], 3)
+        self.assertEqual(snapshot["files_processed"], 2)
+        self.assertEqual(snapshot["bytes_read"], 150)
+        self.assertEqual(snapshot["result"], 2.0)
+
+    def test_progress_changes_version(self):
+        version = self.job.version
+        self.job.started(MeanValueAnalysis(), 1)
+
+        self.assertGreater(self.job.version, version)
+
+    def test_run_completed(self):
+        service = Mock()
+        service.analyze_request.return_value = 5.0
+        self.job.run(service)
+        snapshot = self.job.to_dict()
+
+        service.analyze_request.assert_called_once_with(ANALYSIS_REQUEST, progress=self.job)
+        self.assertEqual(snapshot["status"], JobStatus.COMPLETED.value)
+        self.assertEqual(snapshot["result"], 5.0)
+
+    def test_run_failed(self):
+        service = Mock()
+        service.analyze_request.side_effect = ValueError("Invalid analysis type")
+        self.job.run(service)
+        snapshot = self.job.to_dict()
+
+        self.assertEqual(snapshot["status"], JobStatus.FAILED.value)
+        self.assertEqual(snapshot["error"], "Invalid analysis type")
+
+
+class JobManagerTest(unittest.TestCase):
+    manager: Optional[JobManager]
+
+    def setUp(self) -> None:
+        self.scheduler = Mock()
+        self.manager = JobManager(self.scheduler, history_size=2)
+
+    def tearDown(self) -> None:
+        self.manager = None
+
+    def test_submit(self):
+        job = self.manager.submit(ANALYSIS_REQUEST)
+
+        self.scheduler.submit.assert_called_once()
+        self.assertIs(self.manager.get(job.job_id), job)
+
+    def test_get_unknown_job(self):
+        self.assertIsNone(self.manager.get("unknown"))
+
+    def test_rejected_job_is_not_kept(self):
+        self.scheduler.submit.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            self.manager.submit(ANALYSIS_REQUEST)
+
+        self.assertEqual(len(self.manager._jobs), 0)
+
+    def test_finished_jobs_are_forgotten(self):
+        first = self.manager.submit(ANALYSIS_REQUEST)
+        first.status = JobStatus.COMPLETED
+        second = self.manager.submit(ANALYSIS_REQUEST)
+        third = self.manager.submit(ANALYSIS_REQUEST)
+
+        self.assertIsNone(self.manager.get(first.job_id))
+        self.assertIs(self.manager.get(second.job_id), second)
+        self.assertIs(self.manager.get(third.job_id), third)
@@ -0,0 +1,25 @@
+import unittest
+
+from raster_analysis_service.service.metrics import AnalysisMetrics
+from raster_analysis_service.utils.timing import StageTimings
+
+
+class AnalysisMetricsTest(unittest.TestCase):
+    def test_render_totals_of_analyses(self):
+        metrics = AnalysisMetrics()
+        metrics.record(StageTimings({"read": 1.0, "reduce": 0.5}, {"files": 2, "bytes_read": 2 ** 40},
+                                    capacity_seconds=3.0), 1.5)
+        metrics.record(StageTimings({"catalog": 0.25}, {"cached_files": 2}), 0.5)
+
+        lines = metrics.render({"queued_jobs": 1}).splitlines()
+
+        self.assertIn("raster_analysis_requests_total 2", lines)
+        self.assertIn("raster_analysis_request_seconds_total 2.0", lines)
+        self.assertIn('raster_analysis_stage_seconds_total{stage="read"} 1.0', lines)
+        self.assertIn('raster_analysis_stage_seconds_total{stage="merge"} 0.0', lines)
+        self.assertIn("raster_analysis_files_total 2", lines)
+        self.assertIn("raster_analysis_cached_files_total 2", lines)
+        self.assertIn(f"raster_analysis_bytes_read_total {2 ** 40}", lines)
+        self.assertIn("raster_analysis_worker_utilization 0.5", lines)
+        self.assertIn("# TYPE raster_analysis_queued_jobs gauge", lines)
+        self.assertIn("raster_analysis_queued_jobs 1", lines)
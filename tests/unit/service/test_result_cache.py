@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+from raster_analysis_service.image.partials import MeanPartial
+from raster_analysis_service.service.result_cache import ResultCache
+
+
+ANALYSIS_KEY = "MeanValueAnalysis"
+
+
+class ResultCacheTest(unittest.TestCase):
+    cache: Optional[ResultCache]
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.directory.name, "cache", "results.sqlite"))
+        self.image_path = os.path.join(self.directory.name, "image.tif")
+        self._write_image(b"0000")
+
+    def tearDown(self) -> None:
+        self.cache = None
+        self.directory.cleanup()
+
+    def _write_image(self, content: bytes, mtime_ns: int = 10 ** 18) -> None:
+        with open(self.image_path, "wb") as image_file:
+            image_file.write(content)
+        os.utime(self.image_path, ns=(mtime_ns, mtime_ns))
+
+    def test_lookup_empty_cache(self):
+        cached, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+
+        self.assertDictEqual(cached, {})
+        self.assertListEqual(list(pending), [self.image_path])
+
+    def test_connections_are_closed(self):
+        connections = []
+        open_connection = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            connections.append(open_connection(*args, **kwargs))
+            return connections[-1]
+
+        with patch("raster_analysis_service.service.result_cache.sqlite3.connect", side_effect=connect):
+            _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+            self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+
+        self.assertEqual(len(connections), 2)
+        for connection in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                connection.execute("SELECT 1")
+
+    def test_store_and_lookup(self):
+        _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+        self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        cached, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+
+        self.assertDictEqual(pending, {})
+        self.assertEqual(cached[self.image_path].count, 4)
+        self.assertEqual(cached[self.image_path].mean(), 2.0)
+
+    def test_lookup_is_keyed_by_analysis(self):
+        _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+        self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        cached, _ = self.cache.lookup("OtherAnalysis", [self.image_path])
+
+        self.assertDictEqual(cached, {})
+
+    def test_modified_file_is_pending(self):
+        _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+        self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        self._write_image(b"00000")
+        cached, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+
+        self.assertDictEqual(cached, {})
+        self.assertListEqual(list(pending), [self.image_path])
+
+    def test_modified_input_file_is_pending(self):
+        input_path = os.path.join(self.directory.name, "other_band.tif")
+        with open(input_path, "wb") as input_file:
+            input_file.write(b"0000")
+
+        def input_paths(path):
+            return [path, input_path]
+
+        _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path], input_paths)
+        self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        self.assertListEqual(list(self.cache.lookup(ANALYSIS_KEY, [self.image_path], input_paths)[0]),
+                             [self.image_path])
+
+        with open(input_path, "wb") as input_file:
+            input_file.write(b"00000")
+        cached, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path], input_paths)
+
+        self.assertDictEqual(cached, {})
+        self.assertListEqual(list(pending), [self.image_path])
+
+    def test_entries_of_previous_schema_are_dropped(self):
+        database_path = os.path.join(self.directory.name, "previous.sqlite")
+        with sqlite3.connect(database_path) as connection:
+            connection.execute("CREATE TABLE partials (analysis TEXT, path TEXT, mtime_ns INTEGER, size INTEGER, "
+                               "partial BLOB, PRIMARY KEY (analysis, path))")
+        connection.close()
+        cache = ResultCache(database_path)
+
+        _, pending = cache.lookup(ANALYSIS_KEY, [self.image_path])
+        cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        self.assertListEqual(list(cache.lookup(ANALYSIS_KEY, [self.image_path])[0]), [self.image_path])
+
+    def test_touched_file_is_pending(self):
+        _, pending = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+        self.cache.store(ANALYSIS_KEY, {self.image_path: MeanPartial(4, 8.0)}, pending)
+        self._write_image(b"0000", mtime_ns=2 * 10 ** 18)
+        cached, _ = self.cache.lookup(ANALYSIS_KEY, [self.image_path])
+
+        self.assertDictEqual(cached, {})
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import unittest
+from typing import Optional
+from unittest.mock import Mock
+
+from raster_analysis_service.service.scheduler import AnalysisScheduler, SchedulerSaturatedError
+
+
+class AnalysisSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    scheduler: Optional[AnalysisScheduler]
+
+    def setUp(self) -> None:
+        self.scheduler = AnalysisScheduler(max_running=1, max_queued=1)
+        self.scheduler.start()
+        self.release = threading.Event()
+
+    def tearDown(self) -> None:
+        self.release.set()
+        self.scheduler.shutdown()
+        self.scheduler = None
+
+    def _blocking_job(self, value):
+        self.release.wait(timeout=5)
+        return value
+
+    async def test_run_returns_result(self):
+        self.release.set()
+        result = await self.scheduler.run("key", self._blocking_job, 5)
+
+        self.assertEqual(result, 5)
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+    async def test_identical_jobs_are_coalesced(self):
+        function = Mock(side_effect=self._blocking_job)
+        first = asyncio.ensure_future(self.scheduler.run("key", function, 1))
+        second = asyncio.ensure_future(self.scheduler.run("key", function, 2))
+        await asyncio.sleep(0.01)
+        self.release.set()
+
+        self.assertListEqual([await first, await second], [1, 1])
+        function.assert_called_once_with(1)
+
+    async def test_saturated_scheduler_rejects_jobs(self):
+        running = asyncio.ensure_future(self.scheduler.run("first", self._blocking_job, 1))
+        queued = asyncio.ensure_future(self.scheduler.run("second", self._blocking_job, 2))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.scheduler.running, 1)
+        self.assertEqual(self.scheduler.queued, 1)
+        with self.assertRaises(SchedulerSaturatedError):
+            await self.scheduler.run("third", self._blocking_job, 3)
+        self.release.set()
+        self.assertListEqual([await running, await queued], [1, 2])
+
+    async def test_exception_is_propagated(self):
+        with self.assertRaises(ValueError):
+            await self.scheduler.run("key", Mock(side_effect=ValueError))
+        self.assertEqual(self.scheduler.in_flight, 0)
+
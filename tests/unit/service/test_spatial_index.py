@@ -0,0 +1,103 @@
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from typing import Optional
+from unittest.mock import patch
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from raster_analysis_service.service.spatial_index import SpatialIndex, read_footprint
+
+
+def _polygon(west, south, east, north):
+    return {"type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]]}
+
+
+class SpatialIndexTest(unittest.TestCase):
+    index: Optional[SpatialIndex]
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = SpatialIndex(os.path.join(self.directory.name, "index", "footprints.sqlite"))
+        # One degree wide images, next to each other
+        self.west_path = self._write_image("S2A_32TQM_20230115_0_L2A_B04.tif", 7.0)
+        self.east_path = self._write_image("S2B_32TQN_20230320_0_L2A_B04.tif", 8.0)
+
+    def tearDown(self) -> None:
+        self.index = None
+        self.directory.cleanup()
+
+    def _write_image(self, name: str, west: float) -> str:
+        path = os.path.join(self.directory.name, name)
+        with rasterio.open(path, "w", driver="GTiff", width=10, height=10, count=1, dtype="uint8",
+                           crs="EPSG:4326", transform=from_origin(west, 51.0, 0.1, 0.1)) as dataset:
+            dataset.write(np.ones((1, 10, 10), dtype=np.uint8))
+        return path
+
+    def test_update_reads_only_new_files(self):
+        self.assertEqual(self.index.update([self.west_path]), 1)
+        self.assertEqual(self.index.update([self.west_path, self.east_path]), 1)
+        self.assertEqual(self.index.update([self.west_path, self.east_path]), 0)
+
+    def test_connections_are_closed(self):
+        connections = []
+        open_connection = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            connections.append(open_connection(*args, **kwargs))
+            return connections[-1]
+
+        def read_footprint_of_closed(path):
+            # Files are read while no connection is open
+            for connection in connections:
+                with self.assertRaises(sqlite3.ProgrammingError):
+                    connection.execute("SELECT 1")
+            return read_footprint(path)
+
+        with patch("raster_analysis_service.service.spatial_index.sqlite3.connect", side_effect=connect), \
+                patch("raster_analysis_service.service.spatial_index.read_footprint",
+                      side_effect=read_footprint_of_closed) as mock_read_footprint:
+            self.index.update([self.west_path])
+            self.index.select([self.west_path])
+
+        mock_read_footprint.assert_called_once_with(self.west_path)
+        self.assertEqual(len(connections), 3)
+        for connection in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                connection.execute("SELECT 1")
+
+    def test_select_by_aoi(self):
+        paths = [self.west_path, self.east_path]
+        self.index.update(paths)
+
+        self.assertListEqual(self.index.select(paths, aoi=_polygon(8.2, 50.2, 8.4, 50.4)), [self.east_path])
+        self.assertListEqual(self.index.select(paths, aoi=_polygon(7.5, 50.2, 8.5, 50.4)), paths)
+        self.assertListEqual(self.index.select(paths, aoi=_polygon(10.0, 50.2, 11.0, 50.4)), [])
+
+    def test_select_by_date_from_file_name(self):
+        paths = [self.west_path, self.east_path]
+        self.index.update(paths)
+
+        selected = self.index.select(paths, start_date=datetime.date(2023, 3, 1), end_date=datetime.date(2023, 3, 20))
+        self.assertListEqual(selected, [self.east_path])
+
+    def test_date_is_read_from_stac_item(self):
+        item = {"geometry": _polygon(7.0, 50.0, 8.0, 51.0), "properties": {"datetime": "2023-02-01T10:00:00Z"}}
+        with open(os.path.join(self.directory.name, "S2A_32TQM_20230115_0_L2A.json"), "w") as item_file:
+            json.dump(item, item_file)
+        self.index.update([self.west_path])
+
+        selected = self.index.select([self.west_path], start_date=datetime.date(2023, 2, 1))
+        self.assertListEqual(selected, [self.west_path])
+
+    def test_removed_files_are_forgotten(self):
+        self.index.update([self.west_path, self.east_path])
+        self.index.update([self.west_path])
+
+        self.assertListEqual(self.index.select([self.west_path, self.east_path]), [self.west_path])
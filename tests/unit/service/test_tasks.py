@@ -0,0 +1,34 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from raster_analysis_service.service.tasks import plan_tasks
+
+
+MB = 1024 * 1024
+
+
+class PlanTasksTest(unittest.TestCase):
+    def test_without_splitting_keeps_order(self):
+        tasks = plan_tasks(["PATH1", "PATH2"], split_bytes=0)
+
+        self.assertListEqual([task.image_path for task in tasks], ["PATH1", "PATH2"])
+        self.assertListEqual([task.parts for task in tasks], [1, 1])
+
+    @patch("raster_analysis_service.service.tasks.os")
+    def test_largest_first(self, mock_os: Mock):
+        sizes = {"SMALL": 1 * MB, "LARGE": 3 * MB, "MEDIUM": 2 * MB}
+        mock_os.stat.side_effect = lambda path: Mock(st_size=sizes[path])
+        tasks = plan_tasks(["SMALL", "LARGE", "MEDIUM"], split_bytes=10 * MB)
+
+        self.assertListEqual([task.image_path for task in tasks], ["LARGE", "MEDIUM", "SMALL"])
+
+    @patch("raster_analysis_service.service.tasks.os")
+    def test_large_images_are_split(self, mock_os: Mock):
+        sizes = {"SMALL": 1 * MB, "LARGE": 25 * MB}
+        mock_os.stat.side_effect = lambda path: Mock(st_size=sizes[path])
+        tasks = plan_tasks(["SMALL", "LARGE"], split_bytes=10 * MB)
+
+        large_tasks = [task for task in tasks if task.image_path == "LARGE"]
+        self.assertListEqual([task.part for task in large_tasks], [0, 1, 2])
+        self.assertTrue(all(task.parts == 3 for task in large_tasks))
+        self.assertEqual(tasks[-1].image_path, "SMALL")
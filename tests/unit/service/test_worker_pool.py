@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+import unittest
+from typing import Optional
+
+from rasterio.env import getenv
+
+from raster_analysis_service.service.worker_pool import PoolHealth, WorkerPool, initialize_worker
+
+
+def _square(value):
+    return value * value
+
+
+def _pid(_):
+    return os.getpid()
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _gdal_num_threads(_):
+    return getenv().get("GDAL_NUM_THREADS")
+
+
+class WorkerPoolTest(unittest.TestCase):
+    pool: Optional[WorkerPool]
+
+    def setUp(self) -> None:
+        self.pool = WorkerPool(workers=2, max_tasks=4, gdal_options={"GDAL_CACHEMAX": 8})
+
+    def tearDown(self) -> None:
+        self.pool.shutdown()
+        self.pool = None
+
+    def test_map_keeps_order(self):
+        results = list(self.pool.map(_square, [1, 2, 3]))
+
+        self.assertListEqual(results, [1, 4, 9])
+
+    def test_pool_is_reused(self):
+        list(self.pool.map(_square, [1, 2]))
+        first_pool = self.pool._pool
+        list(self.pool.map(_square, [1, 2, 3, 4, 5]))
+
+        self.assertIs(self.pool._pool, first_pool)
+
+    def test_workers_are_replaced_after_max_tasks(self):
+        pool = WorkerPool(workers=1, max_tasks=2, gdal_options={})
+        try:
+            pids = list(pool.map(_pid, range(4)))
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(len(set(pids)), 2)
+
+    def test_check_health(self):
+        self.assertIs(self.pool.check_health(), PoolHealth.HEALTHY)
+
+    def test_busy_pool_is_left_running(self):
+        self.pool.start()
+        results = []
+        analysis = threading.Thread(target=lambda: results.extend(self.pool.map(_sleep, [1, 1])))
+        analysis.start()
+        time.sleep(0.2)
+
+        self.assertIs(self.pool.check_health(timeout=0.1), PoolHealth.BUSY)
+        analysis.join()
+        self.assertListEqual(results, [1, 1])
+
+    def test_broken_pool_is_replaced(self):
+        self.pool.start()
+        broken_pool = self.pool._pool
+        for process in broken_pool._processes.values():
+            process.kill()
+            process.join()
+
+        self.assertIs(self.pool.check_health(timeout=10), PoolHealth.BROKEN)
+        self.assertListEqual(list(self.pool.map(_square, [2])), [4])
+        self.assertIsNot(self.pool._pool, broken_pool)
+
+
+class InitializeWorkerTest(unittest.TestCase):
+    def test_gdal_environment_of_worker_processes(self):
+        pool = WorkerPool(workers=1, max_tasks=4, gdal_options={"GDAL_NUM_THREADS": "2"})
+        try:
+            self.assertListEqual(list(pool.map(_gdal_num_threads, [None])), ["2"])
+        finally:
+            pool.shutdown()
+
+    def test_gdal_environment_of_worker_threads(self):
+        options = {}
+
+        def run_worker():
+            initialize_worker({"GDAL_NUM_THREADS": "4"})
+            options.update(getenv())
+
+        thread = threading.Thread(target=run_worker)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(options["GDAL_NUM_THREADS"], "4")
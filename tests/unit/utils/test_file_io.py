@@ -1,83 +1,33 @@
+import datetime
 import unittest
-from typing import Optional
-from unittest.mock import Mock, patch
 
-from raster_analysis_service.utils.file_io import Globber
+from raster_analysis_service.utils.file_io import item_date, item_tile, split_asset_name
 
 
-EXT_TIF = "tif"
-EXT_TIF_WITH_POINT = ".tif"
-INCLUDE = "INC"
-TEST_START_DIR = "START_DIR"
+class SplitAssetNameTest(unittest.TestCase):
+    def test_band_asset(self):
+        item_id, asset_key = split_asset_name("dataset/sentinel-s2-l2a-cogs/2023-01-15/S2B_32TQM_20230115_0_L2A_B04.tif")
 
+        self.assertEqual(item_id, "S2B_32TQM_20230115_0_L2A")
+        self.assertEqual(asset_key, "B04")
 
-class GlobberTestBase(unittest.TestCase):
-    globber: Optional[Globber]
+    def test_asset_key_with_underscore(self):
+        item_id, asset_key = split_asset_name("S2A_32TQM_20230115_0_L2A_visual_20m.tif")
 
-    def setUp(self) -> None:
-        self.globber = Globber(TEST_START_DIR)
+        self.assertEqual(item_id, "S2A_32TQM_20230115_0_L2A")
+        self.assertEqual(asset_key, "visual_20m")
 
-    def tearDown(self) -> None:
-        self.globber = None
+    def test_unknown_item_id(self):
+        self.assertTupleEqual(split_asset_name("dir/scene_B08.tif"), ("scene", "B08"))
+        self.assertTupleEqual(split_asset_name("image.tif"), ("", "image"))
 
 
-class GlobberAddExtensionTest(GlobberTestBase):
-    def test_add_extension(self):
-        self.globber.add_extension(EXT_TIF)
+class ItemTileAndDateTest(unittest.TestCase):
+    def test_tile_and_date_of_item_id(self):
+        self.assertEqual(item_tile("S2B_32TQM_20230115_0_L2A"), "32TQM")
+        self.assertEqual(item_date("S2B_32TQM_20230115_0_L2A"), datetime.date(2023, 1, 15))
 
-        self.assertListEqual(self.globber._extensions, [EXT_TIF])
-
-    def test_add_extensions_remove_point(self):
-        self.globber.add_extension(EXT_TIF_WITH_POINT)
-
-        self.assertListEqual(self.globber._extensions, [EXT_TIF])
-
-    def test_add_extension_does_not_duplicate(self):
-        self.globber.add_extension(EXT_TIF)
-        self.globber.add_extension(EXT_TIF_WITH_POINT)
-
-        self.assertListEqual(self.globber._extensions, [EXT_TIF])
-
-    def test_add_multiple_extensions(self):
-        second_ext = EXT_TIF + "_2"
-        self.globber.add_extension(EXT_TIF)
-        self.globber.add_extension(second_ext)
-
-        self.assertListEqual(self.globber._extensions, [EXT_TIF, second_ext])
-
-
-class GlobberCreateTest(GlobberTestBase):
-    @patch("raster_analysis_service.utils.file_io.glob")
-    @patch("raster_analysis_service.utils.file_io.chain")
-    def test_create_recursive_true(self, mock_chain: Mock, mock_glob: Mock):
-        self.globber.add_extension(EXT_TIF)
-        self.globber.create(recursive=True)
-
-        search_string = f"{TEST_START_DIR}/**/*.{EXT_TIF}"
-        mock_glob.iglob.assert_called_once_with(search_string, recursive=True)
-        mock_chain.from_iterable.assert_called_once_with([mock_glob.iglob.return_value])
-
-    @patch("raster_analysis_service.utils.file_io.glob")
-    @patch("raster_analysis_service.utils.file_io.chain")
-    def test_create_recursive_false(self, mock_chain: Mock, mock_glob: Mock):
-        self.globber.add_extension(EXT_TIF)
-        self.globber.create(recursive=False)
-
-        search_string = f"{TEST_START_DIR}/*.{EXT_TIF}"
-        mock_glob.iglob.assert_called_once_with(search_string, recursive=False)
-        mock_chain.from_iterable.assert_called_once_with([mock_glob.iglob.return_value])
-
-    @patch("raster_analysis_service.utils.file_io.glob")
-    @patch("raster_analysis_service.utils.file_io.chain")
-    def test_create_with_inclusion(self, mock_chain: Mock, mock_glob: Mock):
-        self.globber.add_extension(EXT_TIF)
-        self.globber.add_includes(INCLUDE)
-        self.globber.create()
-
-        search_string = f"{TEST_START_DIR}/**/*{INCLUDE}**.{EXT_TIF}"
-        mock_glob.iglob.assert_called_once_with(search_string, recursive=True)
-        mock_chain.from_iterable.assert_called_once_with([mock_glob.iglob.return_value])
-
-    def test_add_inclusion_raises(self):
-        with self.assertRaises(ValueError):
-            self.globber.add_includes(INCLUDE + "-")
+    def test_unknown_item_id(self):
+        self.assertIsNone(item_tile("scene"))
+        self.assertIsNone(item_date("scene"))
+        self.assertIsNone(item_date("S2B_32TQM_20231399_0_L2A"))
@@ -0,0 +1,55 @@
+import pickle
+import time
+import unittest
+
+from raster_analysis_service.utils.timing import StageTimings, add_timings, collect_timings, count, stage
+
+
+class StageTest(unittest.TestCase):
+    def test_nested_stages_are_exclusive(self):
+        with collect_timings() as timings:
+            with stage("read"):
+                time.sleep(0.01)
+                with stage("open"):
+                    time.sleep(0.02)
+
+        self.assertGreaterEqual(timings.seconds["open"], 0.02)
+        self.assertGreaterEqual(timings.seconds["read"], 0.01)
+        self.assertLess(timings.seconds["read"], 0.02)
+
+    def test_nothing_is_collected_outside_of_a_collector(self):
+        with stage("read"):
+            count("files")
+        add_timings(StageTimings({"read": 1.0}))
+
+        with collect_timings() as timings:
+            pass
+        self.assertEqual(timings.total_seconds(), 0)
+
+    def test_enclosing_collector_is_resumed(self):
+        with collect_timings() as outer:
+            with collect_timings() as inner:
+                count("files")
+            count("files", 2)
+            add_timings(inner)
+
+        self.assertEqual(inner.counts["files"], 1)
+        self.assertEqual(outer.counts["files"], 3)
+
+
+class StageTimingsTest(unittest.TestCase):
+    def test_update(self):
+        timings = StageTimings({"read": 1.0}, {"files": 1}, capacity_seconds=2.0)
+        timings.update(StageTimings({"read": 0.5, "reduce": 1.0}, {"files": 2}, capacity_seconds=2.0))
+
+        self.assertEqual(timings.seconds["read"], 1.5)
+        self.assertEqual(timings.counts["files"], 3)
+        self.assertEqual(timings.busy_seconds, 2.5)
+        self.assertEqual(timings.capacity_seconds, 4.0)
+
+    def test_pickled_timings_keep_defaults(self):
+        timings = pickle.loads(pickle.dumps(StageTimings({"read": 1.0}, {"files": 1})))
+
+        self.assertEqual(timings.seconds["read"], 1.0)
+        self.assertEqual(timings.seconds["merge"], 0.0)
+        self.assertEqual(timings.counts["tasks"], 0)